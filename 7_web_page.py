@@ -4,6 +4,7 @@ import math
 
 from secrets import *
 from do_connect import *
+from template import Template
 
 # rgb led
 red=machine.Pin(13,machine.Pin.OUT)
@@ -23,8 +24,7 @@ def temperature():
     print ('Celsius: %.2f C  Fahrenheit: %.2f F' % (Cel, Fah))
     return Cel
 
-def webpage(value):    
-    html = f"""
+PAGE = Template("""
 <!DOCTYPE html>
 <html lang="en">
   <head>
@@ -47,10 +47,9 @@ def webpage(value):
     <form action="./off">
       <input type="submit" value="off" />
     </form>
-    <p>Temperature is {value} degrees Celsius</p>
+    <p>Temperature is {{value}} degrees Celsius</p>
   </body>
-</html>"""
-    return html
+</html>""")
 
 def serve(connection):
     while True:
@@ -82,9 +81,8 @@ def serve(connection):
             blue.high()
 
         value='%.2f'%temperature()    
-        html=webpage(value)
         client.send('HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n')
-        client.send(html)
+        PAGE.send(client, value=value)
         client.close()
 
 def open_socket(ip):
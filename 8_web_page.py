@@ -7,15 +7,14 @@ from secrets import *
 from do_connect import *
 
 from dht_read import *
+from template import Template
 
-def webpage(temperature, humidity, state):
-    #Template HTML
-    html = f"""
+PAGE = Template("""
             <!DOCTYPE html>
             <html>
               <head>
                 <style>
-                  .block {{
+                  .block {
                     display: block;
                     width: 100%;
                     border: none;
@@ -24,13 +23,13 @@ def webpage(temperature, humidity, state):
                     font-size: 32px;
                     cursor: pointer;
                     text-align: center;
-                  }}
-                  .off {{
+                  }
+                  .off {
                     background-color: #d8d8d8;
-                  }}
-                  h1 {{
+                  }
+                  h1 {
                     text-align: center;
-                  }}
+                  }
                 </style>
               </head>
               <body>
@@ -40,14 +39,13 @@ def webpage(temperature, humidity, state):
                 <form action="./lightoff">
                   <input type="submit" value="Light off" class="block off" />
                 </form>
-                <h1>LED is {state}</h1>
-                <h1>Temperature is {temperature}</h1>
-                <h1>Humidity is {humidity}</h1>
+                <h1>LED is {{state}}</h1>
+                <h1>Temperature is {{temperature}}</h1>
+                <h1>Humidity is {{humidity}}</h1>
               </body>
             </html>
 
-            """
-    return str(html)
+            """)
 
 def serve(connection):
     #Start a web server
@@ -73,9 +71,8 @@ def serve(connection):
         #temperature, humidity = DHTread()
         temperature = 10
         humidity = 15
-        html = webpage(temperature, humidity, state)
         client.send('HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n')
-        client.send(html)
+        PAGE.send(client, temperature=temperature, humidity=humidity, state=state)
         client.close()
 
 def open_socket(ip):
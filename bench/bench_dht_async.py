@@ -0,0 +1,154 @@
+# DHT reads inside an asyncio program, on CPython, no Pico needed:
+#   python bench/bench_dht_async.py
+# Runs each DHT driver in an event loop on the pintrace_replay.Board clock,
+# beside a task that wakes up every millisecond, as a web server or an LED
+# animation would. Compares the blocking measure() of dht.py, dht_pio.py and
+# dht_read.py with their async variants, on clean traces and on traces where
+# every read needs a retry, and reports how late the other task ran: the
+# longest time the driver held the event loop, and the total lateness per
+# read.
+
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from dht_decode import DHT11, DHT22  # noqa: E402
+from pintrace_replay import Board, dht_trace, load_module  # noqa: E402
+
+READS = 20
+PAUSE_MS = 2000
+
+
+def frame(kind, temperature, humidity):
+    if kind == DHT11:
+        data = [int(humidity), round(humidity * 10) % 10,
+                int(abs(temperature)), round(abs(temperature) * 10) % 10]
+    else:
+        h = round(humidity * 10)
+        t = round(abs(temperature) * 10) | (0x8000 if temperature < 0 else 0)
+        data = [h >> 8, h & 0xFF, t >> 8, t & 0xFF]
+    return data + [sum(data) & 0xFF]
+
+
+def run(module, make_read, traces, expected):
+    board = Board(traces)
+    with board.install():
+        import asyncio
+        read = make_read(load_module(module))
+        lateness = []
+        running = [True]
+
+        async def ticker():
+            while running[0]:
+                due = board.now + 1000
+                await asyncio.sleep_ms(1)
+                lateness.append(board.now - due)
+
+        async def reader():
+            good = 0
+            for values in expected:
+                try:
+                    reading = await read()
+                except Exception:
+                    pass
+                else:
+                    good += (abs(reading[0] - values[0]) < 0.01
+                             and abs(reading[1] - values[1]) < 0.01)
+                await asyncio.sleep_ms(PAUSE_MS)
+            running[0] = False
+            return good
+
+        async def main():
+            asyncio.create_task(ticker())
+            return await asyncio.create_task(reader())
+
+        good = asyncio.run(main())
+    return good, max(lateness), sum(lateness)
+
+
+# ------------- Drivers -------------
+def dht11(sensor_class, awaited):
+    def make_read(dht):
+        from machine import Pin
+        sensor = getattr(dht, sensor_class)(Pin(16, Pin.OUT, Pin.PULL_DOWN))
+
+        async def read():
+            if awaited:
+                await sensor.measure()
+            else:
+                sensor.measure()
+            return sensor.temperature, sensor.humidity
+        return read
+    return make_read
+
+
+def pio(sensor_class, kind, awaited):
+    def make_read(dht_pio):
+        from machine import Pin
+        sensor = getattr(dht_pio, sensor_class)(Pin(2), kind)
+
+        async def read():
+            if awaited:
+                await sensor.measure()
+            else:
+                sensor.measure()
+            return sensor.temperature, sensor.humidity
+        return read
+    return make_read
+
+
+def dht_read(awaited):
+    def make_read(module):
+        async def read():
+            if awaited:
+                return await module.DHTreadAsync(strict=True)
+            return module.DHTread(strict=True)
+        return read
+    return make_read
+
+
+def main():
+    rng = random.Random(25)
+    jitter = lambda: rng.randint(-3, 3)  # noqa: E731
+    values11 = [(rng.randint(0, 40) * 1.0, rng.randint(200, 900) / 10)
+                for _ in range(READS)]
+    values22 = [(rng.randint(0, 400) / 10, rng.randint(200, 900) / 10)
+                for _ in range(READS)]
+    clean11 = [dht_trace(frame(DHT11, *v), jitter) for v in values11]
+    clean22 = [dht_trace(frame(DHT22, *v), jitter) for v in values22]
+
+    def retried(traces):
+        # every read first gets a frame cut short, then the good one
+        return [trace for level, deltas in traces
+                for trace in ((level, deltas[:50]), (level, deltas))]
+
+    cases = [
+        ('dht.DHT11', 'dht', dht11('DHT11', False), DHT11),
+        ('dht.AsyncDHT11', 'dht', dht11('AsyncDHT11', True), DHT11),
+        ('dht_pio.DHT', 'dht_pio', pio('DHT', DHT22, False), DHT22),
+        ('dht_pio.AsyncDHT', 'dht_pio', pio('AsyncDHT', DHT22, True), DHT22),
+        ('dht_pio.AsyncDHT DHT11', 'dht_pio', pio('AsyncDHT', DHT11, True),
+         DHT11),
+        ('dht_read.DHTread', 'dht_read', dht_read(False), DHT22),
+        ('dht_read.DHTreadAsync', 'dht_read', dht_read(True), DHT22),
+    ]
+    print('{:22} {:8} {:>7} {:>14} {:>13}'.format(
+        'driver', 'traces', 'good', 'max stall ms', 'late ms/read'))
+    for name, module, make_read, kind in cases:
+        clean, values = (clean11, values11) if kind == DHT11 else (clean22,
+                                                                   values22)
+        runs = [('clean', clean)]
+        # DHTread and the blocking dht_pio.DHT do not retry
+        if name not in ('dht_pio.DHT', 'dht_read.DHTread',
+                        'dht_read.DHTreadAsync'):
+            runs.append(('retry', retried(clean)))
+        for label, traces in runs:
+            good, stall, late = run(module, make_read, traces, values)
+            print('{:22} {:8} {:>4}/{} {:>14.1f} {:>13.1f}'.format(
+                name, label, good, READS, stall / 1000, late / 1000 / READS))
+
+
+main()
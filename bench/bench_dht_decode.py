@@ -0,0 +1,168 @@
+# DHT frame decoding benchmark on CPython, no sensor needed:
+#   python bench/bench_dht_decode.py
+# Decodes pulse traces in the two capture layouts used in this repo, with
+# the decoders that dht.py and dht_read.py had before dht_decode.py and with
+# dht_decode.Decoder, checks that they agree where the old code was right,
+# and reports the time per frame (best of REPEAT runs).
+#
+# The traces follow the datasheet timings (50 us low, then a 26-28 us high
+# for a 0 or a 70 us high for a 1) with the jitter seen on a Pico: dht.py
+# keeps the width of every pulse after the 4 response pulses, dht_read.py
+# keeps the period of each bit.
+
+import array
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from dht_decode import DHT11, DHT22, Decoder, InvalidChecksum  # noqa: E402
+
+ROUNDS = 2000
+REPEAT = 5
+
+READINGS = [
+    # kind, temperature, humidity
+    (DHT11, 24.0, 38.0),
+    (DHT11, 19.5, 61.2),
+    (DHT22, 21.5, 40.1),
+    (DHT22, 35.8, 22.4),
+    (DHT22, -10.1, 65.2),  # below zero, lost by the old decoders
+]
+
+
+def encode(kind, temperature, humidity):
+    if kind == DHT11:
+        data = [int(humidity), round(humidity * 10) % 10,
+                int(abs(temperature)), round(abs(temperature) * 10) % 10]
+        if temperature < 0:
+            data[3] |= 0x80
+    else:
+        h = round(humidity * 10)
+        t = round(abs(temperature) * 10) | (0x8000 if temperature < 0 else 0)
+        data = [h >> 8, h & 0xFF, t >> 8, t & 0xFF]
+    return data + [sum(data) & 0xFF]
+
+
+def bits(frame):
+    return [byte >> shift & 1 for byte in frame for shift in range(7, -1, -1)]
+
+
+def pulse_trace(frame, rng):
+    # dht.py layout: 4 response pulses, then the high and low pulse of each
+    # bit
+    trace = [rng.randint(15, 25), rng.randint(78, 85), rng.randint(78, 85),
+             rng.randint(48, 55)]
+    for bit in bits(frame):
+        trace.append(rng.randint(68, 75) if bit else rng.randint(23, 30))
+        trace.append(rng.randint(48, 56))
+    return bytearray(trace)
+
+
+def period_trace(frame, rng):
+    # dht_read.py layout: one low + high period per bit
+    return bytearray([rng.randint(118, 126) if bit else rng.randint(73, 82)
+                      for bit in bits(frame)])
+
+
+# ------------- Decoders before dht_decode.py -------------
+def old_dht11(pulses):
+    # dht.py: _convert_pulses_to_buffer, _verify_checksum and the values
+    pulses = pulses[4:]
+    binary = 0
+    for idx in range(0, len(pulses), 2):
+        binary = binary << 1 | int(pulses[idx] > 50)
+    buffer = array.array('B')
+    for shift in range(4, -1, -1):
+        buffer.append(binary >> shift * 8 & 0xFF)
+    checksum = 0
+    for buf in buffer[0:4]:
+        checksum += buf
+    if checksum & 0xFF != buffer[4]:
+        raise InvalidChecksum()
+    return buffer[2] + buffer[3] / 10, buffer[0] + buffer[1] / 10
+
+
+def old_dhtread(periods):
+    # dht_read.py: DHTread after the capture loop
+    bitstream = list(periods)
+    hum_hob = hum_lob = temp_hob = temp_lob = checksum = 0
+    for i in range(0, 40):
+        if bitstream[i] < 100:
+            bitstream[i] = 0
+        else:
+            bitstream[i] = 1
+    for i in range(8, 0, -1):
+        if bitstream[8 - i] == 1:
+            hum_hob |= 1 << (i - 1)
+    for i in range(8, 0, -1):
+        if bitstream[16 - i] == 1:
+            hum_lob |= 1 << i - 1
+    for i in range(8, 0, -1):
+        if bitstream[24 - i] == 1:
+            temp_hob |= 1 << i - 1
+    for i in range(8, 0, -1):
+        if bitstream[32 - i] == 1:
+            temp_lob |= 1 << i - 1
+    for i in range(8, 0, -1):
+        if bitstream[40 - i] == 1:
+            checksum |= 1 << i - 1
+    humidity = (hum_hob << 8 | hum_lob) * 0.1
+    temperature = ((temp_hob & 0x7f) << 8 | temp_lob) * 0.1
+    return temperature, humidity
+
+
+def timed(decode, traces):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for trace in traces:
+                decode(trace)
+        elapsed = (time.perf_counter() - start) / (ROUNDS * len(traces))
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def close(a, b):
+    return abs(a[0] - b[0]) < 0.01 and abs(a[1] - b[1]) < 0.01
+
+
+def main():
+    rng = random.Random(22)
+    dht11 = Decoder(DHT11, 50, first=4, step=2)
+    dht22 = Decoder(DHT22, 99)
+    pulses = []
+    periods = []
+    for kind, temperature, humidity in READINGS:
+        frame = encode(kind, temperature, humidity)
+        expected = (temperature, humidity)
+        if kind == DHT11:
+            trace = pulse_trace(frame, rng)
+            pulses.append(trace)
+            new, old = dht11.decode(trace), old_dht11(trace)
+        else:
+            trace = period_trace(frame, rng)
+            periods.append(trace)
+            new, old = dht22.decode(trace), old_dhtread(trace)
+        if not close(new, expected):
+            raise RuntimeError('decoded {} instead of {}'.format(new,
+                                                                 expected))
+        print('{:6} {:>6} {:>6} -> old {:>6.1f} {:>6.1f}{}'.format(
+            'DHT' + str(kind), temperature, humidity, old[0], old[1],
+            '' if close(old, expected) else '  (wrong)'))
+
+    print('\n{} rounds, best of {}, us/frame'.format(ROUNDS, REPEAT))
+    print('{:26} {:>8} {:>8}'.format('layout', 'old', 'new'))
+    print('{:26} {:>8.2f} {:>8.2f}'.format(
+        'dht.py pulses (DHT11)', timed(old_dht11, pulses),
+        timed(dht11.decode, pulses)))
+    print('{:26} {:>8.2f} {:>8.2f}'.format(
+        'dht_read.py periods (DHT22)', timed(old_dhtread, periods),
+        timed(dht22.decode, periods)))
+
+
+main()
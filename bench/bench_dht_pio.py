@@ -0,0 +1,152 @@
+# PIO DHT capture against the CPU busy-wait drivers, on CPython, no Pico
+# needed:
+#   python bench/bench_dht_pio.py
+# Replays the same DHT11 and DHT22 traces through dht_pio.DHT, run by the
+# pio_sim.py state machine, and through the busy-wait drivers dht.DHT11 and
+# dht_read.DHTread, first on an idle CPU, then with interrupts stealing
+# 20-150 us from the CPU now and then, as the Wi-Fi driver and the web
+# server do. Reports the reads that came out right, what went wrong with
+# the others, and the pin polls and CPU time of a good read. dht.DHT11 is
+# given one attempt per read, as its retries would need a trace each.
+
+import collections
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from dht_decode import DHT11, DHT22  # noqa: E402
+from pintrace_replay import Board, dht_trace, load_module  # noqa: E402
+
+READS = 200
+PAUSE_MS = 2000
+IRQ_RATE = 0.002  # chance of an interrupt before each pin read
+
+
+def frame(kind, temperature, humidity):
+    if kind == DHT11:
+        data = [int(humidity), round(humidity * 10) % 10,
+                int(abs(temperature)), round(abs(temperature) * 10) % 10]
+        if temperature < 0:
+            data[3] |= 0x80
+    else:
+        h = round(humidity * 10)
+        t = round(abs(temperature) * 10) | (0x8000 if temperature < 0 else 0)
+        data = [h >> 8, h & 0xFF, t >> 8, t & 0xFF]
+    return data + [sum(data) & 0xFF]
+
+
+def readings(kind, rng):
+    result = []
+    for _ in range(READS):
+        temperature = rng.randint(-100 if kind == DHT22 else 0, 400) / 10
+        humidity = rng.randint(200, 900) / 10
+        if kind == DHT11:
+            temperature = float(round(temperature))
+        result.append((temperature, humidity))
+    return result
+
+
+class Result:
+    def __init__(self, name):
+        self.name = name
+        self.good = 0
+        self.errors = collections.Counter()
+        self.polls = 0
+        self.busy_us = 0
+        self.reads = 0
+
+    def add(self, board, reading, expected):
+        self.reads += 1
+        if isinstance(reading, Exception):
+            self.errors[type(reading).__name__] += 1
+        elif (abs(reading[0] - expected[0]) < 0.01
+              and abs(reading[1] - expected[1]) < 0.01):
+            self.good += 1
+            self.polls += board.polls
+            self.busy_us += board.busy_us
+        else:
+            self.errors['wrong value'] += 1
+
+    def report(self, load):
+        errors = ', '.join('{} {}'.format(count, name)
+                           for name, count in self.errors.most_common())
+        good = max(self.good, 1)
+        print('{:22} {:6} {:>5}/{} {:>6.0f} {:>8.0f}  {}'.format(
+            self.name, load, self.good, self.reads, self.polls / good,
+            self.busy_us / good, errors))
+
+
+def replay(name, module, make_read, traces, expected, load):
+    result = Result(name)
+    # a driver that lost an edge would hang: give up 20 ms after the trace
+    board = Board(traces, timeout_ms=20, load=load)
+    with board.install():
+        read = make_read(load_module(module))
+        for values in expected:
+            board.reset_counters()
+            try:
+                reading = read()
+            except Exception as e:
+                reading = e
+            result.add(board, reading, values)
+            board.sleep_ms(PAUSE_MS)
+    return result
+
+
+def pio_read(kind):
+    def make_read(dht_pio):
+        from machine import Pin
+        sensor = dht_pio.DHT(Pin(2), kind)
+
+        def read():
+            sensor.measure()
+            return sensor.temperature, sensor.humidity
+        return read
+    return make_read
+
+
+def dht11_read(dht):
+    from machine import Pin
+    sensor = dht.DHT11(Pin(16, Pin.OUT, Pin.PULL_DOWN))
+
+    def read():
+        # one attempt per trace: measure() would retry with the next one
+        sensor.measure(times=1)
+        return sensor.temperature, sensor.humidity
+    return read
+
+
+def dhtread_read(dht_read):
+    return lambda: dht_read.DHTread(strict=True)
+
+
+def main():
+    rng = random.Random(24)
+    jitter = lambda: rng.randint(-3, 3)  # noqa: E731
+    dht11 = readings(DHT11, rng)
+    dht22 = readings(DHT22, rng)
+    dht11_traces = [dht_trace(frame(DHT11, *r), jitter) for r in dht11]
+    dht22_traces = [dht_trace(frame(DHT22, *r), jitter) for r in dht22]
+
+    def busy():
+        if rng.random() < IRQ_RATE:
+            return rng.randint(20, 150)
+        return 0
+
+    print('{:22} {:6} {:>9} {:>6} {:>8}  {}'.format(
+        'driver', 'load', 'good', 'polls', 'CPU us', 'errors'))
+    for load_name, load in (('idle', None), ('busy', busy)):
+        replay('dht_pio.DHT (DHT11)', 'dht_pio', pio_read(DHT11),
+               dht11_traces, dht11, load).report(load_name)
+        replay('dht.DHT11', 'dht', dht11_read, dht11_traces, dht11,
+               load).report(load_name)
+        replay('dht_pio.DHT (DHT22)', 'dht_pio', pio_read(DHT22),
+               dht22_traces, dht22, load).report(load_name)
+        replay('dht_read.DHTread', 'dht_read', dhtread_read, dht22_traces,
+               dht22, load).report(load_name)
+
+
+main()
@@ -0,0 +1,290 @@
+# Pulse trace replay through the unchanged DHT and HC-SR04 drivers, on
+# CPython, no Pico needed:
+#   python bench/bench_replay.py [dht11.trace dht22.trace echo.trace]
+# Without arguments the traces are built from the datasheet timings with the
+# jitter seen on a Pico, and saved to and read back from the pintrace.py file
+# format first. Recorded traces can be given instead, in the order above.
+#
+# Checks the readings of dht.DHT11, dht_read.DHTread, ultra() in
+# distance_warning.py and picozero's DistanceSensor, then their error paths,
+# and reports the cost of a read: pin polls, tick reads and virtual time on
+# the Board's cost model, plus the CPython wall time of the replay.
+
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import pintrace  # noqa: E402
+from pintrace_replay import (Board, ReplayTimeout, dht_trace,  # noqa: E402
+                             echo_trace, load_functions, load_module,
+                             read_traces)
+
+DHT11_READINGS = [(24.0, 38.0), (19.5, 61.2), (31.0, 20.0), (-2.3, 80.0)]
+DHT22_READINGS = [(21.5, 40.1), (35.8, 22.4), (-10.1, 65.2), (0.0, 99.9)]
+DISTANCES_MM = [30, 150, 275, 400, 1200]
+
+# DHT11 reads must be at least dht.MIN_INTERVAL_US apart, DHT22 reads 2 s
+DHT11_PAUSE_MS = 250
+DHT22_PAUSE_MS = 2000
+
+
+def dht11_frame(temperature, humidity):
+    data = [int(humidity), round(humidity * 10) % 10,
+            int(abs(temperature)), round(abs(temperature) * 10) % 10]
+    if temperature < 0:
+        data[3] |= 0x80
+    return data + [sum(data) & 0xFF]
+
+
+def dht22_frame(temperature, humidity):
+    h = round(humidity * 10)
+    t = round(abs(temperature) * 10) | (0x8000 if temperature < 0 else 0)
+    data = [h >> 8, h & 0xFF, t >> 8, t & 0xFF]
+    return data + [sum(data) & 0xFF]
+
+
+def round_trip(records):
+    # save and load through the file format, as recorded traces would be
+    fd, path = tempfile.mkstemp(suffix='.trace')
+    os.close(fd)
+    try:
+        pintrace.save(path, records[:1])
+        pintrace.save(path, records[1:], append=True)
+        loaded = read_traces(path)
+    finally:
+        os.remove(path)
+    if loaded != [(level, list(deltas)) for level, deltas in records]:
+        raise RuntimeError('traces changed in the file round trip')
+    return loaded
+
+
+def close(a, b, tolerance=0.01):
+    return abs(a[0] - b[0]) < tolerance and abs(a[1] - b[1]) < tolerance
+
+
+class Cost:
+    def __init__(self, name):
+        self.name = name
+        self.reads = 0
+        self.polls = 0
+        self.ticks = 0
+        self.virtual_us = 0
+        self.wall = 0
+
+    @contextlib.contextmanager
+    def read(self, board):
+        board.reset_counters()
+        start = time.perf_counter()
+        yield
+        self.wall += time.perf_counter() - start
+        self.reads += 1
+        self.polls += board.polls
+        self.ticks += board.ticks
+        self.virtual_us += board.elapsed_us
+
+    def report(self):
+        n = self.reads
+        print('{:28} {:>7.0f} {:>7.0f} {:>10.0f} {:>9.1f}'.format(
+            self.name, self.polls / n, self.ticks / n, self.virtual_us / n,
+            self.wall / n * 1e6))
+
+
+def check(name, got, expected, tolerance=0.01):
+    if expected is None:
+        # a recorded trace: nothing to compare with
+        print('{:28} {}'.format(name, got))
+        return
+    ok = got is not None and close(got, expected, tolerance)
+    print('{:28} {:>14} -> {}{}'.format(
+        name, str(expected), got, '' if ok else '  (wrong)'))
+    if not ok:
+        raise RuntimeError('{} read {} instead of {}'.format(name, got,
+                                                             expected))
+
+
+def expect(name, error, call):
+    try:
+        call()
+    except error as e:
+        print('{:28} {}: {}'.format(name, error.__name__,
+                                    str(e).splitlines()[0]))
+    else:
+        raise RuntimeError('{} did not raise {}'.format(name,
+                                                        error.__name__))
+
+
+# ------------- Drivers -------------
+def replay_dht11(traces, readings, cost):
+    board = Board(traces)
+    with board.install():
+        from machine import Pin
+        dht = load_module('dht')
+        sensor = dht.DHT11(Pin(16, Pin.OUT, Pin.PULL_DOWN))
+        for expected in readings:
+            with cost.read(board):
+                sensor.measure()
+            check('dht.DHT11', (sensor.temperature, sensor.humidity),
+                  expected)
+            board.sleep_ms(DHT11_PAUSE_MS)
+
+
+def replay_dht22(traces, readings, cost):
+    board = Board(traces)
+    with board.install():
+        dht_read = load_module('dht_read')
+        for expected in readings:
+            with cost.read(board):
+                reading = dht_read.DHTread()
+            check('dht_read.DHTread', reading, expected)
+            board.sleep_ms(DHT22_PAUSE_MS)
+
+
+def ultra_namespace(board):
+    # the globals of distance_warning.py that ultra() uses; the script itself
+    # runs its main loop at import, so only the function is loaded
+    import machine
+    import utime
+    distances = []
+    namespace = {
+        'utime': utime,
+        'trigger': machine.Pin(3, machine.Pin.OUT),
+        'echo': machine.Pin(2, machine.Pin.IN),
+        'light_range': distances.append,
+    }
+    load_functions(os.path.join(ROOT, 'distance_warning.py'), ['ultra'],
+                   namespace)
+    return namespace['ultra'], distances
+
+
+def replay_ultra(traces, readings, cost):
+    board = Board(traces)
+    with board.install():
+        ultra, distances = ultra_namespace(board)
+        for expected in readings:
+            with cost.read(board), contextlib.redirect_stdout(io.StringIO()):
+                ultra()
+            # the driver measures between two polls, so a few microseconds of
+            # polling granularity, about 1 mm, is expected
+            check('distance_warning.ultra', (distances[-1], 0),
+                  None if expected is None else (expected, 0), 2)
+            board.sleep_ms(50)
+
+
+def replay_picozero(traces, readings, cost):
+    board = Board(traces)
+    with board.install():
+        picozero = load_module('picozero', os.path.join(
+            ROOT, 'distance_warning_files', 'picozero.py'))
+        sensor = picozero.DistanceSensor(echo=2, trigger=3, max_distance=4)
+        for expected in readings:
+            with cost.read(board):
+                distance = sensor.distance
+            check('picozero.DistanceSensor',
+                  None if distance is None else (distance * 1000, 0),
+                  None if expected is None else (expected, 0), 2)
+            board.sleep_ms(50)
+
+
+# ------------- Error paths -------------
+def error_paths(rng):
+    jitter = lambda: rng.randint(-3, 3)  # noqa: E731
+
+    # a flipped bit is caught by the checksum
+    frame = dht22_frame(21.5, 40.1)
+    frame[1] ^= 0x04
+    board = Board([dht_trace(frame, jitter)])
+    with board.install():
+        dht_read = load_module('dht_read')
+        expect('DHTread, flipped bit', dht_read.InvalidChecksum,
+               lambda: dht_read.DHTread(strict=True))
+        if not dht_read.DataError:
+            raise RuntimeError('DHTread did not set DataError')
+
+    # without strict, the reading is still returned, flagged by DataError
+    board = Board([dht_trace(frame, jitter)])
+    with board.install():
+        dht_read = load_module('dht_read')
+        reading = dht_read.DHTread()
+        if not dht_read.DataError:
+            raise RuntimeError('DHTread did not set DataError')
+        print('{:28} returned {} with DataError'.format(
+            'DHTread, flipped bit', reading))
+
+    # a frame cut short fails every retry of dht.py, one trace per attempt
+    level, deltas = dht_trace(dht11_frame(24.0, 38.0), jitter)
+    board = Board([(level, deltas[:50])] * 5)
+    with board.install():
+        from machine import Pin
+        dht = load_module('dht')
+        sensor = dht.DHT11(Pin(16, Pin.OUT, Pin.PULL_DOWN))
+        expect('DHT11, truncated frame', dht.InvalidPulseCount,
+               sensor.measure)
+        if board.reads != 5:
+            raise RuntimeError('dht.py read {} traces in 5 attempts'.format(
+                board.reads))
+
+    # no echo: picozero gives up after 100 ms, ultra() would hang
+    board = Board([echo_trace(None)])
+    with board.install():
+        picozero = load_module('picozero', os.path.join(
+            ROOT, 'distance_warning_files', 'picozero.py'))
+        sensor = picozero.DistanceSensor(echo=2, trigger=3)
+        distance = sensor.distance
+        print('{:28} {}'.format('DistanceSensor, no echo', distance))
+        if distance is not None:
+            raise RuntimeError('DistanceSensor read {} without an echo'.format(
+                distance))
+
+    board = Board([echo_trace(None)], timeout_ms=200)
+    with board.install():
+        ultra, _ = ultra_namespace(board)
+        expect('ultra, no echo', ReplayTimeout, ultra)
+
+
+def main():
+    rng = random.Random(23)
+    jitter = lambda: rng.randint(-3, 3)  # noqa: E731
+    if len(sys.argv) == 4:
+        dht11, dht22, echo = [read_traces(path) for path in sys.argv[1:]]
+        dht11_readings = dht22_readings = distances = None
+    else:
+        dht11 = round_trip([dht_trace(dht11_frame(*r), jitter)
+                            for r in DHT11_READINGS])
+        dht22 = round_trip([dht_trace(dht22_frame(*r), jitter)
+                            for r in DHT22_READINGS])
+        echo = round_trip([echo_trace(d) for d in DISTANCES_MM])
+        # gaps over 65535 us are split in the file
+        round_trip([(0, [70000, 5, 65535]), (1, [])])
+        dht11_readings = DHT11_READINGS
+        dht22_readings = DHT22_READINGS
+        distances = DISTANCES_MM
+
+    costs = [Cost('dht.DHT11'), Cost('dht_read.DHTread'),
+             Cost('distance_warning.ultra'), Cost('picozero.DistanceSensor')]
+    if dht11_readings is None:
+        dht11_readings = [None] * len(dht11)
+        dht22_readings = [None] * len(dht22)
+        distances = [None] * len(echo)
+
+    replay_dht11(dht11, dht11_readings, costs[0])
+    replay_dht22(dht22, dht22_readings, costs[1])
+    replay_ultra(echo, distances, costs[2])
+    replay_picozero(echo, distances, costs[3])
+    print()
+    error_paths(rng)
+
+    print('\nper read: pin polls, tick reads, virtual us, CPython wall us')
+    print('{:28} {:>7} {:>7} {:>10} {:>9}'.format(
+        'driver', 'polls', 'ticks', 'virtual', 'wall'))
+    for cost in costs:
+        cost.report()
+
+
+main()
@@ -1,21 +1,24 @@
 # Reference: https://how2electronics.com/interfacing-dht11-temperature-humidity-sensor-with-raspberry-pi-pico/
 
-import array
+import asyncio
 import micropython
 import utime
 from machine import Pin
 from micropython import const
- 
-class InvalidChecksum(Exception):
-    pass
+from dht_decode import DHT11 as DHT11_FRAME, Decoder, InvalidChecksum
  
 class InvalidPulseCount(Exception):
     pass
  
 MAX_UNCHANGED = const(100)
 MIN_INTERVAL_US = const(200000)
+MIN_INTERVAL_MS = const(200)
 HIGH_LEVEL = const(50)
 EXPECTED_PULSES = const(84)
+
+# the capture starts with the 4 response pulses, then has two pulses per bit,
+# the first of which holds the bit
+DECODER = Decoder(DHT11_FRAME, HIGH_LEVEL, first=4, step=2)
  
 class DHT11:
     _temperature: float
@@ -38,11 +41,7 @@ class DHT11:
  
         self._send_init_signal()
         pulses = self._capture_pulses()
-        buffer = self._convert_pulses_to_buffer(pulses)
-        self._verify_checksum(buffer)
- 
-        self._humidity = buffer[0] + buffer[1] / 10
-        self._temperature = buffer[2] + buffer[3] / 10
+        self._temperature, self._humidity = DECODER.decode(pulses)
         self._last_measure = utime.ticks_us()
     
     def measure(self, times=5):
@@ -102,32 +101,44 @@ class DHT11:
             raise InvalidPulseCount(
                 "Expected {} but got {} pulses".format(EXPECTED_PULSES, idx)
             )
-        return transitions[4:]
- 
-    def _convert_pulses_to_buffer(self, pulses):
-        """Convert a list of 80 pulses into a 5 byte buffer
-        The resulting 5 bytes in the buffer will be:
-            0: Integral relative humidity data
-            1: Decimal relative humidity data
-            2: Integral temperature data
-            3: Decimal temperature data
-            4: Checksum
-        """
-        # Convert the pulses to 40 bits
-        binary = 0
-        for idx in range(0, len(pulses), 2):
-            binary = binary << 1 | int(pulses[idx] > HIGH_LEVEL)
- 
-        # Split into 5 bytes
-        buffer = array.array("B")
-        for shift in range(4, -1, -1):
-            buffer.append(binary >> shift * 8 & 0xFF)
-        return buffer
- 
-    def _verify_checksum(self, buffer):
-        # Calculate checksum
-        checksum = 0
-        for buf in buffer[0:4]:
-            checksum += buf
-        if checksum & 0xFF != buffer[4]:
-            raise InvalidChecksum()
\ No newline at end of file
+        return transitions
+
+
+class AsyncDHT11(DHT11):
+    """A DHT11 whose measure() is a coroutine for asyncio programs. The
+    start signal, the cooldown between reads and the pause before a retry
+    are awaited, so only the capture of the answer, about 5 ms, blocks the
+    event loop."""
+
+    def __init__(self, pin):
+        super().__init__(pin)
+        # ticks_us wraps after about 9 minutes, too soon for the cooldown
+        self._last_ms = utime.ticks_ms()
+
+    async def _send_init_signal_async(self):
+        self._pin.init(Pin.OUT, Pin.PULL_DOWN)
+        self._pin.value(1)
+        await asyncio.sleep_ms(50)
+        self._pin.value(0)
+        await asyncio.sleep_ms(18)
+
+    async def measure(self, times=5):
+        errors = ""
+        for i in range(times):
+            # a retry, or a new reading, waits until the sensor is ready
+            if i or self._temperature > -1 or self._humidity > -1:
+                wait_ms = MIN_INTERVAL_MS - utime.ticks_diff(
+                    utime.ticks_ms(), self._last_ms)
+                if wait_ms > 0:
+                    await asyncio.sleep_ms(min(wait_ms, MIN_INTERVAL_MS))
+            try:
+                await self._send_init_signal_async()
+                pulses = self._capture_pulses()
+                self._temperature, self._humidity = DECODER.decode(pulses)
+                break
+            except Exception as e:
+                errors += "[Try %s] "%i + str(e) + "\n"
+            finally:
+                self._last_ms = utime.ticks_ms()
+        else:
+            raise InvalidPulseCount("Tried %s times, but all failed\n%s" % (times, errors))
@@ -7,19 +7,31 @@ from machine import Pin
 from picozero import pico_temp_sensor, pico_led
 from do_connect import *
 from lcd_out_methods import *
+from template import Template
+from sampler import Sampler
 
-import dht
+from dht_pio import DHT, DHT22
 
-sensor = dht.DHT22(Pin(27)) 
+sensor = DHT(Pin(27), DHT22)
 
-def webpage(temperature, humidity, state):
-    #Template HTML
-    html = f"""
+
+def show(reading):
+    # runs on the sampler core, once per new reading
+    temperature, humidity = reading
+    print("T:"+str(temperature)+"\n")
+    print_two_rows(temperature, humidity)
+
+
+sampler = Sampler()
+sampler.add_dht22('dht22', sensor, on_sample=show)
+NO_READING = ('--', '--')
+
+PAGE = Template("""
             <!DOCTYPE html>
             <html>
               <head>
                 <style>
-                  .block {{
+                  .block {
                     display: block;
                     width: 100%;
                     border: none;
@@ -28,13 +40,13 @@ def webpage(temperature, humidity, state):
                     font-size: 32px;
                     cursor: pointer;
                     text-align: center;
-                  }}
-                  .off {{
+                  }
+                  .off {
                     background-color: #d8d8d8;
-                  }}
-                  h1 {{
+                  }
+                  h1 {
                     text-align: center;
-                  }}
+                  }
                 </style>
               </head>
               <body>
@@ -44,14 +56,13 @@ def webpage(temperature, humidity, state):
                 <form action="./lightoff">
                   <input type="submit" value="Light off" class="block off" />
                 </form>
-                <h1>LED is {state}</h1>
-                <h1>Temperature is {temperature}</h1>
-                <h1>Humidity is {humidity}</h1>
+                <h1>LED is {{state}}</h1>
+                <h1>Temperature is {{temperature}}</h1>
+                <h1>Humidity is {{humidity}}</h1>
               </body>
             </html>
 
-            """
-    return str(html)
+            """)
 
 def serve(connection):
     #Start a web server
@@ -74,18 +85,10 @@ def serve(connection):
             pico_led.off()
             state = 'OFF'
             
-        sensor.measure()
-        time.sleep(1)
-        temperature = sensor.temperature()
-        humidity = sensor.humidity()
-        
-        print("T:"+str(temperature)+"\n")
-        
-        print_two_rows(temperature, humidity)
+        temperature, humidity = sampler.get('dht22', NO_READING)
         
-        html = webpage(temperature, humidity, state)
         client.send('HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n')
-        client.send(html)
+        PAGE.send(client, temperature=temperature, humidity=humidity, state=state)
         client.close()
 
 def open_socket(ip):
@@ -103,6 +106,7 @@ try:
     ip=do_connect()
     if ip is not None:
         connection=open_socket(ip)
+        sampler.start()
         serve(connection)
 except KeyboardInterrupt:
     machine.reset()
\ No newline at end of file
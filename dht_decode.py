@@ -0,0 +1,102 @@
+# Decoder for the 40-bit frame sent by DHT11 and DHT22 sensors
+# - The pulse widths captured by a driver are turned into the 5 byte frame in
+#   one pass: each width is looked up in a 256-entry table that says whether
+#   it is a 0 or a 1, and the bits are packed a byte at a time into a reused
+#   buffer, so no list or big integer is built
+# - The frame is checked against its checksum, then decoded with the table
+#   entry for the sensor type, including negative temperatures
+#
+# Usage:
+#   decoder = Decoder(DHT22, threshold=100)
+#   temperature, humidity = decoder.decode(bit_periods)
+# where bit_periods is a bytearray of 40 widths in microseconds.
+
+try:
+    from micropython import native
+except ImportError:
+    def native(f):
+        return f
+
+DHT11 = 11
+DHT22 = 22
+
+
+class InvalidChecksum(Exception):
+    pass
+
+
+def dht11_values(frame):
+    """Return ``(temperature, humidity)`` from a DHT11 frame. Bit 7 of the
+    temperature decimal byte is the sign, as sent by newer DHT11 parts."""
+    temperature = frame[2] + (frame[3] & 0x7F) / 10
+    if frame[3] & 0x80:
+        temperature = -temperature
+    return temperature, frame[0] + frame[1] / 10
+
+
+def dht22_values(frame):
+    """Return ``(temperature, humidity)`` from a DHT22 frame. Both values
+    are 16-bit tenths, and bit 15 of the temperature is the sign."""
+    temperature = ((frame[2] & 0x7F) << 8 | frame[3]) / 10
+    if frame[2] & 0x80:
+        temperature = -temperature
+    return temperature, (frame[0] << 8 | frame[1]) / 10
+
+
+FORMATS = {
+    DHT11: dht11_values,
+    DHT22: dht22_values,
+}
+
+
+def verify(frame):
+    """Raise :class:`InvalidChecksum` if the last byte of the frame is not
+    the sum of the other four."""
+    if (frame[0] + frame[1] + frame[2] + frame[3]) & 0xFF != frame[4]:
+        raise InvalidChecksum(
+            'Checksum {} does not match data {}'.format(frame[4],
+                                                        bytes(frame[:4])))
+
+
+class Decoder:
+    """Turns captured pulse widths into readings.
+
+    :param kind: The sensor type, :data:`DHT11` or :data:`DHT22`.
+    :param threshold: Widths above this many microseconds are 1 bits.
+    :param first: The index of the width of the first bit.
+    :param step: The distance between the widths of consecutive bits, 2 when
+                 the capture holds both the low and the high pulses.
+    """
+    def __init__(self, kind, threshold, first=0, step=1):
+        self.values = FORMATS[kind]
+        self.table = bytes([1 if width > threshold else 0
+                            for width in range(256)])
+        self.first = first
+        self.step = step
+        self.buffer = bytearray(5)
+
+    @native
+    def frame(self, widths):
+        """Return the 5 byte frame encoded by 40 pulse widths, each from 0
+        to 255. The returned bytearray is reused by the next call."""
+        table = self.table
+        buffer = self.buffer
+        first = self.first
+        step = self.step
+        n = 0
+        # each byte starts as a 1 that reaches bit 8 after the 8th bit
+        byte = 1
+        for i in range(first, first + 40 * step, step):
+            byte = byte << 1 | table[widths[i]]
+            if byte > 0xFF:
+                buffer[n] = byte & 0xFF
+                n += 1
+                byte = 1
+        return buffer
+
+    def decode(self, widths):
+        """Return ``(temperature, humidity)`` from 40 pulse widths, or raise
+        :class:`InvalidChecksum`."""
+        frame = self.frame(widths)
+        verify(frame)
+        return self.values(frame)
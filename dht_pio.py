@@ -0,0 +1,177 @@
+# DHT11 and DHT22 reads timed by a PIO state machine instead of the CPU
+# - The CPU holds the line low for the start pulse and sleeps; the state
+#   machine then releases the line, waits for the sensor's answer and counts
+#   the high pulse of each of the 40 bits, 4 us per count, in hardware
+# - The widths are packed 6 to a word, 5 bits each, so the whole frame is 7
+#   words and fits in the joined 8-word RX FIFO: nothing has to be read
+#   while the sensor is sending, and every word is a small int
+# - The CPU never polls the pin, so interrupts, the web server and the Wi-Fi
+#   driver can no longer stretch or drop pulses, and a read costs the CPU a
+#   few register accesses instead of 5 ms of polling
+# - On Linux, pintrace_replay.Board provides an rp2 module backed by
+#   pio_sim.py that runs the same program against recorded traces
+#
+# Usage:
+#   sensor = DHT(Pin(2), DHT22)
+#   sensor.measure()
+#   print(sensor.temperature, sensor.humidity)
+# or, in an asyncio program, with AsyncDHT and await sensor.measure(), which
+# only blocks the event loop for the 1.1 ms start pulse of a DHT22.
+
+import asyncio
+import rp2
+import utime
+from machine import Pin
+from micropython import const
+from rp2 import PIO, asm_pio
+
+from dht_decode import DHT11, DHT22, Decoder, InvalidChecksum
+
+FREQ = const(500000)  # the counting loop takes 2 cycles: one count per 4 us
+UNIT_US = const(4)
+THRESHOLD = const(12)  # high pulses longer than 48 us are 1 bits
+BITS = const(40)
+WORDS = const(7)  # 6 widths per word, 4 in the last one
+START_US = {DHT11: 18000, DHT22: 1100}
+MIN_INTERVAL_MS = {DHT11: 200, DHT22: 2000}  # between reads, as in sampler.py
+# answer, 40 bits of at most 120 us and the 128 us that end the frame
+FRAME_MS = const(6)
+
+
+class CaptureError(Exception):
+    pass
+
+
+@asm_pio(set_init=PIO.IN_LOW, in_shiftdir=PIO.SHIFT_LEFT, autopush=True,
+         push_thresh=30, fifo_join=PIO.JOIN_RX)
+def dht_capture():
+    # the CPU has held the line low with exec('set(pindirs, 1)')
+    set(pindirs, 0)             # release the line to the pull-up
+    wait(0, pin, 0)             # answer: 80 us low
+    wait(1, pin, 0)             # and 80 us high
+    wrap_target()
+    wait(0, pin, 0)             # 50 us low before each bit
+    set(x, 31)
+    wait(1, pin, 0)
+    label('high')               # count down while the line is high
+    jmp(pin, 'count')
+    jmp('done')
+    label('count')
+    jmp(x_dec, 'high')
+    push()                      # high for 128 us: the frame is over, flush
+    label('done')
+    mov(x, invert(x))           # the count, or 0 after a flush
+    in_(x, 5)
+    wrap()
+
+
+class DHT:
+    """A DHT11 or DHT22 sensor read by a PIO state machine.
+
+    :param pin: The data line.
+    :param kind: The sensor type, :data:`DHT11` or :data:`DHT22`.
+    :param sm_id: The state machine to use, 0 to 7. The default leaves the
+                  first PIO block to other programs, such as ws2812.py.
+    """
+    def __init__(self, pin, kind=DHT22, sm_id=4):
+        pin.init(Pin.IN, Pin.PULL_UP)
+        self.kind = kind
+        self.decoder = Decoder(kind, THRESHOLD)
+        self.widths = bytearray(BITS)
+        self.sm = rp2.StateMachine(sm_id, dht_capture, freq=FREQ,
+                                   set_base=pin, in_base=pin, jmp_pin=pin)
+        self._temperature = -1
+        self._humidity = -1
+
+    def start(self):
+        """Pull the line low to start a read. Call :meth:`release` after
+        ``START_US[kind]`` microseconds."""
+        sm = self.sm
+        sm.active(0)
+        sm.restart()
+        while sm.rx_fifo():
+            sm.get()
+        sm.exec('set(pindirs, 1)')
+
+    def release(self):
+        """End the start pulse and let the state machine capture the
+        frame. Call :meth:`collect` after ``FRAME_MS`` milliseconds."""
+        self.sm.active(1)
+
+    def collect(self):
+        """Decode the captured frame, or raise :class:`CaptureError` or
+        :class:`InvalidChecksum`."""
+        sm = self.sm
+        words = sm.rx_fifo()
+        sm.active(0)
+        if words < WORDS:
+            raise CaptureError('No answer from the sensor' if not words else
+                               'Frame cut short after {} words'.format(words))
+        widths = self.widths
+        i = 0
+        for word in range(WORDS):
+            value = sm.get()
+            shift = 25 if word < WORDS - 1 else 15
+            while shift >= 0:
+                widths[i] = value >> shift & 0x1F
+                i += 1
+                shift -= 5
+        if b'\x00' in widths:
+            raise CaptureError('A bit was longer than {} us'.format(
+                31 * UNIT_US))
+        self._temperature, self._humidity = self.decoder.decode(widths)
+
+    def measure(self):
+        self.start()
+        utime.sleep_us(START_US[self.kind])
+        self.release()
+        utime.sleep_ms(FRAME_MS)
+        self.collect()
+
+    @property
+    def humidity(self):
+        return self._humidity
+
+    @property
+    def temperature(self):
+        return self._temperature
+
+
+class AsyncDHT(DHT):
+    """A :class:`DHT` whose measure() is a coroutine for asyncio programs.
+    The capture, the cooldown between reads and the pause before a retry
+    are awaited, and so is the 18 ms start pulse of a DHT11, which only
+    needs to be long enough. The 1.1 ms start pulse of a DHT22 is timed
+    with ``utime.sleep_us``, as an awaited sleep could overrun it by a whole
+    scheduler tick."""
+    def __init__(self, pin, kind=DHT22, sm_id=4):
+        super().__init__(pin, kind, sm_id)
+        self._last_ms = None
+
+    async def measure(self, times=5):
+        errors = ''
+        for i in range(times):
+            # a retry, or a new reading, waits until the sensor is ready
+            if self._last_ms is not None:
+                wait_ms = MIN_INTERVAL_MS[self.kind] - utime.ticks_diff(
+                    utime.ticks_ms(), self._last_ms)
+                if wait_ms > 0:
+                    await asyncio.sleep_ms(min(wait_ms,
+                                               MIN_INTERVAL_MS[self.kind]))
+            self.start()
+            if self.kind == DHT11:
+                await asyncio.sleep_ms(START_US[DHT11] // 1000)
+            else:
+                utime.sleep_us(START_US[self.kind])
+            self.release()
+            await asyncio.sleep_ms(FRAME_MS)
+            try:
+                self.collect()
+                break
+            except Exception as e:
+                errors += '[Try {}] {}\n'.format(i, e)
+            finally:
+                self._last_ms = utime.ticks_ms()
+        else:
+            raise CaptureError('Tried {} times, but all failed\n{}'.format(
+                times, errors))
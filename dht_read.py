@@ -1,22 +1,26 @@
 from machine import Pin
+import asyncio
 import time
+from dht_decode import DHT22, Decoder, InvalidChecksum, verify
 dht_pin=2
 DataError=False
+MIN_INTERVAL_MS=2000 #the DHT22 needs 2s between readings
+lastread=None #ticks_ms of the last DHTreadAsync
 
-bitstream=[0]*40
+bitstream=bytearray(40) #bit periods in us, reused by every read
 
-def DHTread():
-    #set variales to zero initially, as we perform logical OR operation on them.
-    hum_hob=0  #higher order bytes of humidity
-    hum_lob=0  # lower order bytes of humidity
-    temp_hob=0
-    temp_lob=0
-    checksum=0 
-    humidity=-1
-    temperature=-1000
-    lastreadtime=0   #used to calculate bit period
-    bitstream=[0]*40 #array to hold bit period
-      
+#A bit is sent in the form of LOW pulse followed by a HIGH pulse.All low pulses
+# are 50us in duration. If the HIGH pulse following the LOW pulse
+# is 24us-28us in duration, the bit is 0. If the HIGH pulse following the LOW pulse
+# is 70us in duration, the bit is 1.
+# So if bit period(HIGH pulse+LOW pulse) is less than 100us, then the bit is 0, else 1.
+decoder=Decoder(DHT22, 99)
+
+#DHTread, DHTreadAsync and capture return (temperature, humidity) and set
+# DataError=True when the checksum does not match, as they always did. Pass
+# strict=True to have them raise InvalidChecksum instead.
+
+def DHTread(strict=False):
     # Trigger Sensor to begin communication
     #Send a low pulse of 1.1ms duration. Datasheet specifies atleast 1ms
     dht=Pin(dht_pin, Pin.OUT)
@@ -25,6 +29,31 @@ def DHTread():
     #send a high pulse of 40us duration
     dht.high()
     time.sleep_us(40)
+    return capture(strict)
+
+async def DHTreadAsync(strict=False):
+    #Same as DHTread for asyncio programs: the wait for the sensor to be ready
+    # (2s between readings) and the start pulse are awaited, so only the
+    # capture (about 5ms) blocks the other tasks
+    global lastread
+    if lastread is not None:
+        wait=MIN_INTERVAL_MS-time.ticks_diff(time.ticks_ms(),lastread)
+        if wait>0:
+            await asyncio.sleep_ms(wait)
+    dht=Pin(dht_pin, Pin.OUT)
+    dht.low()
+    await asyncio.sleep_ms(2) #Datasheet specifies atleast 1ms
+    dht.high()
+    time.sleep_us(40)
+    try:
+        return capture(strict)
+    finally:
+        lastread=time.ticks_ms()
+
+def capture(strict=False):
+    #Timing critical part of a read, after the start pulse
+    global DataError
+    lastreadtime=0   #used to calculate bit period
     #set pin as pullup and wait for signal from DHT
     dht=Pin(dht_pin, Pin.IN, Pin.PULL_UP)
     
@@ -41,46 +70,18 @@ def DHTread():
             pass #wait while dht pulls pin low
         while (dht.value()==1):
             pass #wait while dht pulls pin high
-        bitstream[i]=time.ticks_us()-lastreadtime #stores bit period of a single bit.
+        bitstream[i]=min(time.ticks_diff(time.ticks_us(),lastreadtime),255) #stores bit period of a single bit.
     
-    #Convert bit period to binary data.
-    #A bit is sent in the form of LOW pulse followed by a HIGH pulse.All low pulses
-    # are 50us in duration. If the HIGH pulse following the LOW pulse
-    # is 24us-28us in duration, the bit is 0. If the HIGH pulse following the LOW pulse
-    # is 70us in duration, the bit is 1.
-    # So if bit period(HIGH pulse+LOW pulse) is less than 100us, then the bit is 0, else 1. 
-    for i in range (0,40):
-        if(bitstream[i] < 100):
-            bitstream[i]=0
-        else:
-            bitstream[i]=1
-    #First 16 bit contains humidity data, next 16 bit contains temperature data.
-    # Last 8 bits gives checksum.
-    #Seperate the 40 bit data to 5 8-bit banks.
-    for i in range (8,0,-1):
-        if(bitstream[8-i]==1):
-            hum_hob|=1<<(i-1)
-    for i in range (8,0,-1):
-        if(bitstream[16-i]==1):
-            hum_lob|=1<<i-1
-    for i in range (8,0,-1):
-        if(bitstream[24-i]==1):
-            temp_hob|=1<<i-1
-    for i in range (8,0,-1):
-        if(bitstream[32-i]==1):
-            temp_lob|=1<<i-1
-    for i in range (8,0,-1):
-        if(bitstream[40-i]==1):
-            checksum|=1<<i-1
-
-    if (checksum==(hum_hob+hum_lob+temp_hob+temp_lob)):
-        DataError=False;
+    #First 16 bits contain humidity data, next 16 bits temperature data and
+    # the last 8 bits the checksum. A corrupted frame sets DataError, or
+    # raises InvalidChecksum if strict.
+    frame=decoder.frame(bitstream)
+    try:
+        verify(frame)
+    except InvalidChecksum:
+        DataError=True
+        if strict:
+            raise
     else:
-        DataError=True;
-    #Bitwise shifting and OR operation to convert raw data. The raw data is 10 times more than real values.    
-    humidity=((hum_hob)<<8)|hum_lob;
-    humidity*=0.1;
-    temperature=((temp_hob&0x7f)<<8)|temp_lob;
-    temperature*=0.1;
-    
-    return temperature, humidity
\ No newline at end of file
+        DataError=False
+    return decoder.values(frame)
\ No newline at end of file
@@ -7,6 +7,7 @@ from machine import Pin
 from picozero import pico_temp_sensor, pico_led
 from secrets import *
 from do_connect import *
+from template import Template
 
 
 #from dht_read import *
@@ -15,14 +16,12 @@ import dht
 
 sensor = dht.DHT22(Pin(27)) 
 
-def webpage(temperature, humidity, state):
-    #Template HTML
-    html = f"""
+PAGE = Template("""
             <!DOCTYPE html>
             <html>
               <head>
                 <style>
-                  .block {{
+                  .block {
                     display: block;
                     width: 100%;
                     border: none;
@@ -31,13 +30,13 @@ def webpage(temperature, humidity, state):
                     font-size: 32px;
                     cursor: pointer;
                     text-align: center;
-                  }}
-                  .off {{
+                  }
+                  .off {
                     background-color: #d8d8d8;
-                  }}
-                  h1 {{
+                  }
+                  h1 {
                     text-align: center;
-                  }}
+                  }
                 </style>
               </head>
               <body>
@@ -47,14 +46,13 @@ def webpage(temperature, humidity, state):
                 <form action="./lightoff">
                   <input type="submit" value="Light off" class="block off" />
                 </form>
-                <h1>LED is {state}</h1>
-                <h1>Temperature is {temperature}</h1>
-                <h1>Humidity is {humidity}</h1>
+                <h1>LED is {{state}}</h1>
+                <h1>Temperature is {{temperature}}</h1>
+                <h1>Humidity is {{humidity}}</h1>
               </body>
             </html>
 
-            """
-    return str(html)
+            """)
 
 def serve(connection):
     #Start a web server
@@ -82,9 +80,8 @@ def serve(connection):
         temperature = 0 #sensor.temperature()
         humidity = 0 #sensor.humidity()
         
-        html = webpage(temperature, humidity, state)
         client.send('HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n')
-        client.send(html)
+        PAGE.send(client, temperature=temperature, humidity=humidity, state=state)
         client.close()
 
 def open_socket(ip):
@@ -0,0 +1,149 @@
+# Pulse trace recording for the DHT and HC-SR04 drivers
+# - A Recorder timestamps every edge of a sensor line with a hard pin IRQ
+#   while an unchanged driver reads the sensor, so the trace is the real
+#   signal and not what the driver made of it
+# - Traces are saved to a compact binary file that pintrace_replay.py feeds
+#   back to the same drivers on Linux
+#
+# Usage, on the Pico:
+#   recorder = Recorder(27, host_edges=2)  # DHT22: start pulse and release
+#   for _ in range(20):
+#       recorder.record(sensor.measure)
+#       utime.sleep(2)
+#   recorder.save('dht22.trace')
+# or, for an HC-SR04, Recorder(echo_pin, trigger=trigger_pin).
+#
+# File format, little-endian: b'PTRC', a version byte, then one record per
+# read: the line level at the anchor (1 byte), the number of entries (2
+# bytes) and the entries (2 bytes each). Each entry is the number of
+# microseconds from the previous edge, or from the anchor for the first one,
+# to the next edge. 0xFFFF adds 65535 us without an edge. The anchor is the
+# last edge caused by the Pico: the release of a DHT line, or the falling
+# edge of an HC-SR04 trigger.
+
+from array import array
+
+MAGIC = b'PTRC'
+VERSION = 1
+EXTEND = 0xFFFF
+
+
+def encode(level, deltas):
+    """Return the bytes of one record.
+
+    :param level: The line level at the anchor, 0 or 1.
+    :param deltas: The microseconds between consecutive edges, starting at
+                   the anchor.
+    """
+    entries = array('H')
+    for delta in deltas:
+        while delta >= EXTEND:
+            entries.append(EXTEND)
+            delta -= EXTEND
+        entries.append(delta)
+    n = len(entries)
+    return bytes([level, n & 0xFF, n >> 8]) + bytes(entries)
+
+
+def save(path, records, append=False):
+    """Write records to a trace file.
+
+    :param path: The file name.
+    :param records: A list of ``(level, deltas)`` tuples.
+    :param append: Add the records to an existing file instead of replacing
+                   it.
+    """
+    with open(path, 'ab' if append else 'wb') as f:
+        if not append or f.tell() == 0:
+            f.write(MAGIC + bytes([VERSION]))
+        for level, deltas in records:
+            f.write(encode(level, deltas))
+
+
+class Recorder:
+    """Records the edges of a sensor line while a driver reads it.
+
+    :param pin: The GPIO number of the line to record, the DHT data line or
+                the HC-SR04 echo.
+    :param trigger: The GPIO number of a separate trigger line. Its last edge
+                    before the first edge of ``pin`` is the anchor.
+    :param host_edges: The number of edges of ``pin`` that the driver itself
+                       makes before the sensor answers. The last of them is
+                       the anchor.
+    :param size: The maximum number of edges per read.
+
+    The IRQ handler costs a few microseconds per edge, which can disturb the
+    driver's own timing loops while recording. The recorded edge times are
+    not affected, as they are taken at the start of the handler.
+    """
+    def __init__(self, pin, trigger=None, host_edges=0, size=256):
+        from machine import Pin
+        self.pin = Pin(pin)
+        self.trigger = Pin(trigger) if trigger is not None else None
+        self.host_edges = host_edges
+        self.times = array('I', [0] * size)
+        self.sources = bytearray(size)  # 1 for edges of the trigger line
+        self.levels = bytearray(size)
+        self.count = 0
+        self.records = []
+
+    def _edge(self, pin):
+        # hard IRQ handler: must not allocate
+        n = self.count
+        if n < len(self.times):
+            self.times[n] = self._ticks_us()
+            self.sources[n] = pin is self.trigger
+            self.levels[n] = pin.value()
+            self.count = n + 1
+
+    def record(self, read, *args):
+        """Call ``read(*args)`` with the line recorded, keep the record and
+        return whatever ``read`` returned or raised."""
+        import utime
+        from machine import Pin
+        self._ticks_us = utime.ticks_us
+        self.count = 0
+        self.start = utime.ticks_us()
+        handler = self._edge
+        pins = [self.pin] if self.trigger is None else [self.pin,
+                                                         self.trigger]
+        for pin in pins:
+            pin.irq(handler, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+        try:
+            return read(*args)
+        finally:
+            for pin in pins:
+                pin.irq(handler=None)
+            self.records.append(self._trace(utime.ticks_diff))
+
+    def _trace(self, ticks_diff):
+        # the anchor defaults to the start of the read
+        anchor = self.start
+        level = None
+        host = 0
+        edges = []
+        for i in range(self.count):
+            if self.sources[i]:
+                if not edges:
+                    anchor = self.times[i]
+                continue
+            if host < self.host_edges:
+                host += 1
+                anchor = self.times[i]
+                level = self.levels[i]
+                continue
+            if level is None:
+                level = 1 - self.levels[i]
+            edges.append(self.times[i])
+        if level is None:
+            level = self.pin.value()
+        deltas = []
+        for t in edges:
+            deltas.append(ticks_diff(t, anchor))
+            anchor = t
+        return level, deltas
+
+    def save(self, path, append=False):
+        """Write the recorded reads to a trace file and forget them."""
+        save(path, self.records, append)
+        self.records = []
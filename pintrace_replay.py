@@ -0,0 +1,471 @@
+# Replay of recorded pulse traces through the unchanged sensor drivers, on
+# Linux with CPython
+# - A Board stands in for the Pico: its machine, utime/time, micropython,
+#   rp2 (pio_sim.py) and asyncio modules run on a virtual microsecond clock,
+#   and every input pin reads the level of the current trace at the virtual
+#   time
+# - Pin reads, tick reads and pin setup advance the clock by a fixed cost,
+#   so the drivers' polling loops see pulse widths as they would on a Pico,
+#   and sleeps advance it by their duration
+# - A trace starts at the last edge the driver makes (its anchor); the first
+#   edge after inputs were read moves on to the next trace
+# - The counters give the cost of each read in pin polls, tick reads,
+#   virtual time and the part of it the CPU was busy
+#
+# Usage:
+#   board = Board(read_traces('dht22.trace'))
+#   with board.install():
+#       import dht_read
+#       print(dht_read.DHTread())
+
+import ast
+import bisect
+import importlib
+import importlib.util
+import sys
+import time as _time
+import types
+from array import array
+from contextlib import contextmanager
+
+import pio_sim
+from pintrace import EXTEND, MAGIC, VERSION
+
+TICKS_PERIOD = 1 << 30  # ticks_us() and ticks_ms() wrap like on the Pico
+
+
+class TraceExhausted(Exception):
+    """Raised when a driver starts a read and no trace is left."""
+
+
+class ReplayTimeout(Exception):
+    """Raised when a driver keeps polling long after its trace ended, where
+    the driver would hang on real hardware."""
+
+
+def parse(data):
+    """Return the records of a trace file, as ``(level, deltas)`` tuples."""
+    if data[:4] != MAGIC or data[4] != VERSION:
+        raise ValueError('Not a version {} pulse trace'.format(VERSION))
+    records = []
+    pos = 5
+    while pos < len(data):
+        level = data[pos]
+        n = data[pos + 1] | data[pos + 2] << 8
+        entries = array('H')
+        entries.frombytes(data[pos + 3:pos + 3 + 2 * n])
+        if sys.byteorder == 'big':
+            entries.byteswap()
+        pos += 3 + 2 * n
+        deltas = []
+        extra = 0
+        for entry in entries:
+            if entry == EXTEND:
+                extra += EXTEND
+            else:
+                deltas.append(extra + entry)
+                extra = 0
+        records.append((level, deltas))
+    return records
+
+
+def read_traces(path):
+    """Return the records of a trace file."""
+    with open(path, 'rb') as f:
+        return parse(f.read())
+
+
+# ------------- Traces built from datasheet timings -------------
+def dht_trace(frame, jitter=None):
+    """Return the record of a DHT answer carrying a 5 byte frame, anchored
+    at the release of the line.
+
+    :param frame: The 5 bytes sent by the sensor.
+    :param jitter: An optional function returning a few microseconds to add
+                   to each pulse, e.g. ``lambda: random.randint(-3, 3)``.
+    """
+    j = jitter or (lambda: 0)
+    deltas = [30 + j(), 80 + j(), 80 + j()]  # wait, answer low, answer high
+    for byte in frame:
+        for shift in range(7, -1, -1):
+            deltas.append(50 + j())
+            deltas.append((70 if byte >> shift & 1 else 27) + j())
+    deltas.append(50 + j())  # end of frame, then the line is released
+    return 1, deltas
+
+
+def echo_trace(distance_mm, delay_us=450):
+    """Return the record of an HC-SR04 echo for an object at a distance,
+    anchored at the falling edge of the trigger, or no echo at all if
+    ``distance_mm`` is ``None``."""
+    if distance_mm is None:
+        return 0, []
+    return 0, [delay_us, round(distance_mm / 0.1715)]
+
+
+# ------------- The virtual Pico -------------
+class Board:
+    """A virtual Pico that replays traces to the drivers.
+
+    :param traces: A list of ``(level, deltas)`` records, one per read.
+    :param poll_us: The cost of reading a pin.
+    :param tick_us: The cost of reading ``ticks_us()`` or ``ticks_ms()``.
+    :param setup_us: The cost of creating or configuring a pin.
+    :param timeout_ms: How long after the end of its trace a driver may keep
+                       polling before :class:`ReplayTimeout` is raised.
+    :param load: An optional function returning the microseconds the CPU
+                 loses to interrupts before each pin read, e.g. to the Wi-Fi
+                 driver and the web server. PIO state machines do not lose
+                 any.
+    """
+    def __init__(self, traces, poll_us=3, tick_us=2, setup_us=30,
+                 timeout_ms=1000, load=None):
+        self.traces = []
+        for level, deltas in traces:
+            edges = []
+            t = 0
+            for delta in deltas:
+                t += delta
+                edges.append(t)
+            self.traces.append((level, edges))
+        self.poll_us = poll_us
+        self.tick_us = tick_us
+        self.setup_us = setup_us
+        self.timeout_us = timeout_ms * 1000
+        self.load = load
+        self.now = 0
+        self.index = -1
+        self.anchor = 0
+        self.polled = True
+        self.reads = 0  # the number of traces the drivers started reading
+        self.reset_counters()
+
+    def reset_counters(self):
+        """Zero the counters, usually before each read."""
+        self.polls = 0
+        self.ticks = 0
+        self.slept_us = 0
+        self.start = self.now
+
+    @property
+    def elapsed_us(self):
+        """The virtual time since the counters were reset."""
+        return self.now - self.start
+
+    @property
+    def busy_us(self):
+        """The virtual time the CPU did not sleep since the counters were
+        reset."""
+        return self.elapsed_us - self.slept_us
+
+    def advance(self, us):
+        self.now += us
+
+    def edge(self, t=None):
+        """Called when the driver changes the line, at virtual time ``t`` or
+        now: it starts a new read, or is still sending its start signal."""
+        if self.polled:
+            self.index += 1
+            self.polled = False
+        self.anchor = self.now if t is None else t
+
+    def level(self):
+        level = self.level_at(self.now)
+        if self.index >= 0:
+            edges = self.traces[self.index][1]
+            t = self.now - self.anchor
+            if t - (edges[-1] if edges else 0) > self.timeout_us:
+                raise ReplayTimeout('Driver still polling {} ms after the '
+                                    'end of trace {}'.format(t // 1000,
+                                                             self.index))
+        return level
+
+    def level_at(self, t):
+        """Return the level of the line at virtual time ``t``, for readers
+        that run beside the CPU such as a PIO state machine."""
+        if not self.polled:
+            self.polled = True
+            self.reads += 1
+            if self.index >= len(self.traces):
+                raise TraceExhausted('No trace left for read {}'.format(
+                    self.index))
+        if self.index < 0:
+            return 0
+        level, edges = self.traces[self.index]
+        return level ^ (bisect.bisect_right(edges, t - self.anchor) & 1)
+
+    def next_edge(self, t):
+        """Return the virtual time of the first edge of the current trace
+        after ``t``, or ``None``."""
+        if not 0 <= self.index < len(self.traces):
+            return None
+        edges = self.traces[self.index][1]
+        i = bisect.bisect_right(edges, t - self.anchor)
+        return self.anchor + edges[i] if i < len(edges) else None
+
+    # time functions
+    def ticks_us(self):
+        self.ticks += 1
+        self.advance(self.tick_us)
+        return self.now % TICKS_PERIOD
+
+    def ticks_ms(self):
+        self.ticks += 1
+        self.advance(self.tick_us)
+        return self.now // 1000 % TICKS_PERIOD
+
+    @staticmethod
+    def ticks_add(ticks, delta):
+        return (ticks + delta) % TICKS_PERIOD
+
+    @staticmethod
+    def ticks_diff(end, start):
+        diff = (end - start) % TICKS_PERIOD
+        return diff - TICKS_PERIOD if diff >= TICKS_PERIOD // 2 else diff
+
+    def sleep_us(self, us):
+        self.slept_us += int(us)
+        self.advance(int(us))
+
+    def sleep_ms(self, ms):
+        self.sleep_us(ms * 1000)
+
+    def sleep(self, seconds):
+        self.sleep_us(seconds * 1000000)
+
+    def modules(self):
+        """Return the stand-in modules, by name."""
+        board = self
+
+        class Pin:
+            IN = 0
+            OUT = 1
+            OPEN_DRAIN = 2
+            PULL_UP = 1
+            PULL_DOWN = 2
+            IRQ_FALLING = 4
+            IRQ_RISING = 8
+
+            def __init__(self, id, mode=-1, pull=-1, value=None, **kwargs):
+                self.id = id
+                self.mode = self.IN
+                self.out = 1
+                self.init(mode, pull, value)
+
+            def init(self, mode=-1, pull=-1, value=None, **kwargs):
+                board.advance(board.setup_us)
+                if value is not None:
+                    self.write(value)
+                if mode != -1 and mode != self.mode:
+                    # switching to input releases the line and switching to
+                    # output drives it, both are edges made by the driver
+                    self.mode = mode
+                    board.edge()
+
+            def write(self, value):
+                value = 1 if value else 0
+                if self.mode == self.OUT and value != self.out:
+                    board.edge()
+                self.out = value
+
+            def value(self, value=None):
+                if value is not None:
+                    board.advance(board.poll_us)
+                    self.write(value)
+                    return None
+                board.polls += 1
+                board.advance(board.poll_us)
+                if board.load is not None:
+                    board.advance(board.load())
+                if self.mode == self.OUT:
+                    return self.out
+                return board.level()
+
+            def __call__(self, value=None):
+                return self.value(value)
+
+            def on(self):
+                self.value(1)
+
+            def off(self):
+                self.value(0)
+
+            high = on
+            low = off
+
+            def toggle(self):
+                self.value(1 - self.out)
+
+            def irq(self, *args, **kwargs):
+                pass
+
+        class Peripheral:
+            # ADC, PWM and Timer, for drivers that create them at import
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def read_u16(self):
+                return 0
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: None
+
+        machine = types.ModuleType('machine')
+        machine.Pin = Pin
+        machine.ADC = machine.PWM = machine.Timer = machine.I2C = Peripheral
+        machine.freq = lambda *args: 125000000
+        machine.reset = lambda: None
+
+        utime = types.ModuleType('utime')
+        utime.__dict__.update(_time.__dict__)
+        for name in ('ticks_us', 'ticks_ms', 'ticks_add', 'ticks_diff',
+                     'sleep_us', 'sleep_ms', 'sleep'):
+            setattr(utime, name, getattr(self, name))
+
+        micropython = types.ModuleType('micropython')
+        micropython.const = lambda value: value
+        micropython.native = micropython.viper = lambda f: f
+        micropython.schedule = lambda f, arg: f(arg)
+
+        asyncio = Loop(self).module()
+
+        return {'machine': machine, 'utime': utime, 'time': utime,
+                'micropython': micropython, 'rp2': pio_sim.module(self),
+                'asyncio': asyncio, 'uasyncio': asyncio}
+
+    @contextmanager
+    def install(self):
+        """Put the stand-in modules in ``sys.modules`` for the duration of
+        the ``with`` block. Drivers must be imported inside the block, and
+        are unloaded again at the end of it."""
+        saved = dict(sys.modules)
+        sys.modules.update(self.modules())
+        try:
+            yield self
+        finally:
+            sys.modules.clear()
+            sys.modules.update(saved)
+
+
+class Sleep:
+    def __init__(self, until):
+        self.until = until
+
+    def __await__(self):
+        yield self
+
+
+class Task:
+    """A coroutine run by a :class:`Loop`."""
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.error = None
+        self.waiters = []
+
+    def __await__(self):
+        if not self.done:
+            yield self
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Loop:
+    """An event loop on the virtual clock of a Board, standing in for
+    asyncio. Sleeping tasks wake at their virtual time, and while no task
+    is ready the clock jumps to the next wake up, so a coroutine that
+    blocks delays the others by exactly the virtual time it takes.
+
+    Only the parts of asyncio the drivers and benchmarks use are provided:
+    ``run()``, ``create_task()``, ``sleep()`` and ``sleep_ms()``.
+    """
+    def __init__(self, board):
+        self.board = board
+        self.ready = []
+        self.count = 0
+
+    def schedule(self, task, at):
+        self.count += 1
+        bisect.insort(self.ready, (at, self.count, task))
+
+    def create_task(self, coro):
+        task = Task(coro)
+        self.schedule(task, self.board.now)
+        return task
+
+    def sleep_ms(self, ms):
+        return Sleep(self.board.now + int(ms * 1000))
+
+    def sleep(self, seconds):
+        return Sleep(self.board.now + int(seconds * 1000000))
+
+    def run(self, coro):
+        board = self.board
+        main = self.create_task(coro)
+        while not main.done:
+            if not self.ready:
+                raise RuntimeError('No task left to run')
+            at, _, task = self.ready.pop(0)
+            if at > board.now:
+                board.slept_us += at - board.now
+                board.now = at
+            try:
+                awaited = task.coro.send(None)
+            except BaseException as e:
+                task.done = True
+                if isinstance(e, StopIteration):
+                    task.result = e.value
+                else:
+                    task.error = e
+                    if task is main:
+                        raise
+                for waiter in task.waiters:
+                    self.schedule(waiter, board.now)
+                continue
+            if isinstance(awaited, Sleep):
+                self.schedule(task, awaited.until)
+            elif isinstance(awaited, Task) and not awaited.done:
+                awaited.waiters.append(task)
+            else:
+                self.schedule(task, board.now)
+        return main.result
+
+    def module(self):
+        asyncio = types.ModuleType('asyncio')
+        for name in ('run', 'create_task', 'sleep', 'sleep_ms'):
+            setattr(asyncio, name, getattr(self, name))
+        asyncio.Task = Task
+        return asyncio
+
+
+def load_module(name, path=None):
+    """Import a driver module afresh, optionally from a file that is not on
+    ``sys.path``. Call it inside :meth:`Board.install`."""
+    sys.modules.pop(name, None)
+    if path is None:
+        return importlib.import_module(name)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_functions(path, names, namespace):
+    """Load some functions from a script without running it, for drivers
+    that live in scripts with a main loop, such as ``ultra()`` in
+    distance_warning.py.
+
+    :param path: The script.
+    :param names: The names of the functions to load.
+    :param namespace: The globals the functions will see, typically the
+                      stand-in modules and the pins the script creates.
+    Returns the namespace, with the functions added.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    tree.body = [node for node in tree.body
+                 if isinstance(node, ast.FunctionDef) and node.name in names]
+    exec(compile(tree, path, 'exec'), namespace)
+    return namespace
@@ -0,0 +1,455 @@
+# PIO state machine simulator, to run rp2 PIO programs on Linux with CPython
+# - asm_pio assembles a program written with the rp2 assembler functions
+#   (jmp, wait, in_, out, push, pull, mov, set, nop, labels, delays and wrap)
+#   into a list of instructions, as rp2.asm_pio does on the Pico
+# - A StateMachine executes it cycle by cycle against one line, a
+#   pintrace_replay.Board whose traces are the sensor side of the line. It
+#   runs lazily, catching up with the Board's virtual clock whenever the CPU
+#   looks at it, so the CPU and the state machine run side by side as on the
+#   Pico, and a stalled wait skips straight to the next edge of the trace
+# - The pins of a state machine are the one line: pins and pindirs drive it,
+#   and the pin and gpio sources read it. Side-set, IRQ flags, autopull and
+#   the status source are not simulated
+#
+# Usage:
+#   board = Board(traces)
+#   with board.install():  # rp2 is one of the Board's stand-in modules
+#       import dht_pio
+
+import types
+
+MASK = 0xFFFFFFFF
+
+OPERANDS = ('x', 'y', 'null', 'isr', 'osr', 'pins', 'pindirs', 'pc', 'exec',
+            'status', 'gpio', 'pin', 'x_dec', 'y_dec', 'not_x', 'not_y',
+            'x_not_y', 'not_osre', 'block', 'noblock', 'iffull', 'ifempty')
+
+
+class Deadlock(Exception):
+    """Raised when the CPU waits for a state machine that can never make
+    progress, where the Pico would hang."""
+
+
+class PIO:
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+
+
+class Instruction:
+    def __init__(self, op, *args):
+        self.op = op
+        self.args = args
+        self.delay = 0
+
+    def __getitem__(self, delay):
+        if not 0 <= delay <= 31:
+            raise ValueError('Delay must be 0 to 31, not {}'.format(delay))
+        self.delay = delay
+        return self
+
+    def side(self, value):
+        raise NotImplementedError('Side-set is not simulated')
+
+
+class Program:
+    """An assembled PIO program."""
+    def __init__(self, name, settings):
+        self.name = name
+        self.settings = settings
+        self.instructions = []
+        self.labels = {}
+        self.wrap_target = 0
+        self.wrap = None
+
+    def resolve(self):
+        if len(self.instructions) > 32:
+            raise ValueError('{} has {} instructions, a PIO block holds '
+                             '32'.format(self.name, len(self.instructions)))
+        for instruction in self.instructions:
+            if instruction.op == 'jmp':
+                cond, target = instruction.args
+                if target not in self.labels:
+                    raise ValueError('Unknown label {!r}'.format(target))
+                instruction.args = (cond, self.labels[target])
+        if self.wrap is None:
+            self.wrap = len(self.instructions) - 1
+
+
+def assembler(program):
+    """Return the assembler functions and operands, by name, emitting into a
+    program."""
+    def emit(op, *args):
+        instruction = Instruction(op, *args)
+        program.instructions.append(instruction)
+        return instruction
+
+    def label(name):
+        program.labels[name] = len(program.instructions)
+
+    def wrap_target():
+        program.wrap_target = len(program.instructions)
+
+    def wrap():
+        program.wrap = len(program.instructions) - 1
+
+    def jmp(cond, target=None):
+        if target is None:
+            cond, target = None, cond
+        return emit('jmp', cond, target)
+
+    def irq(*args):
+        raise NotImplementedError('IRQ flags are not simulated')
+
+    names = {name: name for name in OPERANDS}
+    names.update({
+        'label': label,
+        'wrap_target': wrap_target,
+        'wrap': wrap,
+        'jmp': jmp,
+        'wait': lambda polarity, source, index: emit('wait', polarity, source,
+                                                     index),
+        'in_': lambda source, bits: emit('in', source, bits),
+        'out': lambda dest, bits: emit('out', dest, bits),
+        'push': lambda *opts: emit('push', 'iffull' in opts,
+                                   'noblock' not in opts),
+        'pull': lambda *opts: emit('pull', 'ifempty' in opts,
+                                   'noblock' not in opts),
+        'mov': lambda dest, source: emit('mov', dest, source),
+        'set': lambda dest, value: emit('set', dest, value),
+        'nop': lambda: emit('mov', 'y', 'y'),
+        'irq': irq,
+        'invert': lambda source: ('~', source),
+        'reverse': lambda source: ('::', source),
+    })
+    return names
+
+
+def asm_pio(**settings):
+    """Decorator that assembles a PIO program, like ``rp2.asm_pio``: the
+    function is called once with the assembler functions in its globals."""
+    def assemble(f):
+        program = Program(f.__name__, settings)
+        names = assembler(program)
+        g = f.__globals__
+        saved = {name: g[name] for name in names if name in g}
+        g.update(names)
+        try:
+            f()
+        finally:
+            for name in names:
+                if name in saved:
+                    g[name] = saved[name]
+                else:
+                    del g[name]
+        program.resolve()
+        return program
+    return assemble
+
+
+def reverse_bits(value):
+    return int('{:032b}'.format(value)[::-1], 2)
+
+
+class StateMachine:
+    """A simulated state machine, with the methods of
+    ``rp2.StateMachine``.
+
+    :param line: The line the pins of the state machine are connected to: an
+                 object with the ``now``, ``advance()``, ``level_at()``,
+                 ``next_edge()`` and ``edge()`` of a
+                 :class:`pintrace_replay.Board`.
+    :param id: The state machine number, 0 to 7.
+    :param program: The program, from :func:`asm_pio`.
+    :param freq: The clock of the state machine in Hz.
+    """
+    def __init__(self, line, id, program=None, freq=125000000, **kwargs):
+        self.line = line
+        self.id = id
+        self.running = False
+        if program is not None:
+            self.init(program, freq, **kwargs)
+
+    def init(self, program, freq=125000000, **kwargs):
+        s = program.settings
+        self.program = program
+        self.freq = freq
+        self.in_left = s.get('in_shiftdir', PIO.SHIFT_LEFT) == PIO.SHIFT_LEFT
+        self.out_left = s.get('out_shiftdir',
+                              PIO.SHIFT_LEFT) == PIO.SHIFT_LEFT
+        self.autopush = s.get('autopush', False)
+        self.push_thresh = s.get('push_thresh', 32)
+        self.pull_thresh = s.get('pull_thresh', 32)
+        if s.get('autopull'):
+            raise NotImplementedError('Autopull is not simulated')
+        join = s.get('fifo_join', PIO.JOIN_NONE)
+        self.rx_depth = {PIO.JOIN_RX: 8, PIO.JOIN_TX: 0}.get(join, 4)
+        self.tx_depth = {PIO.JOIN_TX: 8, PIO.JOIN_RX: 0}.get(join, 4)
+        set_init = s.get('set_init', s.get('out_init'))
+        if isinstance(set_init, tuple):
+            set_init = set_init[0]
+        self.drive = set_init in (PIO.OUT_LOW, PIO.OUT_HIGH)
+        self.output = 1 if set_init in (PIO.IN_HIGH, PIO.OUT_HIGH) else 0
+        if self.drive:
+            self.line.edge()
+        self.rx = []
+        self.tx = []
+        self.x = self.y = 0
+        self.cycle = self._cycles(self.line.now)
+        self.restart()
+
+    # clock
+    def _cycles(self, us):
+        return -(-us * self.freq // 1000000)
+
+    def _us(self, cycles):
+        return cycles * 1000000 // self.freq
+
+    def _catch_up(self):
+        if self.running:
+            self._run(self._cycles(self.line.now))
+        else:
+            self.cycle = max(self.cycle, self._cycles(self.line.now))
+
+    def _run(self, end, until_rx=False):
+        while self.cycle < end:
+            if until_rx and self.rx:
+                return
+            if not self._step(end):
+                if until_rx:
+                    raise Deadlock('State machine {} is stalled at {} in {} '
+                                   'and will never push'.format(
+                                       self.id, self.pc, self.program.name))
+                break
+        self.cycle = max(self.cycle, end)
+
+    # the line
+    def _level(self):
+        if self.drive:
+            return self.output
+        return self.line.level_at(self._us(self.cycle))
+
+    def _set_output(self, value):
+        if value != self.output:
+            self.output = value
+            if self.drive:
+                self.line.edge(self._us(self.cycle))
+
+    def _set_drive(self, drive):
+        if drive != self.drive:
+            self.drive = drive
+            self.line.edge(self._us(self.cycle))
+
+    # execution
+    def _source(self, source):
+        if isinstance(source, tuple):
+            op, source = source
+            value = self._source(source)
+            return value ^ MASK if op == '~' else reverse_bits(value)
+        if source in ('x', 'y', 'isr', 'osr'):
+            return getattr(self, source)
+        if source == 'null':
+            return 0
+        if source == 'pins':
+            return self._level()
+        raise NotImplementedError('Source {!r} is not simulated'.format(
+            source))
+
+    def _write(self, dest, value, bits=32):
+        if dest in ('x', 'y'):
+            setattr(self, dest, value & MASK)
+        elif dest == 'pins':
+            self._set_output(value & 1)
+        elif dest == 'pindirs':
+            self._set_drive(value & 1)
+        elif dest == 'isr':
+            self.isr = value & MASK
+            self.isr_count = bits if bits < 32 else 0
+        elif dest == 'osr':
+            self.osr = value & MASK
+            self.osr_count = 0
+        elif dest != 'null':
+            raise NotImplementedError('Destination {!r} is not '
+                                      'simulated'.format(dest))
+
+    def _step(self, end):
+        # execute the instruction at pc, or return False if it stalls until
+        # the end cycle or beyond
+        instruction = self.program.instructions[self.pc]
+        op = instruction.op
+        args = instruction.args
+        if self.pc == self.program.wrap:
+            next_pc = self.program.wrap_target
+        else:
+            next_pc = self.pc + 1
+        if op == 'jmp':
+            cond, target = args
+            if cond is None:
+                taken = True
+            elif cond in ('not_x', 'not_y'):
+                taken = getattr(self, cond[-1]) == 0
+            elif cond in ('x_dec', 'y_dec'):
+                value = getattr(self, cond[0])
+                taken = value != 0
+                setattr(self, cond[0], (value - 1) & MASK)
+            elif cond == 'x_not_y':
+                taken = self.x != self.y
+            elif cond == 'pin':
+                taken = self._level() == 1
+            else:  # not_osre
+                taken = self.osr_count < self.pull_thresh
+            if taken:
+                next_pc = target
+        elif op == 'wait':
+            polarity, source, index = args
+            if source not in ('pin', 'gpio'):
+                raise NotImplementedError('Waiting on {!r} is not '
+                                          'simulated'.format(source))
+            if self._level() != polarity:
+                t = None if self.drive else self.line.next_edge(
+                    self._us(self.cycle))
+                if t is None or self._cycles(t) >= end:
+                    return False
+                self.cycle = max(self._cycles(t), self.cycle + 1)
+                return True
+        elif op == 'in':
+            source, bits = args
+            full = self.autopush and len(self.rx) >= self.rx_depth
+            if full and self.isr_count + bits >= self.push_thresh:
+                return False
+            data = self._source(source) & (MASK >> (32 - bits))
+            if bits == 32:
+                self.isr = data
+            elif self.in_left:
+                self.isr = (self.isr << bits | data) & MASK
+            else:
+                self.isr = self.isr >> bits | data << (32 - bits)
+            self.isr_count = min(self.isr_count + bits, 32)
+            if self.autopush and self.isr_count >= self.push_thresh:
+                self.rx.append(self.isr)
+                self.isr = self.isr_count = 0
+        elif op == 'out':
+            dest, bits = args
+            if self.out_left:
+                data = self.osr >> (32 - bits)
+                self.osr = self.osr << bits & MASK
+            else:
+                data = self.osr & (MASK >> (32 - bits))
+                self.osr >>= bits
+            self.osr_count = min(self.osr_count + bits, 32)
+            if dest == 'pc':
+                next_pc = data
+            else:
+                self._write(dest, data, bits)
+        elif op == 'push':
+            iffull, block = args
+            if not iffull or self.isr_count >= self.push_thresh:
+                if len(self.rx) >= self.rx_depth:
+                    if block:
+                        return False
+                else:
+                    self.rx.append(self.isr)
+                self.isr = self.isr_count = 0
+        elif op == 'pull':
+            ifempty, block = args
+            if not ifempty or self.osr_count >= self.pull_thresh:
+                if self.tx:
+                    self.osr = self.tx.pop(0)
+                elif block:
+                    return False
+                else:
+                    self.osr = self.x
+                self.osr_count = 0
+        elif op == 'mov':
+            dest, source = args
+            value = self._source(source)
+            if dest == 'pc':
+                next_pc = value & 31
+            else:
+                self._write(dest, value)
+        else:  # set
+            dest, value = args
+            self._write(dest, value)
+        self.pc = next_pc
+        self.cycle += 1 + instruction.delay
+        return True
+
+    # rp2.StateMachine methods
+    def active(self, value=None):
+        if value is None:
+            return self.running
+        self._catch_up()
+        self.running = bool(value)
+        return self.running
+
+    def restart(self):
+        self._catch_up()
+        self.pc = 0
+        self.isr = self.isr_count = 0
+        self.osr = 0
+        self.osr_count = 32
+
+    def exec(self, instr):
+        """Execute one instruction, given as assembler source such as
+        ``'set(pindirs, 1)'``, immediately. Jumps are not supported."""
+        self._catch_up()
+        program = Program('exec', {})
+        eval(instr, assembler(program))
+        program.wrap = 0
+        saved = self.program, self.pc
+        self.program, self.pc = program, 0
+        try:
+            if not self._step(self.cycle + 1):
+                raise Deadlock('{} stalls'.format(instr))
+        finally:
+            self.program, self.pc = saved
+
+    def put(self, value, shift=0):
+        self._catch_up()
+        if len(self.tx) >= self.tx_depth:
+            raise Deadlock('TX FIFO of state machine {} is full'.format(
+                self.id))
+        self.tx.append(value << shift & MASK)
+
+    def get(self, buf=None, shift=0):
+        """Return the next word of the RX FIFO. If it is empty, the CPU
+        waits: the state machine runs ahead and the Board's clock follows
+        it."""
+        self._catch_up()
+        if not self.rx:
+            if not self.running:
+                raise Deadlock('State machine {} is stopped and its RX FIFO '
+                               'is empty'.format(self.id))
+            self._run(float('inf'), until_rx=True)
+            self.line.advance(max(self._us(self.cycle) - self.line.now, 0))
+        return self.rx.pop(0) >> shift
+
+    def rx_fifo(self):
+        self._catch_up()
+        return len(self.rx)
+
+    def tx_fifo(self):
+        self._catch_up()
+        return len(self.tx)
+
+
+def module(line):
+    """Return a stand-in ``rp2`` module whose state machines drive and read
+    a line."""
+    rp2 = types.ModuleType('rp2')
+    rp2.PIO = PIO
+    rp2.asm_pio = asm_pio
+
+    class BoundStateMachine(StateMachine):
+        def __init__(self, id, program=None, freq=125000000, **kwargs):
+            StateMachine.__init__(self, line, id, program, freq, **kwargs)
+
+    BoundStateMachine.__name__ = 'StateMachine'
+    rp2.StateMachine = BoundStateMachine
+    return rp2
@@ -0,0 +1,172 @@
+# Background sensor sampling for the Pico web servers
+# - Each sensor is read on its own interval, never faster than its datasheet
+#   allows, on the second core, so a page view never waits for a sensor
+# - The last good reading is kept with the time it was taken: the accept
+#   loop, the LCD and the LED logic read it in O(1), and a failed read leaves
+#   the previous value in place
+#
+# Usage:
+#   sampler = Sampler()
+#   sampler.add_dht22('dht22', DHT(Pin(27), DHT22), on_sample=show_on_lcd)
+#   sampler.start()
+#   ...
+#   temperature, humidity = sampler.get('dht22', ('--', '--'))
+
+import utime
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+DHT11_MIN_INTERVAL_MS = 200  # MIN_INTERVAL_US in dht.py
+DHT22_MIN_INTERVAL_MS = 2000  # the DHT22 needs 2 s between readings
+
+
+def dht_reader(sensor):
+    """Return a function that measures a DHT sensor and returns
+    ``(temperature, humidity)``. Works with the MicroPython ``dht`` drivers,
+    where the values are methods, and with dht.py and dht_pio.py, where
+    they are properties."""
+    def read():
+        sensor.measure()
+        temperature = sensor.temperature
+        humidity = sensor.humidity
+        return (temperature() if callable(temperature) else temperature,
+                humidity() if callable(humidity) else humidity)
+    return read
+
+
+class Source:
+    """A sensor and its last good reading.
+
+    :param name: The name the reading is looked up by.
+    :param read: A function that reads the sensor and returns its value. It
+                 may raise an exception if the read fails.
+    :param interval_ms: The time between the end of a read and the start of
+                        the next one.
+    :param on_sample: An optional function called with each new value, from
+                      the sampling thread.
+    """
+    def __init__(self, name, read, interval_ms, on_sample=None):
+        self.name = name
+        self.read = read
+        self.interval_ms = interval_ms
+        self.on_sample = on_sample
+        # (value, ticks_ms) of the last good reading, replaced as a whole so
+        # that readers on the other core never see half an update
+        self.last = None
+        self.errors = 0
+        self.due = utime.ticks_ms()
+
+    def sample(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            self.errors += 1
+            print('Sampler: {} read failed: {}'.format(self.name, e))
+        else:
+            self.last = (value, utime.ticks_ms())
+            if self.on_sample is not None:
+                try:
+                    self.on_sample(value)
+                except Exception as e:
+                    print('Sampler: {} callback failed: {}'.format(
+                        self.name, e))
+        self.due = utime.ticks_add(utime.ticks_ms(), self.interval_ms)
+
+
+class Sampler:
+    """Reads sensors in the background and caches their last good readings.
+
+    Sensors must be added before :meth:`start`. After that the set of
+    sensors is fixed, so lookups from the main core never race with the
+    sampling thread changing it.
+    """
+    def __init__(self):
+        self.sources = {}
+        self.running = False
+
+    def add(self, name, read, interval_ms, min_interval_ms=0, on_sample=None):
+        """Add a sensor.
+
+        :param name: The name the reading is looked up by.
+        :param read: A function that reads the sensor and returns its value.
+        :param interval_ms: How often to read the sensor.
+        :param min_interval_ms: The shortest interval the sensor supports.
+                                Shorter intervals are raised to it.
+        :param on_sample: An optional function called with each new value,
+                          for instance to update a display.
+        """
+        if self.running:
+            raise RuntimeError('Sensors must be added before start()')
+        self.sources[name] = Source(name, read,
+                                    max(interval_ms, min_interval_ms),
+                                    on_sample)
+
+    def add_dht11(self, name, sensor, interval_ms=DHT11_MIN_INTERVAL_MS,
+                  on_sample=None):
+        """Add a DHT11 sensor, read at most every 200 ms."""
+        self.add(name, dht_reader(sensor), interval_ms, DHT11_MIN_INTERVAL_MS,
+                 on_sample)
+
+    def add_dht22(self, name, sensor, interval_ms=DHT22_MIN_INTERVAL_MS,
+                  on_sample=None):
+        """Add a DHT22 sensor, read at most every 2 seconds."""
+        self.add(name, dht_reader(sensor), interval_ms, DHT22_MIN_INTERVAL_MS,
+                 on_sample)
+
+    def get(self, name, default=None):
+        """Return the last good value of a sensor, or ``default`` if it has
+        not been read successfully yet."""
+        last = self.sources[name].last
+        return default if last is None else last[0]
+
+    def reading(self, name):
+        """Return the last good reading of a sensor as a
+        ``(value, ticks_ms)`` tuple, or ``None``."""
+        return self.sources[name].last
+
+    def age_ms(self, name):
+        """Return how many milliseconds ago the last good value of a sensor
+        was read, or ``None``."""
+        last = self.sources[name].last
+        if last is None:
+            return None
+        return utime.ticks_diff(utime.ticks_ms(), last[1])
+
+    def poll(self):
+        """Read the sensors that are due and return the number of
+        milliseconds until the next one is.
+
+        :meth:`start` calls this in a loop on the second core. Programs that
+        cannot spare the core can call it from their own loop instead.
+        """
+        wait = 1000
+        for source in self.sources.values():
+            if utime.ticks_diff(source.due, utime.ticks_ms()) <= 0:
+                source.sample()
+            wait = min(wait, utime.ticks_diff(source.due, utime.ticks_ms()))
+        return max(wait, 0)
+
+    def run(self):
+        while self.running:
+            utime.sleep_ms(self.poll())
+
+    def start(self):
+        """Take a first reading of every sensor, so that the cache is filled
+        before the server starts, then keep sampling on the second core.
+
+        Returns ``False`` if threads are not available, in which case
+        :meth:`poll` has to be called by the program.
+        """
+        self.poll()
+        if _thread is None:
+            return False
+        self.running = True
+        _thread.start_new_thread(self.run, ())
+        return True
+
+    def stop(self):
+        """Stop the sampling thread after its current pass."""
+        self.running = False
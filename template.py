@@ -0,0 +1,60 @@
+# Precompiled page templates for the Pico web servers
+# - A template is split once, at import time, into pre-encoded byte chunks
+#   and the names of the {{slots}} between them
+# - render() is a generator: it yields the static chunks as they are and
+#   encodes only the slot values, so a page is never built as one big string
+#   and the static HTML is never encoded again
+#
+# Usage:
+#   page = Template("<h1>LED is {{state}}</h1><p>{{temperature}} C</p>")
+#   for chunk in page.render(state='ON', temperature=read_temp):
+#       client.sendall(chunk)
+# or simply page.send(client, state='ON', temperature=read_temp)
+# or, with Microdot, return the generator as the response body:
+#   return page.render(state='ON', temperature=21.5), 200, HTML_HEADERS
+
+
+class Template:
+    """A template compiled into static byte chunks and slots.
+
+    :param source: The template text. ``{{name}}`` marks a slot. Single
+                   braces, as used by CSS and JavaScript, are left alone.
+    """
+    def __init__(self, source):
+        self.chunks = []  # static bytes before each slot, and after the last
+        self.slots = []
+        rest = source
+        while True:
+            start = rest.find('{{')
+            end = rest.find('}}', start + 2) if start >= 0 else -1
+            if end < 0:
+                break
+            self.chunks.append(rest[:start].encode())
+            self.slots.append(rest[start + 2:end].strip())
+            rest = rest[end + 2:]
+        self.chunks.append(rest.encode())
+
+    def render(self, **values):
+        """Yield the page as byte chunks.
+
+        Each slot is filled with ``str()`` of its value, or of the result of
+        calling it when the value is callable, so expensive values can be
+        computed only while the page is streamed. Values are not escaped.
+        """
+        chunks = self.chunks
+        if chunks[0]:
+            yield chunks[0]
+        i = 1
+        for name in self.slots:
+            value = values[name]
+            if callable(value):
+                value = value()
+            yield str(value).encode()
+            if chunks[i]:
+                yield chunks[i]
+            i += 1
+
+    def send(self, sock, **values):
+        """Render the page into a blocking socket."""
+        for chunk in self.render(**values):
+            sock.sendall(chunk)
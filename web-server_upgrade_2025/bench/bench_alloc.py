@@ -0,0 +1,167 @@
+# Heap allocation per request of Microdot's response writer, old and new.
+# Runs on CPython and on the MicroPython unix port, no network needed:
+#   python bench/bench_alloc.py
+#   micropython bench/bench_alloc.py
+# Each request is parsed and dispatched first, then only the writing of the
+# response is measured, once with the writer Microdot used before, which
+# encoded the status line and each header into a new string and read file
+# bodies in fresh 1 KB chunks, and once with Response.write and a reused
+# per-connection buffer. Reported per request:
+#   writes  - awrite() calls issued by the writer
+#   heap    - on MicroPython, the bytes allocated while writing, from
+#             gc.mem_alloc() with the GC disabled; on CPython, the peak of
+#             the memory traced by tracemalloc above its level before the
+#             write, which counts the largest set of objects alive at once
+#             rather than every allocation
+# Both writers send in-memory bodies through body_iter(), which builds its
+# iterator class on every call; that is most of the heap of /text and /json.
+
+import asyncio
+import gc
+import sys
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+ROOT = (__file__.rsplit('/', 1)[0] if '/' in __file__ else '.') + '/..'
+sys.path.insert(0, ROOT)
+
+from microdot import (MUTED_SOCKET_ERRORS, Microdot, Request,  # noqa: E402
+                      Response, send_file)
+
+STATIC = ROOT + '/static/'
+REQUESTS = 20
+
+app = Microdot()
+
+
+@app.route('/text')
+async def text(req):
+    return 'Hello, world!'
+
+
+@app.route('/json')
+async def as_json(req):
+    return {'ok': True, 'ip': '192.168.4.1', 'ssid': 'PicoW-TinyServer'}
+
+
+@app.route('/small')
+async def small(req):
+    return send_file(STATIC + 'js/scripts.js')
+
+
+@app.route('/large')
+async def large(req):
+    return send_file(STATIC + 'js/bootstrap.bundle.min.js')
+
+
+class FakeReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    async def readline(self):
+        i = self.data.find(b'\n', self.pos) + 1 or len(self.data)
+        line = self.data[self.pos:i]
+        self.pos = i
+        return line
+
+    async def readexactly(self, n):
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+
+class NullWriter:
+    def __init__(self):
+        self.writes = 0
+
+    async def awrite(self, data):
+        self.writes += 1
+
+    async def aclose(self):
+        pass
+
+
+async def write_unbuffered(res, stream):
+    # the writer before the reusable buffer: one encoded string per line,
+    # and file bodies read by body_iter() in fresh chunks
+    res.complete()
+    try:
+        reason = res.reason if res.reason is not None else \
+            ('OK' if res.status_code == 200 else 'N/A')
+        await stream.awrite('HTTP/1.1 {status_code} {reason}\r\n'.format(
+            status_code=res.status_code, reason=reason).encode())
+        for header, value in res.headers.items():
+            values = value if isinstance(value, list) else [value]
+            for value in values:
+                await stream.awrite('{header}: {value}\r\n'.format(
+                    header=header, value=value).encode())
+        await stream.awrite(b'\r\n')
+        iter = res.body_iter()
+        async for body in iter:
+            if isinstance(body, str):
+                body = body.encode()
+            await stream.awrite(body)
+        if hasattr(iter, 'aclose'):
+            await iter.aclose()
+    except OSError as exc:  # pragma: no cover
+        if exc.errno not in MUTED_SOCKET_ERRORS:
+            raise
+
+
+async def write_buffered(res, stream, buffer):
+    await res.write(stream, buffer)
+
+
+def heap_start():
+    gc.collect()
+    if hasattr(gc, 'mem_alloc'):
+        gc.disable()
+        return gc.mem_alloc()
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def heap_used(start):
+    if hasattr(gc, 'mem_alloc'):
+        used = gc.mem_alloc() - start
+        gc.enable()
+        return used
+    return tracemalloc.get_traced_memory()[1] - start
+
+
+async def measure(path, buffered):
+    request = 'GET {} HTTP/1.1\r\nHost: pico\r\n\r\n'.format(path).encode()
+    writer = NullWriter()
+    buffer = bytearray(Response.send_file_buffer_size)
+    heap = 0
+    for _ in range(REQUESTS):
+        req = await Request.create(app, FakeReader(request), writer,
+                                   ('127.0.0.1', 1234))
+        res = await app.dispatch_request(req)
+        start = heap_start()
+        if buffered:
+            await write_buffered(res, writer, buffer)
+        else:
+            await write_unbuffered(res, writer)
+        heap += heap_used(start)
+    return writer.writes / REQUESTS, heap // REQUESTS
+
+
+def main():
+    Response.send_file_cache = None
+    if not hasattr(gc, 'mem_alloc'):
+        tracemalloc.start()
+    print('{:8} {:>10} {:>10} {:>10} {:>10}'.format(
+        'path', 'old writes', 'new writes', 'old heap', 'new heap'))
+    for path in ('/text', '/json', '/small', '/large'):
+        old_writes, old_heap = asyncio.run(measure(path, False))
+        new_writes, new_heap = asyncio.run(measure(path, True))
+        print('{:8} {:>10.1f} {:>10.1f} {:>10} {:>10}'.format(
+            path, old_writes, new_writes, old_heap, new_heap))
+
+
+main()
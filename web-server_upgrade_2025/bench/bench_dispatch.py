@@ -0,0 +1,211 @@
+# Framework overhead microbenchmark for Microdot, no network needed.
+# Runs on CPython and on the MicroPython unix port:
+#   python bench/bench_dispatch.py
+#   micropython bench/bench_dispatch.py
+# Each case is a raw request that goes through Request.create, then
+# Microdot.dispatch_request, then Response.write into a writer that discards
+# the output, and the time of each phase is reported in microseconds per
+# request (best of REPEAT runs). The cases cover routing among the routes of
+# a typical app, URL arguments and query strings, JSON and form bodies, JSON
+# responses, error handlers and before/after request hooks. The handlers are
+# coroutines, except in the "sync" case, which shows the cost of running a
+# plain function in the executor on CPython. Every case is
+# first checked with the test client, so a broken route does not go
+# unnoticed as a fast one, and a chunked POST pipelined before a GET is
+# checked to close the connection rather than have its body read as a
+# request.
+
+import asyncio
+import sys
+
+ROOT = (__file__.rsplit('/', 1)[0] if '/' in __file__ else '.') + '/..'
+sys.path.insert(0, ROOT)
+
+from microdot import (AsyncBytesIO, Microdot, Request, Response,  # noqa: E402
+                      abort, ticks_diff, ticks_us)
+from microdot_test_client import TestClient  # noqa: E402
+
+ROUNDS = 500
+REPEAT = 5
+
+
+def make_app():
+    app = Microdot()
+
+    # the routes of the Tiny Server, plus a few with arguments, so that
+    # lookups do not hit a lone route
+    async def other(req):
+        return 'ok'
+
+    for path in ('/', '/health', '/lighton', '/lightoff', '/reading',
+                 '/events', '/ws', '/metrics', '/favicon.ico', '/settings'):
+        app.route(path)(other)
+
+    @app.route('/static/<path:path>')
+    async def static(req, path):
+        return path
+
+    @app.route('/text')
+    async def text(req):
+        return 'Hello, world!'
+
+    @app.route('/sync')
+    def sync(req):
+        return 'Hello, world!'
+
+    @app.route('/users/<int:id>/posts/<slug>')
+    async def post(req, id, slug):
+        return '{} {} {}'.format(id, slug, req.args.get('page'))
+
+    @app.route('/json')
+    async def as_json(req):
+        return {'ok': True, 'ip': '192.168.4.1', 'ssid': 'PicoW-TinyServer',
+                'temperature': 21.5, 'humidity': 40.1}
+
+    @app.post('/echo')
+    async def echo(req):
+        return req.json
+
+    @app.post('/form')
+    async def form(req):
+        return req.form.get('ssid')
+
+    @app.route('/forbidden')
+    async def forbidden(req):
+        abort(403)
+
+    @app.errorhandler(403)
+    async def on_forbidden(req):
+        return {'error': 'forbidden'}, 403
+
+    @app.errorhandler(404)
+    async def on_not_found(req):
+        return {'error': 'not found'}, 404
+
+    return app
+
+
+def make_hooked_app():
+    app = make_app()
+
+    @app.before_request
+    async def authenticate(req):
+        req.g.user = req.cookies.get('session')
+
+    @app.after_request
+    async def no_cache(req, res):
+        res.headers['Cache-Control'] = 'no-cache'
+
+    @app.after_request
+    async def powered_by(req, res):
+        res.headers['X-Powered-By'] = 'Microdot'
+        return res
+
+    return app
+
+
+def raw(method, path, body=b'', content_type=None):
+    head = '{} {} HTTP/1.1\r\nHost: 192.168.4.1\r\n' \
+        'User-Agent: bench_dispatch\r\nAccept: */*\r\n' \
+        'Cookie: session=3f2a9c\r\n'.format(method, path)
+    if body:
+        head += 'Content-Type: {}\r\nContent-Length: {}\r\n'.format(
+            content_type, len(body))
+    return head.encode() + b'\r\n' + body
+
+
+APP = make_app()
+HOOKED = make_hooked_app()
+CASES = [
+    # name, app, request, expected status
+    ('text', APP, raw('GET', '/text'), 200),
+    ('sync', APP, raw('GET', '/sync'), 200),
+    ('static', APP, raw('GET', '/static/js/scripts.js'), 200),
+    ('url args', APP, raw('GET', '/users/42/posts/hello-pico?page=3'), 200),
+    ('json out', APP, raw('GET', '/json'), 200),
+    ('json in', APP, raw('POST', '/echo', b'{"led": "on", "level": 128}',
+                         'application/json'), 200),
+    ('form in', APP, raw('POST', '/form', b'ssid=PicoW&password=s3cret%21',
+                         'application/x-www-form-urlencoded'), 200),
+    ('abort 403', APP, raw('GET', '/forbidden'), 403),
+    ('404', APP, raw('GET', '/no/such/page'), 404),
+    ('hooks', HOOKED, raw('GET', '/text'), 200),
+]
+
+
+class NullWriter:
+    async def awrite(self, data):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class CaptureWriter(NullWriter):
+    def __init__(self):
+        self.data = b''
+
+    async def awrite(self, data):
+        self.data += bytes(data)
+
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 1234)
+
+
+async def check():
+    for name, app, request, status in CASES:
+        res = await TestClient(app).send(request)
+        if res.status_code != status:
+            raise RuntimeError('{}: expected {}, got {}'.format(
+                name, status, res.status_code))
+
+    # a chunked body is not parsed, so the connection must close after the
+    # request instead of reading the body as a pipelined request
+    smuggled = raw('GET', '/forbidden')
+    chunked = 'POST /echo HTTP/1.1\r\nHost: 192.168.4.1\r\n' \
+        'Transfer-Encoding: chunked\r\n\r\n{:x}\r\n'.format(
+            len(smuggled)).encode() + smuggled + b'\r\n0\r\n\r\n'
+    writer = CaptureWriter()
+    await APP.handle_request(
+        AsyncBytesIO(chunked + raw('GET', '/text')), writer)
+    if writer.data.count(b'HTTP/1.1 ') != 1 or b' 403 ' in writer.data:
+        raise RuntimeError('chunked request body was read as a request')
+
+
+async def run(app, request):
+    writer = NullWriter()
+    buffer = bytearray(Response.send_file_buffer_size)
+    addr = ('127.0.0.1', 1234)
+    parse = dispatch = write = 0
+    for _ in range(ROUNDS):
+        reader = AsyncBytesIO(request)
+        start = ticks_us()
+        req = await Request.create(app, reader, writer, addr)
+        parsed = ticks_us()
+        res = await app.dispatch_request(req)
+        dispatched = ticks_us()
+        res.complete(chunked=True)
+        await res.write(writer, buffer)
+        written = ticks_us()
+        parse += ticks_diff(parsed, start)
+        dispatch += ticks_diff(dispatched, parsed)
+        write += ticks_diff(written, dispatched)
+    return parse / ROUNDS, dispatch / ROUNDS, write / ROUNDS
+
+
+def main():
+    asyncio.run(check())
+    print('{} rounds, best of {}, us/request'.format(ROUNDS, REPEAT))
+    print('{:10} {:>8} {:>9} {:>8} {:>8}'.format(
+        'case', 'parse', 'dispatch', 'write', 'total'))
+    for name, app, request, _ in CASES:
+        best = None
+        for _ in range(REPEAT):
+            times = asyncio.run(run(app, request))
+            if best is None or sum(times) < sum(best):
+                best = times
+        print('{:10} {:>8.1f} {:>9.1f} {:>8.1f} {:>8.1f}'.format(
+            name, best[0], best[1], best[2], sum(best)))
+
+
+main()
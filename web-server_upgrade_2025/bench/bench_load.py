@@ -0,0 +1,325 @@
+# HTTP load benchmark for the Tiny Server on CPython, over localhost:
+#   python bench/bench_load.py
+#   python bench/bench_load.py --requests 5000 --json results.json
+# microdot_web_server_final.py runs unmodified in a child process, with
+# stand-ins for the network, machine and rp2 modules and its static folder
+# pointed at a copy of the static tree. An asyncio load generator in this process
+# drives each scenario (path x keep-alive x concurrency) against a fresh
+# server and reports req/s, p50/p99 latency, bytes per request and the peak
+# RSS of the server process. --json appends the run, with the commit and
+# Python version, to a file so results can be compared over time.
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+ROOT = (__file__.rsplit('/', 1)[0] if '/' in __file__ else '.') + '/..'
+
+PATHS = {
+    'index': '/',
+    'health': '/health',
+    'small': '/static/js/scripts.js',  # served from the RAM cache
+    'large': '/static/js/bootstrap.bundle.min.js',  # streamed from flash
+}
+CONCURRENCY = (1, 4, 8)
+REQUESTS = 1000
+HEADERS = (b'Host: 192.168.4.1\r\n'
+           b'User-Agent: bench_load\r\n'
+           b'Accept: */*\r\n'
+           b'Accept-Encoding: gzip, deflate\r\n')
+
+
+# ------------- Server side (child process) -------------
+def install_stubs():
+    class Pin:
+        OUT = 1
+        IN = 0
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def value(self, *args):
+            return 0
+
+    class Timer:
+        ONE_SHOT = 0
+
+        def __init__(self, *args):
+            pass
+
+        def init(self, **kwargs):
+            pass
+
+    class WLAN:
+        def __init__(self, interface):
+            pass
+
+        def active(self, *args):
+            return True
+
+        def config(self, *args, **kwargs):
+            return 'PicoW-TinyServer' if args else None
+
+        def scan(self):
+            return []
+
+        def ifconfig(self, *args):
+            return ('127.0.0.1', '255.255.255.0', '127.0.0.1', '8.8.8.8')
+
+    machine = types.ModuleType('machine')
+    machine.Pin = Pin
+    machine.Timer = Timer
+    network = types.ModuleType('network')
+    network.WLAN = WLAN
+    network.STA_IF = 0
+    network.AP_IF = 1
+    rp2 = types.ModuleType('rp2')
+    rp2.country = lambda code: None
+    sys.modules.update({'machine': machine, 'network': network, 'rp2': rp2})
+
+
+def serve(port, static_root):
+    sys.path.insert(0, ROOT)
+    install_stubs()
+    from microdot import Microdot, StaticManifest
+
+    captured = []
+    Microdot.run = lambda app, **kwargs: captured.append(app)
+    init = StaticManifest.__init__
+
+    def init_at(self, root, *args, **kwargs):
+        init(self, static_root if root == '/static' else root, *args,
+             **kwargs)
+
+    StaticManifest.__init__ = init_at
+    import microdot_web_server_final  # noqa: F401
+    app = captured[0]
+
+    @app.route('/__bench/rss')
+    def rss(_req):
+        return {'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+    async def main():
+        await app.start_server(host='127.0.0.1', port=port)
+
+    print('ready', flush=True)
+    asyncio.run(main())
+
+
+# ------------- Load generator -------------
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = None
+    chunked = close = False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = value.strip().lower() == b'chunked'
+        elif name == b'connection':
+            close = value.strip().lower() == b'close'
+    if chunked:
+        body = b''
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            size = int(line, 16)
+            body += line + await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif length is None:
+        body = await reader.read()
+        close = True
+    else:
+        body = await reader.readexactly(length)
+    return int(head.split(b' ', 2)[1]), len(head) + len(body), close
+
+
+async def worker(port, request, keep_alive, count, latencies, totals):
+    reader = writer = None
+    for _ in range(count):
+        start = time.perf_counter()
+        if writer is None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(request)
+        try:
+            status, size, close = await read_response(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            totals['errors'] += 1
+            writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        totals['bytes'] += size
+        if status != 200:
+            totals['non_200'] += 1
+        if close or not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(port, path, keep_alive, concurrency, requests):
+    request = 'GET {} HTTP/1.1\r\n'.format(path).encode() + HEADERS + \
+        (b'\r\n' if keep_alive else b'Connection: close\r\n\r\n')
+    latencies = []
+    totals = {'bytes': 0, 'errors': 0, 'non_200': 0}
+    per_worker = requests // concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        worker(port, request, keep_alive, per_worker, latencies, totals)
+        for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    done = len(latencies) or 1
+    return {
+        'requests': len(latencies),
+        'req_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[done // 2] * 1000, 3) if latencies else None,
+        'p99_ms': round(latencies[min(done - 1, done * 99 // 100)] * 1000,
+                        3) if latencies else None,
+        'bytes_per_req': totals['bytes'] // done,
+        'errors': totals['errors'],
+        'non_200': totals['non_200'],
+    }
+
+
+async def fetch_rss(port):
+    # the connections of the run may still count against max_connections
+    # for a moment after they closed, so retry while the server is busy
+    for _ in range(100):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /__bench/rss HTTP/1.1\r\n'
+                     b'Connection: close\r\n\r\n')
+        head = await reader.readuntil(b'\r\n\r\n')
+        body = await reader.read()
+        writer.close()
+        if head.split(b' ', 2)[1] != b'503':
+            break
+        await asyncio.sleep(0.05)
+    maxrss = json.loads(body)['maxrss']
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+def make_static_tree(tmp):
+    static = os.path.join(tmp, 'static')
+    shutil.copytree(os.path.join(ROOT, 'static'), static)
+    shutil.copy(os.path.join(ROOT, 'index.html'), static)
+    return static
+
+
+def scenario(port, static, name, keep_alive, concurrency, requests):
+    child = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(port),
+         '--static', static], stdout=subprocess.PIPE)
+    try:
+        while child.stdout.readline().strip() != b'ready':
+            if child.poll() is not None:
+                raise RuntimeError('server failed to start')
+
+        async def drive():
+            # wait for the listening socket, then warm the caches
+            for _ in range(100):
+                try:
+                    await run_load(port, PATHS[name], keep_alive, 1, 1)
+                    break
+                except OSError:
+                    await asyncio.sleep(0.05)
+            # let the server retire the warm-up connection before the run,
+            # so it does not count against max_connections
+            await asyncio.sleep(0.1)
+            result = await run_load(port, PATHS[name], keep_alive,
+                                    concurrency, requests)
+            result['peak_rss_kb'] = await fetch_rss(port)
+            return result
+
+        result = asyncio.run(drive())
+    finally:
+        child.terminate()
+        child.wait()
+    result.update({'path': name, 'keep_alive': keep_alive,
+                   'concurrency': concurrency})
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load benchmark for the Tiny Server on CPython.')
+    parser.add_argument('--requests', type=int, default=REQUESTS,
+                        help='requests per scenario (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--paths', default=','.join(PATHS),
+                        help='comma-separated subset of ' + ', '.join(PATHS))
+    parser.add_argument('--concurrency', default=','.join(
+        [str(c) for c in CONCURRENCY]), help='comma-separated levels')
+    parser.add_argument('--json', metavar='FILE',
+                        help='append the results of this run to FILE')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--static', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.static)
+        return
+
+    results = []
+    print('{:8} {:>5} {:>5} {:>10} {:>9} {:>9} {:>10} {:>8} {:>6}'.format(
+        'path', 'ka', 'conc', 'req/s', 'p50 ms', 'p99 ms', 'bytes/req',
+        'rss KB', 'errors'))
+    with tempfile.TemporaryDirectory() as tmp:
+        static = make_static_tree(tmp)
+        for name in args.paths.split(','):
+            for keep_alive in (True, False):
+                for concurrency in [int(c) for c in
+                                    args.concurrency.split(',')]:
+                    r = scenario(args.port, static, name, keep_alive,
+                                 concurrency, args.requests)
+                    results.append(r)
+                    print('{:8} {:>5} {:>5} {:>10} {:>9} {:>9} {:>10} {:>8} '
+                          '{:>6}'.format(
+                              name, 'on' if keep_alive else 'off',
+                              concurrency, r['req_per_s'], r['p50_ms'],
+                              r['p99_ms'], r['bytes_per_req'],
+                              r['peak_rss_kb'],
+                              r['errors'] + r['non_200']))
+
+    if args.json:
+        runs = []
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                runs = json.load(f)
+        runs.append({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+            'requests': args.requests,
+            'results': results,
+        })
+        with open(args.json, 'w') as f:
+            json.dump(runs, f, indent=2)
+        print('Results appended to', args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# Request parsing microbenchmark for Microdot on CPython, no network needed:
+#   python bench/bench_parser.py
+# Feeds request heads recorded from desktop and mobile browsers loading the
+# Tiny Server page through Request.create, and reports the time per request
+# for parsing alone and for parsing plus the header lookups that a typical
+# static file request performs (best of REPEAT runs).
+
+import asyncio
+import sys
+import time
+
+ROOT = (__file__.rsplit('/', 1)[0] if '/' in __file__ else '.') + '/..'
+sys.path.insert(0, ROOT)
+
+from microdot import AsyncBytesIO, Microdot, Request  # noqa: E402
+
+ROUNDS = 2000
+REPEAT = 5
+
+RECORDED = [
+    # Chrome 128, Windows, first page load
+    b'GET / HTTP/1.1\r\n'
+    b'Host: 192.168.4.1\r\n'
+    b'Connection: keep-alive\r\n'
+    b'Upgrade-Insecure-Requests: 1\r\n'
+    b'User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    b' (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36\r\n'
+    b'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/avif'
+    b',image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7'
+    b'\r\n'
+    b'Accept-Encoding: gzip, deflate\r\n'
+    b'Accept-Language: en-US,en;q=0.9\r\n'
+    b'\r\n',
+    # Chrome 128, stylesheet revalidation
+    b'GET /static/css/styles.css HTTP/1.1\r\n'
+    b'Host: 192.168.4.1\r\n'
+    b'Connection: keep-alive\r\n'
+    b'User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    b' (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36\r\n'
+    b'Accept: text/css,*/*;q=0.1\r\n'
+    b'Referer: http://192.168.4.1/\r\n'
+    b'Accept-Encoding: gzip, deflate\r\n'
+    b'Accept-Language: en-US,en;q=0.9\r\n'
+    b'If-None-Match: "7349-68a26e1c"\r\n'
+    b'If-Modified-Since: Mon, 18 Aug 2025 00:04:44 GMT\r\n'
+    b'\r\n',
+    # Firefox 130, Linux, script
+    b'GET /static/js/scripts.js HTTP/1.1\r\n'
+    b'Host: 192.168.4.1\r\n'
+    b'User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:130.0) Gecko/20100101'
+    b' Firefox/130.0\r\n'
+    b'Accept: */*\r\n'
+    b'Accept-Language: en-US,en;q=0.5\r\n'
+    b'Accept-Encoding: gzip, deflate\r\n'
+    b'Connection: keep-alive\r\n'
+    b'Referer: http://192.168.4.1/\r\n'
+    b'Priority: u=2\r\n'
+    b'\r\n',
+    # Safari, iOS 17, hero image
+    b'GET /static/assets/raspberry.jpg HTTP/1.1\r\n'
+    b'Host: 192.168.4.1\r\n'
+    b'Accept: image/webp,image/avif,image/jxl,image/heic,image/heic-sequence,'
+    b'video/*;q=0.8,image/png,image/svg+xml,image/*;q=0.8,*/*;q=0.5\r\n'
+    b'User-Agent: Mozilla/5.0 (iPhone; CPU iPhone OS 17_6 like Mac OS X)'
+    b' AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.6 Mobile/15E148'
+    b' Safari/604.1\r\n'
+    b'Accept-Language: en-US,en;q=0.9\r\n'
+    b'Referer: http://192.168.4.1/\r\n'
+    b'Accept-Encoding: gzip, deflate\r\n'
+    b'Connection: keep-alive\r\n'
+    b'\r\n',
+    # Chrome, Android, health check with a query string and cookies
+    b'GET /health?verbose=1&t=1729250000 HTTP/1.1\r\n'
+    b'Host: 192.168.4.1\r\n'
+    b'Connection: keep-alive\r\n'
+    b'User-Agent: Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36'
+    b' (KHTML, like Gecko) Chrome/128.0.0.0 Mobile Safari/537.36\r\n'
+    b'Accept: application/json\r\n'
+    b'Accept-Encoding: gzip, deflate\r\n'
+    b'Accept-Language: en-GB,en;q=0.9\r\n'
+    b'Cookie: theme=dark; session=3f2a9c\r\n'
+    b'\r\n',
+]
+
+
+async def parse(app, head):
+    return await Request.create(app, AsyncBytesIO(head), None,
+                                ('127.0.0.1', 1234))
+
+
+async def run(lookups):
+    app = Microdot()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for head in RECORDED:
+            req = await parse(app, head)
+            if lookups:
+                req.headers.get('Connection')
+                req.headers.get('Accept-Encoding')
+                req.headers.get('If-None-Match')
+                req.headers.get('Range')
+    return (time.perf_counter() - start) / (ROUNDS * len(RECORDED))
+
+
+def main():
+    print('{} recorded request heads, {} rounds'.format(len(RECORDED),
+                                                        ROUNDS))
+    for lookups in (False, True):
+        elapsed = min([asyncio.run(run(lookups)) for _ in range(REPEAT)])
+        print('{:24} {:8.2f} us/request'.format(
+            'parse + 4 lookups' if lookups else 'parse', elapsed * 1e6))
+
+
+main()
@@ -0,0 +1,141 @@
+# Builds the Pico W Tiny Server asset tree: downloads local copies of
+# CSS/JS/images and writes pre-compressed .gz siblings for text assets, so
+# send_file() can serve the gzip variant to browsers that accept it, and a
+# static_manifest.json with sizes and content-hash ETags that the server
+# loads at boot instead of scanning the static folder.
+# Runs on the host (Windows, macOS, Linux) with plain Python 3.
+# Usage:
+#   python build_pico_assets.py                  -> ./pico_tiny_server
+#   python build_pico_assets.py C:\my\root       -> custom root folder
+#   python build_pico_assets.py . --no-download  -> only (re)compress ./static
+#                                                  and rebuild the manifest
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import urllib.request
+
+BASE_URL = 'https://cdn.jsdelivr.net/gh/demetrous/tiny-server-assets/'
+
+# hero image renamed to raspberry.jpg to match the server code
+FILES = [
+    ('css/styles.css', 'static/css/styles.css'),
+    ('js/bootstrap.bundle.min.js', 'static/js/bootstrap.bundle.min.js'),
+    ('js/scripts.js', 'static/js/scripts.js'),
+    ('assets/favicon.ico', 'static/assets/favicon.ico'),
+    ('assets/raspberry-pi-pico-w-hand.jpg', 'static/assets/raspberry.jpg'),
+]
+
+# already-compressed formats (jpg, png, gif) gain nothing from gzip
+COMPRESS_EXT = ('.css', '.js', '.html', '.ico', '.json', '.svg', '.txt')
+MIN_SAVING = 0.9   # keep a .gz only if it is at most 90% of the original
+MANIFEST = 'static_manifest.json'
+
+README = """How to use:
+
+1) In Thonny, connect to the Pico W.
+2) Upload the 'static' folder from:
+   {root}
+   including the .gz files next to the originals, and upload
+   static_manifest.json to the root of the Pico. Re-run this script and
+   upload the manifest again whenever a static file changes.
+3) Run your Microdot server that serves /static (the code you have).
+"""
+
+
+def download(root):
+    for dirname in ('static/css', 'static/js', 'static/assets'):
+        os.makedirs(os.path.join(root, dirname), exist_ok=True)
+    for url, out in FILES:
+        path = os.path.join(root, out)
+        try:
+            with urllib.request.urlopen(BASE_URL + url, timeout=60) as resp:
+                data = resp.read()
+            with open(path, 'wb') as f:
+                f.write(data)
+            print('Downloaded ->', out)
+        except OSError as e:
+            print('Failed to download {} ({}). Creating placeholder: {}'.format(
+                BASE_URL + url, e, out))
+            open(path, 'ab').close()
+
+
+def compress(root):
+    total_raw = total_gz = 0
+    for dirpath, _dirs, names in os.walk(os.path.join(root, 'static')):
+        for name in sorted(names):
+            if not name.endswith(COMPRESS_EXT):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            # mtime=0 keeps the output byte-identical between builds
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+            if not data or len(packed) > len(data) * MIN_SAVING:
+                if os.path.exists(path + '.gz'):
+                    os.remove(path + '.gz')
+                continue
+            with open(path + '.gz', 'wb') as f:
+                f.write(packed)
+            total_raw += len(data)
+            total_gz += len(packed)
+            print('Compressed -> {}.gz  {} -> {} bytes'.format(
+                os.path.relpath(path, root), len(data), len(packed)))
+    if total_gz:
+        print('Text assets: {} -> {} bytes ({:.1f}x smaller)'.format(
+            total_raw, total_gz, total_raw / total_gz))
+
+
+def file_info(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return {'size': len(data),
+            'etag': '"{}"'.format(hashlib.sha1(data).hexdigest()[:16])}
+
+
+def write_manifest(root):
+    static = os.path.join(root, 'static')
+    files = {}
+    for dirpath, _dirs, names in os.walk(static):
+        for name in sorted(names):
+            if name.endswith('.gz'):
+                continue
+            path = os.path.join(dirpath, name)
+            info = file_info(path)
+            if os.path.exists(path + '.gz'):
+                info['gz'] = file_info(path + '.gz')
+            files[os.path.relpath(path, static).replace(os.sep, '/')] = info
+    with open(os.path.join(root, MANIFEST), 'w') as f:
+        json.dump(files, f, indent=1, sort_keys=True)
+    print('Manifest -> {} ({} files)'.format(MANIFEST, len(files)))
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description='Build the Pico W Tiny Server static asset tree.')
+    parser.add_argument('root', nargs='?',
+                        default=os.path.join(here, 'pico_tiny_server'),
+                        help='output folder (default: ./pico_tiny_server)')
+    parser.add_argument('--no-download', action='store_true',
+                        help='only compress files already under ROOT/static '
+                        'and rebuild the manifest')
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    if not args.no_download:
+        download(root)
+        with open(os.path.join(root, 'README.txt'), 'w',
+                  encoding='utf-8') as f:
+            f.write(README.format(root=root))
+    compress(root)
+    write_manifest(root)
+
+    print()
+    print('All set. Root:', root)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,13 +6,16 @@ The ``microdot`` module defines a few classes that help implement HTTP-based
 servers for MicroPython and standard Python.
 """
 import asyncio
+import gc
 import io
 import json
+import os
 import time
 
 try:
     from inspect import iscoroutinefunction, iscoroutine
     from functools import partial
+    from concurrent.futures import ThreadPoolExecutor
 
     async def invoke_handler(handler, *args, **kwargs):
         """Invoke a handler and return the result.
@@ -26,6 +29,9 @@ try:
                 None, partial(handler, *args, **kwargs))
         return ret
 except ImportError:  # pragma: no cover
+    iscoroutinefunction = None
+    ThreadPoolExecutor = None
+
     def iscoroutine(coro):
         return hasattr(coro, 'send') and hasattr(coro, 'throw')
 
@@ -40,6 +46,29 @@ except ImportError:  # pragma: no cover
             ret = await ret
         return ret
 
+try:
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_add = time.ticks_add
+    ticks_diff = time.ticks_diff
+except AttributeError:  # pragma: no cover
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_add(a, b):
+        return a + b
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+try:
+    import _thread
+except ImportError:  # pragma: no cover
+    _thread = None
+
 try:
     from sys import print_exception
 except ImportError:  # pragma: no cover
@@ -94,6 +123,16 @@ def urlencode(s):
             '&', '%26').replace('=', '%3D')
 
 
+def http_date(secs):
+    """Format a timestamp as an HTTP date, such as
+    ``Sun, 06 Nov 1994 08:49:37 GMT``."""
+    t = time.gmtime(int(secs))
+    return '{}, {:02d} {} {:04d} {:02d}:{:02d}:{:02d} GMT'.format(
+        ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')[t[6]], t[2],
+        ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+         'Oct', 'Nov', 'Dec')[t[1] - 1], t[0], t[3], t[4], t[5])
+
+
 class NoCaseDict(dict):
     """A subclass of dictionary that holds case-insensitive keys.
 
@@ -146,6 +185,70 @@ class NoCaseDict(dict):
             self[key] = value
 
 
+class HeaderDict:
+    """A case-insensitive dictionary of request headers that keeps the raw
+    header bytes and only decodes the values that are looked up.
+
+    :param raw: a dictionary that maps lowercase header names to header
+                values, both as bytes.
+    :param names: a list with the header names as the client sent them, as
+                  bytes, in the order they were received. If omitted, the
+                  lowercase names of ``raw`` are used.
+
+    Header names are returned as the client sent them when iterating.
+    Repeated headers are combined into a single comma-separated value, except
+    for ``Cookie``, whose values are separated by semicolons.
+
+    Example::
+
+        >>> d = HeaderDict({b'content-type': b'text/html'})
+        >>> print(d['Content-Type'])
+        text/html
+        >>> print('CONTENT-TYPE' in d)
+        True
+    """
+    def __init__(self, raw=None, names=None):
+        self.raw = raw if raw is not None else {}
+        self.names = names if names is not None else list(self.raw)
+
+    def __getitem__(self, key):
+        return self.raw[key.lower().encode()].decode()
+
+    def __setitem__(self, key, value):
+        kl = key.lower().encode()
+        if kl not in self.raw:
+            self.names.append(key.encode())
+        self.raw[kl] = value.encode()
+
+    def __delitem__(self, key):
+        kl = key.lower().encode()
+        del self.raw[kl]
+        self.names = [name for name in self.names if name.lower() != kl]
+
+    def __contains__(self, key):
+        return key.lower().encode() in self.raw
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        value = self.raw.get(key.lower().encode())
+        return default if value is None else value.decode()
+
+    def keys(self):
+        return [name.decode() for name in self.names]
+
+    def values(self):
+        return [self.raw[name.lower()].decode() for name in self.names]
+
+    def items(self):
+        return [(name.decode(), self.raw[name.lower()].decode())
+                for name in self.names]
+
+
 def mro(cls):  # pragma: no cover
     """Return the method resolution order of a class.
 
@@ -294,6 +397,467 @@ class AsyncBytesIO:
         pass
 
 
+class FileCache:
+    """A byte-budgeted LRU cache of small file bodies.
+
+    :param max_bytes: The total number of bytes the cache may hold.
+    :param max_file_size: Files larger than this are never cached and are
+                          streamed from the filesystem instead.
+    :param min_free: If the free heap reported by ``gc.mem_free()`` drops
+                     below this number of bytes, least recently used files
+                     are evicted until it recovers. Ignored on platforms
+                     that do not report free memory.
+
+    Example::
+
+        Response.send_file_cache = FileCache(max_bytes=48 * 1024)
+    """
+    def __init__(self, max_bytes=32 * 1024, max_file_size=8 * 1024,
+                 min_free=24 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.min_free = min_free
+        self.size = 0
+        self.files = {}
+        self.order = []  # least recently used first
+
+    def __contains__(self, filename):
+        return filename in self.files
+
+    def stat(self, filename):
+        """Return the ``os.stat()`` result of a file, without touching the
+        filesystem if the file is cached.
+
+        :param filename: The filename of the file.
+        """
+        entry = self.files.get(filename)
+        return entry[1] if entry is not None else os.stat(filename)
+
+    def get(self, filename, st=None):
+        """Return the contents of a file, loading it into the cache if it is
+        small enough, or ``None`` if the file must be streamed.
+
+        :param filename: The filename of the file.
+        :param st: The ``os.stat()`` result of the file, if already known.
+        """
+        entry = self.files.get(filename)
+        if entry is not None:
+            if self.order[-1] != filename:
+                self.order.remove(filename)
+                self.order.append(filename)
+            return entry[0]
+        if st is None:
+            st = os.stat(filename)
+        size = st[6]
+        if size > self.max_file_size or size > self.max_bytes:
+            return None
+        while self.order and self.size + size > self.max_bytes:
+            self.evict()
+        if self.low_memory() and not self.trim():
+            return None
+        with open(filename, 'rb') as f:
+            data = f.read()
+        self.files[filename] = (data, st)
+        self.order.append(filename)
+        self.size += len(data)
+        return data
+
+    def evict(self):
+        """Remove the least recently used file from the cache."""
+        filename = self.order.pop(0)
+        self.size -= len(self.files.pop(filename)[0])
+
+    def invalidate(self, filename=None):
+        """Remove a file, or all files if ``filename`` is ``None``, from the
+        cache."""
+        if filename is None:
+            self.files = {}
+            self.order = []
+            self.size = 0
+        elif filename in self.files:
+            self.order.remove(filename)
+            self.size -= len(self.files.pop(filename)[0])
+
+    def low_memory(self):
+        """Return ``True`` if the free heap is below the watermark."""
+        mem_free = getattr(gc, 'mem_free', None)
+        return mem_free is not None and self.min_free is not None and \
+            mem_free() < self.min_free
+
+    def trim(self):
+        """Evict files until the free heap is above the watermark. Returns
+        ``True`` if enough memory could be recovered."""
+        while self.low_memory():
+            if not self.order:
+                gc.collect()
+                return not self.low_memory()
+            self.evict()
+            gc.collect()
+        return True
+
+
+class ResponseCache:
+    """A byte-budgeted LRU cache of serialized responses, used by
+    :meth:`Microdot.cached`.
+
+    :param max_bytes: The total number of bytes, headers and bodies, the
+                      cache may hold.
+
+    Entries are keyed by the route, the request URL and the values of the
+    headers the route varies on. Each entry holds the encoded status line and
+    headers, the body and the time it expires.
+    """
+    def __init__(self, max_bytes=8 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = {}
+        self.order = []  # least recently used first
+
+    def get(self, key):
+        """Return the ``(head, body)`` of a cached response, or ``None`` if
+        there is no entry or it has expired.
+
+        :param key: The key of the entry.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if ticks_diff(entry[0], ticks_ms()) <= 0:
+            self.remove(key)
+            return None
+        if self.order[-1] != key:
+            self.order.remove(key)
+            self.order.append(key)
+        return entry[1], entry[2]
+
+    def put(self, key, ttl_ms, head, body):
+        """Store a response.
+
+        :param key: The key of the entry.
+        :param ttl_ms: The number of milliseconds the entry remains valid.
+        :param head: The encoded status line and headers, without the blank
+                     line that ends them.
+        :param body: The body, as bytes.
+        """
+        size = len(head) + len(body)
+        if size > self.max_bytes:
+            return
+        self.remove(key)
+        while self.order and self.size + size > self.max_bytes:
+            self.remove(self.order[0])
+        self.entries[key] = (ticks_add(ticks_ms(), ttl_ms), head, body)
+        self.order.append(key)
+        self.size += size
+
+    def remove(self, key):
+        """Remove an entry from the cache, if present."""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.order.remove(key)
+            self.size -= len(entry[1]) + len(entry[2])
+
+    def invalidate(self, route=None):
+        """Remove the cached responses of a route, or all responses if
+        ``route`` is ``None``.
+
+        :param route: The route function, as returned by
+                      :meth:`Microdot.cached`.
+
+        Example::
+
+            @app.route('/reading')
+            @app.cached(ttl_ms=5000)
+            async def reading(request):
+                return latest
+
+            # in the sensor sampler, after a new reading
+            app.response_cache.invalidate(reading)
+        """
+        if route is None:
+            self.entries = {}
+            self.order = []
+            self.size = 0
+            return
+        for key in [key for key in self.order if key[0] is route]:
+            self.remove(key)
+
+
+class FileStream:
+    """A file-like object that opens a file the first time it is read.
+
+    :param filename: The filename of the file.
+    :param start: The position of the first byte to read.
+    :param length: The number of bytes to read, or ``None`` to read to the
+                   end of the file.
+
+    Responses returned by :meth:`Response.send_file` and
+    :meth:`StaticManifest.send` use it as their body, so that a response
+    waiting for a slot under :attr:`Microdot.max_file_streams` does not hold
+    an open file, and ``HEAD`` responses never open one.
+    """
+    def __init__(self, filename, start=0, length=None):
+        self.filename = filename
+        self.start = start
+        self.remaining = length
+        self.f = None
+
+    def open(self):
+        f = open(self.filename, 'rb')
+        if self.start:
+            f.seek(self.start)
+        self.f = f
+        return f
+
+    def read(self, n=-1):
+        f = self.f or self.open()
+        if self.remaining is None:
+            return f.read(n)
+        if n < 0 or n > self.remaining:
+            n = self.remaining
+        buf = f.read(n) if n else b''
+        self.remaining -= len(buf)
+        return buf
+
+    def readinto(self, buf):
+        f = self.f or self.open()
+        if self.remaining is None:
+            return f.readinto(buf)
+        if self.remaining <= 0:
+            return 0
+        if len(buf) > self.remaining:
+            buf = memoryview(buf)[:self.remaining]
+        n = f.readinto(buf) or 0
+        self.remaining -= n
+        return n
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class StaticManifest:
+    """An index of the files in a static folder, built once at startup.
+
+    :param root: The folder that holds the static files.
+    :param url_prefix: The URL path under which the files are served.
+    :param cache_control: The ``Cache-Control`` header to send with the
+                          files, if any.
+    :param manifest: The filename of a manifest written by
+                     ``build_pico_assets.py``. If given, its entity tags,
+                     the content hashes recorded at build time, are used.
+                     The sizes it records are checked against the files
+                     once, at startup, and the folder is scanned instead if
+                     the manifest is missing, malformed or out of date.
+
+    Each URL path maps to the file, its ``os.stat()`` result, its entity tag
+    and the encoded status line and headers of a full response, for the file
+    and for its pre-compressed ``.gz`` sibling. Serving a file is then a
+    single dictionary lookup, with no ``os.stat()`` calls and no header
+    formatting, and a path that is not in the manifest is rejected without
+    touching the filesystem.
+
+    Example::
+
+        static = StaticManifest('/static', cache_control='max-age=86400')
+
+        @app.route('/static/<path:path>')
+        def static_files(request, path):
+            return static.send(request) or ('Not found', 404)
+    """
+    def __init__(self, root, url_prefix='/static/', cache_control=None,
+                 manifest=None):
+        self.root = root.rstrip('/')
+        self.url_prefix = url_prefix
+        self.cache_control = cache_control
+        #: The files, keyed by URL path. Each entry is a tuple with the
+        #: content type, the uncompressed variant and the gzip variant, or
+        #: ``None``. A variant is a ``(filename, stat, etag, last_modified,
+        #: head)`` tuple.
+        self.entries = {}
+        files = None
+        if manifest is not None:
+            try:
+                with open(manifest) as f:
+                    files = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if files is None or not self.load(files):
+            self.entries = {}
+            self.scan('')
+
+    def load(self, files):
+        """Add the files listed in a manifest. Returns ``False`` if a file
+        is missing or its size differs from the manifest.
+
+        :param files: The parsed manifest, a dictionary that maps paths
+                      relative to the static root to their ``size``,
+                      ``etag`` and optional ``gz`` variant.
+        """
+        try:
+            for relpath, info in files.items():
+                st = os.stat(self.root + '/' + relpath)
+                gz = info.get('gz')
+                gz_st = os.stat(self.root + '/' + relpath + '.gz') \
+                    if gz else None
+                if st[6] != info['size'] or \
+                        (gz and gz_st[6] != gz['size']):
+                    return False
+                self.add(relpath, st, info['etag'], None, gz_st,
+                         gz['etag'] if gz else None, None)
+        except (OSError, KeyError, TypeError, AttributeError):
+            return False
+        return True
+
+    def scan(self, folder):
+        """Add the files in a folder of the static root, and its subfolders,
+        to the manifest.
+
+        :param folder: The folder, relative to the static root.
+        """
+        base = self.root + folder + '/'
+        names = os.listdir(base)
+        for name in names:
+            st = os.stat(base + name)
+            if st[0] & 0x4000:  # directory
+                self.scan(folder + '/' + name)
+            elif not name.endswith('.gz'):
+                gz_st = None
+                if name + '.gz' in names:
+                    gz_st = os.stat(base + name + '.gz')
+                self.add((folder + '/' + name)[1:], st,
+                         '"{:x}-{:x}"'.format(st[6], int(st[8])),
+                         http_date(st[8]), gz_st,
+                         '"{:x}-{:x}"'.format(gz_st[6], int(gz_st[8]))
+                         if gz_st else None,
+                         http_date(gz_st[8]) if gz_st else None)
+
+    def add(self, relpath, st, etag, last_modified, gz_st=None, gz_etag=None,
+            gz_last_modified=None):
+        """Add a file to the manifest.
+
+        :param relpath: The path of the file, relative to the static root.
+        :param st: The ``os.stat()`` result of the file.
+        :param etag: The entity tag of the file.
+        :param last_modified: The ``Last-Modified`` date of the file, or
+                              ``None``.
+        :param gz_st: The ``os.stat()`` result of the ``.gz`` variant of the
+                      file, or ``None`` if there is no variant.
+        :param gz_etag: The entity tag of the ``.gz`` variant.
+        :param gz_last_modified: The ``Last-Modified`` date of the ``.gz``
+                                 variant.
+        """
+        filename = self.root + '/' + relpath
+        content_type = Response.types_map.get(relpath.split('.')[-1],
+                                              'application/octet-stream')
+        if content_type.startswith('text/'):
+            content_type += '; charset=UTF-8'
+        vary = gz_st is not None
+        entry = (
+            content_type,
+            (filename, st, etag, last_modified,
+             self.head(content_type, st[6], etag, last_modified, None,
+                       vary)),
+            (filename + '.gz', gz_st, gz_etag, gz_last_modified,
+             self.head(content_type, gz_st[6], gz_etag, gz_last_modified,
+                       'gzip', vary)) if vary else None)
+        self.entries[self.url_prefix + relpath] = entry
+
+    def head(self, content_type, size, etag, last_modified, encoding, vary):
+        lines = ['HTTP/1.1 200 OK',
+                 'Content-Type: ' + content_type,
+                 'Content-Length: ' + str(size),
+                 'ETag: ' + etag,
+                 'Accept-Ranges: bytes']
+        if last_modified:
+            lines.append('Last-Modified: ' + last_modified)
+        if encoding:
+            lines.append('Content-Encoding: ' + encoding)
+        if vary:
+            lines.append('Vary: Accept-Encoding')
+        if self.cache_control:
+            lines.append('Cache-Control: ' + self.cache_control)
+        return ('\r\n'.join(lines) + '\r\n').encode()
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def send(self, request, path=None):
+        """Return the response for a static file, or ``None`` if the path
+        is not in the manifest.
+
+        :param request: The request.
+        :param path: The URL path of the file. If omitted, the path of the
+                     request is used.
+
+        The gzip variant is chosen when the client accepts it, conditional
+        requests are answered with 304, and a single byte range of the
+        uncompressed file is answered with 206, or 416 if it cannot be
+        satisfied.
+        """
+        entry = self.entries.get(request.path if path is None else path)
+        if entry is None:
+            return None
+        ranged = 'Range' in request.headers
+        variant = entry[1]
+        if entry[2] is not None and not ranged and \
+                request.accepts_encoding('gzip'):
+            variant = entry[2]
+        filename, st, etag, last_modified, head = variant
+        if request.not_modified(etag, last_modified):
+            return Response(body=b'', status_code=304,
+                            headers=self.headers(entry, etag, last_modified),
+                            reason='Not Modified')
+        cache = Response.send_file_cache
+        body = cache.get(filename, st) if cache is not None else None
+        byte_range = None
+        if ranged:
+            headers = self.headers(entry, etag, last_modified)
+            size = st[6]
+            byte_range = Response.parse_range(request, size, headers)
+            if byte_range is False:
+                headers['Content-Range'] = 'bytes */{}'.format(size)
+                return Response(body=b'', status_code=416, headers=headers,
+                                reason='Range Not Satisfiable')
+        if byte_range:
+            start, end = byte_range
+            headers['Content-Type'] = entry[0]
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end,
+                                                               size)
+            headers['Content-Length'] = str(end + 1 - start)
+            headers['Accept-Ranges'] = 'bytes'
+            return Response(body=body[start:end + 1] if body is not None
+                            else FileStream(filename, start, end + 1 - start),
+                            status_code=206, headers=headers)
+        res = Response(body=body if body is not None
+                       else FileStream(filename))
+        res.raw_head = head
+        return res
+
+    def headers(self, entry, etag, last_modified):
+        """Return the validator and caching headers of a file, for the
+        responses that are not sent with the pre-encoded head."""
+        headers = {'ETag': etag}
+        if last_modified:
+            headers['Last-Modified'] = last_modified
+        if entry[2] is not None:
+            headers['Vary'] = 'Accept-Encoding'
+        if self.cache_control:
+            headers['Cache-Control'] = self.cache_control
+        return headers
+
+
+class RequestTimeout(asyncio.TimeoutError):
+    """Raised when a client is too slow to send a phase of its request.
+
+    :param phase: The phase that timed out, one of ``'idle'``,
+                  ``'request_line'``, ``'headers'`` or ``'body'``.
+    """
+    def __init__(self, phase):
+        super().__init__(phase)
+        self.phase = phase
+
+
 class Request:
     """An HTTP request."""
     #: Specify the maximum payload size that is accepted. Requests with larger
@@ -325,11 +889,55 @@ class Request:
     #:    Request.max_readline = 16 * 1024  # 16KB lines allowed
     max_readline = 2 * 1024
 
+    #: Specify the maximum number of headers accepted in a request. Requests
+    #: with more headers are rejected with a 400 status code.
+    #:
+    #: Example::
+    #:
+    #:    Request.max_headers = 50
+    max_headers = 32
+
+    #: Specify the maximum total size in bytes of the request line and
+    #: headers. Requests with larger heads are rejected with a 400 status
+    #: code.
+    #:
+    #: Example::
+    #:
+    #:    Request.max_header_size = 16 * 1024  # 16KB request heads allowed
+    max_header_size = 4 * 1024
+
+    #: Specify the number of seconds a new connection has to send its
+    #: request line. Later requests on a persistent connection use
+    #: :attr:`Microdot.keep_alive_timeout` instead. ``None`` waits forever.
+    #:
+    #: The request line and the headers are read under a single timeout,
+    #: so the two limits add up: a client that sends nothing is only
+    #: disconnected after ``request_line_timeout + header_timeout``
+    #: seconds.
+    #:
+    #: Example::
+    #:
+    #:    Request.request_line_timeout = 5
+    request_line_timeout = 10
+
+    #: Specify the number of seconds a client has to send all the request
+    #: headers once the request line was received. The deadline is checked
+    #: as each header line arrives, and a client that stops sending is
+    #: disconnected at most this many seconds after the request line timeout
+    #: would have expired. ``None`` waits forever.
+    header_timeout = 10
+
+    #: Specify the number of seconds a client has to send a request body
+    #: that is read into :attr:`body`. Bodies larger than
+    #: :attr:`max_body_length` are read by the application from
+    #: :attr:`stream` and are not covered. ``None`` waits forever.
+    body_timeout = 20
+
     class G:
         pass
 
     def __init__(self, app, client_addr, method, url, http_version, headers,
-                 body=None, stream=None, sock=None):
+                 body=None, stream=None, sock=None, content_length=None):
         #: The application instance to which this request belongs.
         self.app = app
         #: The address of the client, as a tuple (host, port).
@@ -342,17 +950,12 @@ class Request:
         self.path = url
         #: The query string portion of the URL.
         self.query_string = None
-        #: The parsed query string, as a
-        #: :class:`MultiDict <microdot.MultiDict>` object.
-        self.args = {}
         #: A dictionary with the headers included in the request.
         self.headers = headers
-        #: A dictionary with the cookies included in the request.
-        self.cookies = {}
         #: The parsed ``Content-Length`` header.
         self.content_length = 0
-        #: The parsed ``Content-Type`` header.
-        self.content_type = None
+        #: The handler of the route that matched the request, or ``None``.
+        self.route = None
         #: A general purpose container for applications to store data during
         #: the life of the request.
         self.g = Request.G()
@@ -360,17 +963,14 @@ class Request:
         self.http_version = http_version
         if '?' in self.path:
             self.path, self.query_string = self.path.split('?', 1)
-            self.args = self._parse_urlencoded(self.query_string)
 
-        if 'Content-Length' in self.headers:
+        if content_length is not None:
+            self.content_length = content_length
+        elif 'Content-Length' in self.headers:
             self.content_length = int(self.headers['Content-Length'])
-        if 'Content-Type' in self.headers:
-            self.content_type = self.headers['Content-Type']
-        if 'Cookie' in self.headers:
-            for cookie in self.headers['Cookie'].split(';'):
-                name, value = cookie.strip().split('=', 1)
-                self.cookies[name] = value
 
+        self._args = None
+        self._cookies = None
         self._body = body
         self.body_used = False
         self._stream = stream
@@ -380,7 +980,8 @@ class Request:
         self.after_request_handlers = []
 
     @staticmethod
-    async def create(app, client_reader, client_writer, client_addr):
+    async def create(app, client_reader, client_writer, client_addr,
+                     idle_timeout=None):
         """Create a request object.
 
         :param app: The Microdot application instance.
@@ -389,43 +990,152 @@ class Request:
         :param client_writer: An output stream where the response data can be
                               written.
         :param client_addr: The address of the client, as a tuple.
+        :param idle_timeout: The number of seconds to wait for the request
+                             line on a persistent connection. If omitted,
+                             :attr:`request_line_timeout` is used.
 
         This method is a coroutine. It returns a newly created ``Request``
         object.
+
+        The request head is parsed as bytes. Header values are stored raw in
+        a :class:`HeaderDict` and only decoded when the application looks
+        them up. The number of headers and the total size of the request
+        head are limited by :attr:`max_headers` and :attr:`max_header_size`.
+        The request line and headers are read under a single timeout, the
+        sum of the request line (or idle) timeout and
+        :attr:`header_timeout`, so an idle client is disconnected only when
+        both have expired. The header deadline is also checked as each
+        header line arrives. The body gets its own timeout. A
+        :class:`RequestTimeout` exception is raised when a client is too
+        slow.
         """
-        # request line
-        line = (await Request._safe_readline(client_reader)).strip().decode()
-        if not line:  # pragma: no cover
+        line_timeout = Request.request_line_timeout \
+            if idle_timeout is None else idle_timeout
+        if line_timeout is None or Request.header_timeout is None:
+            timeout = None
+        else:
+            timeout = line_timeout + Request.header_timeout
+        # the phase being read, for the RequestTimeout
+        phase = ['request_line' if idle_timeout is None else 'idle']
+        try:
+            if timeout is None:
+                head = await Request._read_head(client_reader, phase)
+            else:
+                head = await asyncio.wait_for(
+                    Request._read_head(client_reader, phase), timeout)
+        except asyncio.TimeoutError:
+            raise RequestTimeout(phase[0])
+        if head is None:  # pragma: no cover
             return None
-        method, url, http_version = line.split()
-        http_version = http_version.split('/', 1)[1]
-
-        # headers
-        headers = NoCaseDict()
-        content_length = 0
-        while True:
-            line = (await Request._safe_readline(
-                client_reader)).strip().decode()
-            if line == '':
-                break
-            header, value = line.split(':', 1)
-            value = value.strip()
-            headers[header] = value
-            if header.lower() == 'content-length':
-                content_length = int(value)
+        method, url, http_version, raw, names, content_length = head
 
         # body
-        body = b''
         if content_length and content_length <= Request.max_body_length:
-            body = await client_reader.readexactly(content_length)
+            body = await Request._wait(
+                client_reader.readexactly(content_length),
+                Request.body_timeout, 'body')
             stream = None
         else:
             body = b''
             stream = client_reader
 
-        return Request(app, client_addr, method, url, http_version, headers,
+        return Request(app, client_addr, method.decode(), url.decode(),
+                       http_version.decode(), HeaderDict(raw, names),
                        body=body, stream=stream,
-                       sock=(client_reader, client_writer))
+                       sock=(client_reader, client_writer),
+                       content_length=content_length)
+
+    @staticmethod
+    async def _read_head(client_reader, phase):
+        # request line
+        line = await Request._safe_readline(client_reader)
+        parts = line.split()
+        if not parts:  # pragma: no cover
+            return None
+        method, url, http_version = parts
+        http_version = http_version[http_version.find(b'/') + 1:]
+
+        # headers
+        phase[0] = 'headers'
+        deadline = None
+        if Request.header_timeout is not None:
+            deadline = ticks_add(ticks_ms(),
+                                 int(Request.header_timeout * 1000))
+        raw = {}
+        names = []
+        count = 0
+        content_length = 0
+        total = len(line)
+        while True:
+            line = await Request._safe_readline(client_reader)
+            if deadline is not None and ticks_diff(ticks_ms(), deadline) > 0:
+                raise RequestTimeout('headers')
+            total += len(line)
+            if total > Request.max_header_size:
+                raise ValueError('request head too large')
+            i = line.find(b':')
+            if i < 0:
+                if line.strip():
+                    raise ValueError('invalid header')
+                break
+            count += 1
+            if count > Request.max_headers:
+                raise ValueError('too many headers')
+            name = line[:i].strip()
+            key = name.lower()
+            value = line[i + 1:].strip()
+            if key in raw:
+                value = raw[key] + (b'; ' if key == b'cookie' else b', ') + \
+                    value
+            else:
+                names.append(name)
+                if key == b'content-length':
+                    content_length = int(value)
+            raw[key] = value
+        return method, url, http_version, raw, names, content_length
+
+    @staticmethod
+    async def _wait(coro, timeout, phase):
+        if timeout is None:
+            return await coro
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise RequestTimeout(phase)
+
+    @property
+    def args(self):
+        """The parsed query string, as a
+        :class:`MultiDict <microdot.MultiDict>` object. The query string is
+        only parsed the first time this attribute is accessed."""
+        if self._args is None:
+            if self.query_string is None:
+                self._args = {}
+            else:
+                self._args = self._parse_urlencoded(self.query_string)
+        return self._args
+
+    @args.setter
+    def args(self, value):
+        self._args = value
+
+    @property
+    def cookies(self):
+        """A dictionary with the cookies included in the request. The
+        ``Cookie`` header is only parsed the first time this attribute is
+        accessed."""
+        if self._cookies is None:
+            self._cookies = {}
+            for cookie in self.headers.get('Cookie', '').split(';'):
+                if '=' in cookie:
+                    name, value = cookie.strip().split('=', 1)
+                    self._cookies[name] = value
+        return self._cookies
+
+    @property
+    def content_type(self):
+        """The parsed ``Content-Type`` header."""
+        return self.headers.get('Content-Type')
 
     def _parse_urlencoded(self, urlencoded):
         data = MultiDict()
@@ -481,6 +1191,58 @@ class Request:
             self._form = self._parse_urlencoded(self.body)
         return self._form
 
+    def accepts_encoding(self, encoding):
+        """Return ``True`` if the client accepts responses with the given
+        content encoding, according to its ``Accept-Encoding`` header.
+
+        :param encoding: The content encoding, for example ``'gzip'``.
+
+        An entry that names the encoding takes precedence over ``*``, so
+        ``*, gzip;q=0`` does not accept ``gzip``.
+        """
+        wildcard = False
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            params = coding.split(';')
+            name = params[0].strip().lower()
+            if name == encoding or name == '*':
+                accepted = True
+                for param in params[1:]:
+                    param = param.strip().replace(' ', '')
+                    if param.startswith('q='):
+                        try:
+                            accepted = float(param[2:]) > 0
+                        except ValueError:
+                            accepted = False
+                        break
+                if name == encoding:
+                    return accepted
+                wildcard = accepted
+        return wildcard
+
+    def not_modified(self, etag, last_modified=None):
+        """Return ``True`` if the client already holds the representation
+        identified by ``etag`` and ``last_modified``, according to its
+        ``If-None-Match`` and ``If-Modified-Since`` headers.
+
+        :param etag: The entity tag of the current representation.
+        :param last_modified: The ``Last-Modified`` date of the current
+                              representation, as an HTTP date string.
+
+        ``If-Modified-Since`` is only considered when the request has no
+        ``If-None-Match`` header, and it matches when it repeats the exact
+        ``Last-Modified`` value, as browsers do.
+        """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                if tag == '*' or tag == etag or \
+                        (tag.startswith('W/') and tag[2:] == etag):
+                    return True
+            return False
+        return last_modified is not None and \
+            self.headers.get('If-Modified-Since') == last_modified
+
     def after_request(self, f):
         """Register a request-specific function to run after the request is
         handled. Request-specific after request handlers run at the very end,
@@ -533,6 +1295,7 @@ class Response:
         'css': 'text/css',
         'gif': 'image/gif',
         'html': 'text/html',
+        'ico': 'image/x-icon',
         'jpg': 'image/jpeg',
         'js': 'application/javascript',
         'json': 'application/json',
@@ -542,6 +1305,10 @@ class Response:
 
     send_file_buffer_size = 1024
 
+    #: Encoded status lines for responses without a custom reason, keyed by
+    #: status code.
+    status_lines = {}
+
     #: The content type to use for responses that do not explicitly define a
     #: ``Content-Type`` header.
     default_content_type = 'text/plain'
@@ -550,10 +1317,29 @@ class Response:
     #: of ``None`` means that no ``Cache-Control`` header is added.
     default_send_file_max_age = None
 
+    #: A :class:`FileCache` instance that :meth:`send_file` uses to serve
+    #: small files from memory. A value of ``None`` disables caching.
+    send_file_cache = None
+
+    #: Whether a file has a pre-compressed ``.gz`` sibling, keyed by
+    #: filename. :meth:`send_file` fills it in the first time it sends a file
+    #: for a request, so that later requests do not stat the sibling again.
+    #: Clear it if ``.gz`` files are added or removed while the server runs.
+    gzip_variants = {}
+
     #: Special response used to signal that a response does not need to be
     #: written to the client. Used to exit WebSocket connections cleanly.
     already_handled = None
 
+    #: The encoded status line and headers of a response served from a
+    #: :class:`ResponseCache`, written ahead of :attr:`headers`, which then
+    #: only holds per-request additions such as ``Connection``.
+    raw_head = None
+
+    #: Whether the body is written with chunked transfer encoding. This is
+    #: decided by :meth:`complete`.
+    chunked = False
+
     def __init__(self, body='', status_code=200, headers=None, reason=None):
         if body is None and status_code == 200:
             body = ''
@@ -571,6 +1357,27 @@ class Response:
             self.body = body
         self.is_head = False
 
+    @classmethod
+    def from_result(cls, result):
+        """Return the response for the value returned by a route handler.
+
+        :param result: A :class:`Response`, a body, or a tuple with a body
+                       followed by a status code and/or a headers
+                       dictionary.
+        """
+        if isinstance(result, tuple):
+            body = result[0]
+            if isinstance(result[1], int):
+                status_code = result[1]
+                headers = result[2] if len(result) > 2 else {}
+            else:
+                status_code = 200
+                headers = result[1]
+            return cls(body, status_code, headers)
+        elif not isinstance(result, Response):
+            return cls(result)
+        return result
+
     def set_cookie(self, cookie, value, path=None, domain=None, expires=None,
                    max_age=None, secure=False, http_only=False,
                    partitioned=False):
@@ -621,41 +1428,134 @@ class Response:
         self.set_cookie(cookie, '', expires='Thu, 01 Jan 1970 00:00:01 GMT',
                         **kwargs)
 
-    def complete(self):
-        if isinstance(self.body, bytes) and \
-                'Content-Length' not in self.headers:
-            self.headers['Content-Length'] = str(len(self.body))
+    def complete(self, chunked=False):
+        """Add the headers that the application did not set.
+
+        :param chunked: Whether the client accepts chunked transfer encoding.
+                        If ``True``, bodies of unknown length, such as
+                        generators, async iterators and files, are sent
+                        with ``Transfer-Encoding: chunked`` so that the
+                        connection can be reused.
+        """
+        if self.status_code == 304 or self.raw_head is not None:
+            return
+        if isinstance(self.body, bytes):
+            if 'Content-Length' not in self.headers:
+                self.headers['Content-Length'] = str(len(self.body))
+        elif chunked and 'Content-Length' not in self.headers and \
+                'Transfer-Encoding' not in self.headers:
+            self.headers['Transfer-Encoding'] = 'chunked'
+            self.chunked = True
         if 'Content-Type' not in self.headers:
             self.headers['Content-Type'] = self.default_content_type
             if 'charset=' not in self.headers['Content-Type']:
                 self.headers['Content-Type'] += '; charset=UTF-8'
 
-    async def write(self, stream):
+    def status_line(self):
+        """Return the encoded status line of the response."""
+        if self.reason is not None:
+            return 'HTTP/1.1 {} {}\r\n'.format(self.status_code,
+                                               self.reason).encode()
+        line = Response.status_lines.get(self.status_code)
+        if line is None:
+            line = 'HTTP/1.1 {} {}\r\n'.format(
+                self.status_code,
+                'OK' if self.status_code == 200 else 'N/A').encode()
+            Response.status_lines[self.status_code] = line
+        return line
+
+    def serialize_head(self, buffer):
+        """Serialize the status line and headers of the response into
+        ``buffer``, a ``bytearray``. Returns the number of bytes used, or -1
+        if the headers do not fit in the buffer."""
+        view = memoryview(buffer)
+        size = len(buffer)
+        line = self.raw_head if self.raw_head is not None else \
+            self.status_line()
+        pos = len(line)
+        if pos > size:
+            return -1
+        view[:pos] = line
+        for header, value in self.headers.items():
+            header = header.encode()
+            values = value if isinstance(value, list) else (value,)
+            for value in values:
+                value = (value if isinstance(value, str)
+                         else str(value)).encode()
+                end = pos + len(header) + len(value) + 4
+                if end + 2 > size:
+                    return -1
+                view[pos:pos + len(header)] = header
+                pos += len(header)
+                view[pos:pos + 2] = b': '
+                view[pos + 2:end - 2] = value
+                view[end - 2:end] = b'\r\n'
+                pos = end
+        if pos + 2 > size:
+            return -1
+        view[pos:pos + 2] = b'\r\n'
+        return pos + 2
+
+    async def write(self, stream, buffer=None):
+        """Write the response to a stream.
+
+        :param stream: The output stream.
+        :param buffer: A ``bytearray`` used to serialize the headers and to
+                       read file bodies into. Servers pass one buffer per
+                       connection so that writing a response does not
+                       allocate. If omitted, a temporary buffer of
+                       :attr:`send_file_buffer_size` bytes is used.
+
+        The return value is the number of bytes written.
+        """
         self.complete()
+        sent = 0
+        if buffer is None:
+            buffer = bytearray(self.send_file_buffer_size)
+        view = memoryview(buffer)
 
         try:
-            # status code
-            reason = self.reason if self.reason is not None else \
-                ('OK' if self.status_code == 200 else 'N/A')
-            await stream.awrite('HTTP/1.0 {status_code} {reason}\r\n'.format(
-                status_code=self.status_code, reason=reason).encode())
-
-            # headers
-            for header, value in self.headers.items():
-                values = value if isinstance(value, list) else [value]
-                for value in values:
-                    await stream.awrite('{header}: {value}\r\n'.format(
-                        header=header, value=value).encode())
-            await stream.awrite(b'\r\n')
+            # status line and headers, in a single write
+            n = self.serialize_head(buffer)
+            if n >= 0:
+                await stream.awrite(view[:n])
+                sent += n
+            else:
+                head = [self.raw_head if self.raw_head is not None
+                        else self.status_line()]
+                for header, value in self.headers.items():
+                    values = value if isinstance(value, list) else [value]
+                    for value in values:
+                        head.append('{header}: {value}\r\n'.format(
+                            header=header, value=value).encode())
+                head.append(b'\r\n')
+                head = b''.join(head)
+                await stream.awrite(head)
+                sent += len(head)
 
             # body
-            if not self.is_head:
+            if not self.is_head and self.chunked:
+                sent += await self.write_chunked(stream, buffer)
+            elif not self.is_head and hasattr(self.body, 'readinto'):
+                # files are streamed through the buffer
+                try:
+                    size = len(buffer)
+                    while True:
+                        n = self.body.readinto(buffer)
+                        if not n:
+                            break
+                        await stream.awrite(view if n == size else view[:n])
+                        sent += n
+                finally:
+                    self.body.close()
+            elif not self.is_head:
                 iter = self.body_iter()
                 async for body in iter:
                     if isinstance(body, str):  # pragma: no cover
                         body = body.encode()
                     try:
                         await stream.awrite(body)
+                        sent += len(body)
                     except OSError as exc:  # pragma: no cover
                         if exc.errno in MUTED_SOCKET_ERRORS or \
                                 exc.args[0] == 'Connection lost':
@@ -664,6 +1564,12 @@ class Response:
                         raise
                 if hasattr(iter, 'aclose'):  # pragma: no branch
                     await iter.aclose()
+            elif hasattr(self.body, 'close'):
+                # HEAD responses do not read the body, but files must still
+                # be released
+                result = self.body.close()
+                if iscoroutine(result):  # pragma: no cover
+                    await result
 
         except OSError as exc:  # pragma: no cover
             if exc.errno in MUTED_SOCKET_ERRORS or \
@@ -671,6 +1577,89 @@ class Response:
                 pass
             else:
                 raise
+        return sent
+
+    async def write_chunked(self, stream, buffer):
+        """Write the body with chunked transfer encoding.
+
+        :param stream: The output stream.
+        :param buffer: A ``bytearray`` in which the chunks are framed.
+
+        This method is a coroutine. Files are read straight into the buffer,
+        after the room reserved for the chunk size line. Small pieces
+        yielded by a generator are gathered in the buffer and sent as one
+        chunk, while pieces that do not fit are written as they are.
+        Async iterators, such as event streams, get a chunk per item so
+        that nothing is held back. The return value is the number of bytes
+        written.
+        """
+        view = memoryview(buffer)
+        # room for the longest size line before the data, and for the CRLF
+        # that ends the chunk and the last chunk after it
+        start = len('{:x}\r\n'.format(len(buffer)))
+        room = len(buffer) - start - 7
+        sent = 0
+        if hasattr(self.body, 'readinto'):
+            try:
+                while True:
+                    n = self.body.readinto(view[start:start + room])
+                    if not n:
+                        break
+                    sent += await self._write_chunk(stream, view, start, n)
+            finally:
+                self.body.close()
+            return sent + await self._write_chunk(stream, view, start, 0,
+                                                  last=True)
+
+        each = hasattr(self.body, '__anext__')
+        iter = self.body_iter()
+        n = 0
+        try:
+            async for body in iter:
+                if isinstance(body, str):  # pragma: no cover
+                    body = body.encode()
+                length = len(body)
+                if not length:
+                    continue  # an empty chunk would end the body
+                if n and n + length > room:
+                    sent += await self._write_chunk(stream, view, start, n)
+                    n = 0
+                if length > room:
+                    line = '{:x}\r\n'.format(length).encode()
+                    await stream.awrite(line)
+                    await stream.awrite(body)
+                    await stream.awrite(b'\r\n')
+                    sent += len(line) + length + 2
+                    continue
+                view[start + n:start + n + length] = body
+                n += length
+                if each:
+                    sent += await self._write_chunk(stream, view, start, n)
+                    n = 0
+            sent += await self._write_chunk(stream, view, start, n,
+                                            last=True)
+        finally:
+            if hasattr(iter, 'aclose'):  # pragma: no branch
+                await iter.aclose()
+        return sent
+
+    @staticmethod
+    async def _write_chunk(stream, view, start, n, last=False):
+        # frame the n bytes of data at view[start:] in place, so that the
+        # chunk goes out in a single write
+        pos = start
+        if n:
+            line = '{:x}\r\n'.format(n).encode()
+            pos -= len(line)
+            view[pos:start] = line
+            view[start + n:start + n + 2] = b'\r\n'
+            n += 2
+        end = start + n
+        if last:
+            view[end:end + 5] = b'0\r\n\r\n'
+            end += 5
+        await stream.awrite(view[pos:end])
+        return end - pos
 
     def body_iter(self):
         if hasattr(self.body, '__anext__'):
@@ -741,7 +1730,7 @@ class Response:
     @classmethod
     def send_file(cls, filename, status_code=200, content_type=None,
                   stream=None, max_age=None, compressed=False,
-                  file_extension=''):
+                  file_extension='', request=None, etag=None):
         """Send file contents in a response.
 
         :param filename: The filename of the file.
@@ -768,6 +1757,21 @@ class Response:
                                parameter when opening the file, including the
                                dot. The extension given here is not considered
                                when generating the ``Content-Type`` header.
+        :param request: The request being answered. If given, and the file is
+                        not already marked as ``compressed``, a pre-compressed
+                        ``.gz`` sibling of the file is served instead when the
+                        client accepts the ``gzip`` encoding. Responses for
+                        files that have a compressed variant include a
+                        ``Vary: Accept-Encoding`` header. The request's
+                        conditional headers are also checked, and a bodiless
+                        304 response is returned without opening the file
+                        when the client's copy is current. A single
+                        ``Range: bytes=`` range is answered with a 206
+                        response, or 416 if it cannot be satisfied.
+        :param etag: The ``ETag`` header to use, for example a content hash
+                     computed at build time. If omitted, a strong entity tag
+                     is derived from the size and modification time of the
+                     file.
 
         Security note: The filename is assumed to be trusted. Never pass
         filenames provided by the user without validating and sanitizing them
@@ -786,13 +1790,115 @@ class Response:
         if max_age is not None:
             headers['Cache-Control'] = 'max-age={}'.format(max_age)
 
+        if request is not None and not compressed and stream is None:
+            gz = cls.gzip_variants.get(filename + file_extension)
+            if gz is None:
+                try:
+                    os.stat(filename + file_extension + '.gz')
+                    gz = True
+                except OSError:
+                    gz = False
+                cls.gzip_variants[filename + file_extension] = gz
+            if gz:
+                headers['Vary'] = 'Accept-Encoding'
+                if request.accepts_encoding('gzip'):
+                    file_extension += '.gz'
+                    compressed = True
+
         if compressed:
             headers['Content-Encoding'] = compressed \
                 if isinstance(compressed, str) else 'gzip'
 
-        f = stream or open(filename + file_extension, 'rb')
+        if stream is None:
+            path = filename + file_extension
+            cache = cls.send_file_cache
+            st = cache.stat(path) if cache is not None else os.stat(path)
+            headers['ETag'] = etag or '"{:x}-{:x}"'.format(st[6], int(st[8]))
+            headers['Last-Modified'] = http_date(st[8])
+            if request is not None and status_code == 200 and \
+                    request.not_modified(headers['ETag'],
+                                         headers['Last-Modified']):
+                del headers['Content-Type']
+                headers.pop('Content-Encoding', None)
+                return cls(body=b'', status_code=304, headers=headers,
+                           reason='Not Modified')
+            size = st[6]
+            byte_range = None
+            if status_code == 200:
+                headers['Accept-Ranges'] = 'bytes'
+                if request is not None:
+                    byte_range = cls.parse_range(request, size, headers)
+                    if byte_range is False:
+                        # the empty body is not the file, so it is not sent
+                        # with the file's type and encoding
+                        del headers['Content-Type']
+                        headers.pop('Content-Encoding', None)
+                        headers['Content-Range'] = 'bytes */{}'.format(size)
+                        return cls(body=b'', status_code=416, headers=headers,
+                                   reason='Range Not Satisfiable')
+            if byte_range:
+                start, end = byte_range
+                headers['Content-Range'] = 'bytes {}-{}/{}'.format(
+                    start, end, size)
+                status_code = 206
+            if cache is not None:
+                body = cache.get(path, st)
+                if body is not None:
+                    if byte_range:
+                        body = body[start:end + 1]
+                    return cls(body=body, status_code=status_code,
+                               headers=headers)
+            # a known length keeps the body framed on persistent connections
+            if byte_range:
+                f = FileStream(path, start, end + 1 - start)
+                headers['Content-Length'] = str(end + 1 - start)
+            else:
+                f = FileStream(path)
+                headers['Content-Length'] = str(size)
+        else:
+            f = stream
         return cls(body=f, status_code=status_code, headers=headers)
 
+    @staticmethod
+    def parse_range(request, size, headers):
+        """Parse the ``Range`` header of a request for a file.
+
+        :param request: The request.
+        :param size: The size of the file in bytes.
+        :param headers: The response headers, used to evaluate ``If-Range``.
+
+        Returns a ``(start, end)`` tuple with the inclusive byte positions
+        to send, ``None`` if the whole file should be sent, or ``False`` if
+        the range cannot be satisfied. Only single ranges are supported,
+        requests for multiple ranges receive the whole file.
+        """
+        value = request.headers.get('Range')
+        if value is None or not value.startswith('bytes=') or ',' in value:
+            return None
+        if_range = request.headers.get('If-Range')
+        if if_range is not None and if_range != headers.get('ETag') and \
+                if_range != headers.get('Last-Modified'):
+            return None
+        try:
+            first, last = value[6:].strip().split('-', 1)
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if start >= size:
+                    return False
+                if end < start:
+                    return None
+            else:
+                start = size - int(last)
+                end = size - 1
+                if start < 0:
+                    start = 0
+                elif start > end:
+                    return False
+        except ValueError:
+            return None
+        return start, min(end, size - 1)
+
 
 class URLPattern():
     def __init__(self, url_pattern):
@@ -830,7 +1936,8 @@ class URLPattern():
                                       'type': type_})
             else:
                 pattern += '/' + segment
-                self.segments.append({'parser': self._static_segment(segment)})
+                self.segments.append({'parser': self._static_segment(segment),
+                                      'value': segment})
         if use_regex:
             import re
             self.regex = re.compile('^' + pattern + '$')
@@ -889,6 +1996,118 @@ class URLPattern():
             return None, None
 
 
+class RouteIndex():
+    """A compiled index of the routes registered with an application.
+
+    Routes made only of static segments are stored in a dictionary keyed by
+    the full path. Routes with ``string`` and ``int`` segments, optionally
+    ending in a ``path`` segment, are stored in a trie of path segments.
+    Anything else, such as ``re:`` segments, is matched with
+    :meth:`URLPattern.match` as a fallback. Matches are returned in
+    registration order, so the first registered route still wins.
+    """
+    class Node:
+        def __init__(self):
+            self.children = {}
+            self.params = []
+            self.tails = []
+            self.routes = []
+
+    def __init__(self):
+        self.static = {}
+        self.root = RouteIndex.Node()
+        self.fallback = []
+        self.count = 0
+
+    def add(self, methods, pattern, handler):
+        """Add a route to the index.
+
+        :param methods: The list of HTTP methods handled by the route.
+        :param pattern: The :class:`URLPattern` of the route.
+        :param handler: The route handler function.
+        """
+        route = (self.count, methods, handler)
+        self.count += 1
+        segments = pattern.segments
+        tail = None
+        if segments and segments[-1].get('type') == 'path':
+            tail = segments[-1]['name']
+            segments = segments[:-1]
+        for segment in segments:
+            if segment.get('type', 'string') not in ('string', 'int'):
+                self.fallback.append((route, pattern))
+                return
+        if tail is None and all(['name' not in s for s in segments]):
+            path = '/' + '/'.join([s['value'] for s in segments])
+            self.static.setdefault(path, []).append(route)
+            return
+        node = self.root
+        for segment in segments:
+            if 'name' not in segment:
+                node = node.children.setdefault(segment['value'],
+                                                RouteIndex.Node())
+                continue
+            for type_, name, child in node.params:
+                if type_ == segment['type'] and name == segment['name']:
+                    node = child
+                    break
+            else:
+                child = RouteIndex.Node()
+                node.params.append((segment['type'], segment['name'], child))
+                node = child
+        if tail is None:
+            node.routes.append(route)
+        else:
+            node.tails.append((tail, route))
+
+    def match(self, path):
+        """Return the routes that match a path.
+
+        :param path: The path portion of the request URL.
+
+        The return value is a list of ``(methods, handler, args)`` tuples in
+        route registration order.
+        """
+        matches = [(route, {}) for route in self.static.get(path, ())]
+        if path[:1] == '/':
+            self._walk(self.root, path[1:].split('/'), 0, {}, matches)
+        for route, pattern in self.fallback:
+            args = pattern.match(path)
+            if args is not None:
+                matches.append((route, args))
+        if len(matches) > 1:
+            matches.sort(key=lambda m: m[0][0])
+        return [(route[1], route[2], args) for route, args in matches]
+
+    def _walk(self, node, segments, i, args, matches):
+        if i == len(segments):
+            for route in node.routes:
+                matches.append((route, args))
+            return
+        segment = segments[i]
+        child = node.children.get(segment)
+        if child is not None:
+            self._walk(child, segments, i + 1, args, matches)
+        if segment:
+            for type_, name, child in node.params:
+                value = segment
+                if type_ == 'int':
+                    try:
+                        value = int(segment)
+                    except ValueError:
+                        continue
+                child_args = args.copy()
+                child_args[name] = value
+                self._walk(child, segments, i + 1, child_args, matches)
+        if node.tails:
+            rest = '/'.join(segments[i:])
+            if rest:
+                for name, route in node.tails:
+                    tail_args = args.copy()
+                    tail_args[name] = rest
+                    matches.append((route, tail_args))
+
+
 class HTTPException(Exception):
     def __init__(self, status_code, reason=None):
         self.status_code = status_code
@@ -911,9 +2130,66 @@ class Microdot:
 
         app = Microdot()
     """
+    #: The number of seconds a persistent connection is kept open while
+    #: waiting for the next request. Set to 0 to close connections after
+    #: each response. As with :attr:`Request.request_line_timeout`,
+    #: :attr:`Request.header_timeout` is added to it for a client that sends
+    #: nothing.
+    #:
+    #: Example::
+    #:
+    #:    Microdot.keep_alive_timeout = 10
+    keep_alive_timeout = 5
+
+    #: The maximum number of requests served over a single persistent
+    #: connection before it is closed.
+    #:
+    #: Example::
+    #:
+    #:    Microdot.max_keep_alive_requests = 20
+    max_keep_alive_requests = 100
+
+    #: The maximum number of client connections served at the same time.
+    #: Connections above this limit receive an immediate 503 response. A
+    #: value of ``None`` means no limit.
+    #:
+    #: Example::
+    #:
+    #:    Microdot.max_connections = 4
+    max_connections = None
+
+    #: The maximum number of responses that stream a file at the same time.
+    #: Further file responses wait in a queue until a stream finishes. Files
+    #: sent with :meth:`Response.send_file` are only opened once their
+    #: response has a slot. A value of ``None`` means no limit.
+    #:
+    #: Example::
+    #:
+    #:    Microdot.max_file_streams = 2
+    max_file_streams = None
+
+    #: The ``Retry-After`` value, in seconds, of the 503 response sent to
+    #: connections rejected by :attr:`max_connections`.
+    retry_after = 1
+
+    #: The number of threads of the executor that runs sync handlers on
+    #: CPython. A value of ``None`` sizes it to :attr:`max_connections`, or
+    #: uses the default executor of the event loop if that is not set
+    #: either. Ignored on MicroPython.
+    #:
+    #: Example::
+    #:
+    #:    Microdot.handler_threads = 2
+    handler_threads = None
+
+    #: Sync handlers that block the event loop for longer than this number
+    #: of milliseconds are counted in ``stats['slow_handlers']`` and reported
+    #: once each. A value of ``None`` disables the check.
+    slow_handler_ms = 50
 
     def __init__(self):
         self.url_map = []
+        self.route_index = RouteIndex()
         self.before_request_handlers = []
         self.after_request_handlers = []
         self.after_error_request_handlers = []
@@ -922,8 +2198,48 @@ class Microdot:
         self.options_handler = self.default_options_handler
         self.debug = False
         self.server = None
-
-    def route(self, url_pattern, methods=None):
+        #: Connection and queueing counters maintained by the server.
+        self.stats = {
+            'connections': 0,  # currently open connections
+            'peak_connections': 0,
+            'accepted': 0,
+            'rejected': 0,  # turned away with a 503
+            'file_streams': 0,  # responses currently streaming a file
+            'file_streams_queued': 0,  # file responses waiting for a slot
+            'file_stream_waits': 0,  # file responses that had to wait
+            'file_stream_wait_ms': 0,  # total time spent waiting
+            # connections closed because the client was too slow
+            'timeouts_idle': 0,
+            'timeouts_request_line': 0,
+            'timeouts_headers': 0,
+            'timeouts_body': 0,
+            # handler calls that blocked the loop over slow_handler_ms
+            'slow_handlers': 0,
+        }
+        self.file_stream_released = asyncio.Event()
+        #: An object with an ``observe(request, response, elapsed_us, sent)``
+        #: method that is called after each response is written, such as
+        #: ``microdot_metrics.Metrics``. ``None`` disables instrumentation.
+        self.metrics = None
+        #: The :class:`ResponseCache` used by routes decorated with
+        #: :meth:`cached`.
+        self.response_cache = ResponseCache()
+        #: How the sync route handlers registered with ``inline`` or
+        #: ``thread`` are run, keyed by handler.
+        self.handler_modes = {}
+        #: The route handlers wrapped by :meth:`cached`, keyed by wrapper.
+        self.wrapped_handlers = {}
+        #: Timing of each route handler, keyed by handler. Each entry is a
+        #: list with the number of calls, the total and the maximum time
+        #: spent in the handler, and the maximum time it blocked the event
+        #: loop, in microseconds.
+        self.handler_timing = {}
+        #: The executor that runs sync handlers on CPython, created by
+        #: :meth:`start_server`. ``None`` uses the default executor.
+        self.executor = None
+        self.thread_lock = asyncio.Lock()
+
+    def route(self, url_pattern, methods=None, inline=False, thread=False):
         """Decorator that is used to register a function as a request handler
         for a given URL.
 
@@ -932,6 +2248,15 @@ class Microdot:
         :param methods: The list of HTTP methods to be handled by the
                         decorated function. If omitted, only ``GET`` requests
                         are handled.
+        :param inline: If ``True``, a sync handler is called directly in the
+                       event loop. Use for cheap handlers, to avoid the
+                       thread hop that CPython otherwise makes for each sync
+                       handler.
+        :param thread: If ``True``, a sync handler is run with
+                       :meth:`run_in_thread`, outside the event loop. Use for
+                       handlers that block, such as sensor reads, on
+                       MicroPython, where sync handlers otherwise run in the
+                       event loop.
 
         The URL pattern can be a static path (for example, ``/users`` or
         ``/api/invoices/search``) or a path with dynamic components enclosed
@@ -954,18 +2279,35 @@ class Microdot:
                 return 'Hello, world!'
         """
         def decorated(f):
-            self.url_map.append(
-                ([m.upper() for m in (methods or ['GET'])],
-                 URLPattern(url_pattern), f))
+            self.add_route([m.upper() for m in (methods or ['GET'])],
+                           URLPattern(url_pattern), f)
+            # the mode of a cached route applies to the handler it wraps
+            handler = self.wrapped_handlers.get(f, f)
+            if inline:
+                self.handler_modes[handler] = 'inline'
+            elif thread:
+                self.handler_modes[handler] = 'thread'
             return f
         return decorated
 
-    def get(self, url_pattern):
+    def add_route(self, methods, pattern, handler):
+        """Register a route with the application and its route index.
+
+        :param methods: The list of HTTP methods handled by the route.
+        :param pattern: The :class:`URLPattern` of the route.
+        :param handler: The route handler function.
+        """
+        self.url_map.append((methods, pattern, handler))
+        self.route_index.add(methods, pattern, handler)
+
+    def get(self, url_pattern, **options):
         """Decorator that is used to register a function as a ``GET`` request
         handler for a given URL.
 
         :param url_pattern: The URL pattern that will be compared against
                             incoming requests.
+        :param options: The ``inline`` and ``thread`` options of
+                        :meth:`route`.
 
         This decorator can be used as an alias to the ``route`` decorator with
         ``methods=['GET']``.
@@ -976,14 +2318,16 @@ class Microdot:
             def get_user(request, id):
                 # ...
         """
-        return self.route(url_pattern, methods=['GET'])
+        return self.route(url_pattern, methods=['GET'], **options)
 
-    def post(self, url_pattern):
+    def post(self, url_pattern, **options):
         """Decorator that is used to register a function as a ``POST`` request
         handler for a given URL.
 
         :param url_pattern: The URL pattern that will be compared against
                             incoming requests.
+        :param options: The ``inline`` and ``thread`` options of
+                        :meth:`route`.
 
         This decorator can be used as an alias to the``route`` decorator with
         ``methods=['POST']``.
@@ -994,14 +2338,16 @@ class Microdot:
             def create_user(request):
                 # ...
         """
-        return self.route(url_pattern, methods=['POST'])
+        return self.route(url_pattern, methods=['POST'], **options)
 
-    def put(self, url_pattern):
+    def put(self, url_pattern, **options):
         """Decorator that is used to register a function as a ``PUT`` request
         handler for a given URL.
 
         :param url_pattern: The URL pattern that will be compared against
                             incoming requests.
+        :param options: The ``inline`` and ``thread`` options of
+                        :meth:`route`.
 
         This decorator can be used as an alias to the ``route`` decorator with
         ``methods=['PUT']``.
@@ -1012,14 +2358,16 @@ class Microdot:
             def edit_user(request, id):
                 # ...
         """
-        return self.route(url_pattern, methods=['PUT'])
+        return self.route(url_pattern, methods=['PUT'], **options)
 
-    def patch(self, url_pattern):
+    def patch(self, url_pattern, **options):
         """Decorator that is used to register a function as a ``PATCH`` request
         handler for a given URL.
 
         :param url_pattern: The URL pattern that will be compared against
                             incoming requests.
+        :param options: The ``inline`` and ``thread`` options of
+                        :meth:`route`.
 
         This decorator can be used as an alias to the ``route`` decorator with
         ``methods=['PATCH']``.
@@ -1030,14 +2378,16 @@ class Microdot:
             def edit_user(request, id):
                 # ...
         """
-        return self.route(url_pattern, methods=['PATCH'])
+        return self.route(url_pattern, methods=['PATCH'], **options)
 
-    def delete(self, url_pattern):
+    def delete(self, url_pattern, **options):
         """Decorator that is used to register a function as a ``DELETE``
         request handler for a given URL.
 
         :param url_pattern: The URL pattern that will be compared against
                             incoming requests.
+        :param options: The ``inline`` and ``thread`` options of
+                        :meth:`route`.
 
         This decorator can be used as an alias to the ``route`` decorator with
         ``methods=['DELETE']``.
@@ -1048,7 +2398,7 @@ class Microdot:
             def delete_user(request, id):
                 # ...
         """
-        return self.route(url_pattern, methods=['DELETE'])
+        return self.route(url_pattern, methods=['DELETE'], **options)
 
     def before_request(self, f):
         """Decorator to register a function to run before each request is
@@ -1124,6 +2474,64 @@ class Microdot:
             return f
         return decorated
 
+    def cached(self, ttl_ms=1000, vary=None):
+        """Decorator to cache the responses of a route handler.
+
+        :param ttl_ms: The number of milliseconds a response is reused for.
+        :param vary: The name of a request header, or a list of names, whose
+                     values select different cached responses. They are also
+                     listed in the ``Vary`` header of the response.
+
+        The serialized status line, headers and body of successful responses
+        with a body of known length are stored in :attr:`response_cache`.
+        Requests for the same URL within ``ttl_ms`` are answered from the
+        cache without invoking the handler. On a miss the handler is run by
+        :meth:`invoke_route`, with the ``inline`` or ``thread`` option of its
+        route. The decorator must be applied below :meth:`route`, and the
+        function it returns can be passed to
+        :meth:`ResponseCache.invalidate` to discard its responses early.
+
+        Example::
+
+            @app.route('/health')
+            @app.cached(ttl_ms=2000)
+            async def health(request):
+                return {'ok': True, 'stats': app.stats}
+        """
+        if isinstance(vary, str):
+            vary = [vary]
+        vary = vary or []
+
+        def decorated(f):
+            async def wrapper(request, *args, **kwargs):
+                cache = self.response_cache
+                key = (wrapper, request.url) + tuple(
+                    [request.headers.get(name) for name in vary])
+                entry = cache.get(key)
+                if entry is not None:
+                    res = Response(entry[1])
+                    res.raw_head = entry[0]
+                    return res
+                res = Response.from_result(
+                    await self.invoke_route(f, request))
+                if vary:
+                    res.headers['Vary'] = ', '.join(vary)
+                if res.status_code == 200 and isinstance(res.body, bytes) \
+                        and 'Set-Cookie' not in res.headers:
+                    res.complete()
+                    head = [res.status_line()]
+                    for header, value in res.headers.items():
+                        values = value if isinstance(value, list) \
+                            else [value]
+                        for value in values:
+                            head.append('{header}: {value}\r\n'.format(
+                                header=header, value=value).encode())
+                    cache.put(key, ttl_ms, b''.join(head), res.body)
+                return res
+            self.wrapped_handlers[wrapper] = f
+            return wrapper
+        return decorated
+
     def mount(self, subapp, url_prefix=''):
         """Mount a sub-application, optionally under the given URL prefix.
 
@@ -1131,9 +2539,9 @@ class Microdot:
         :param url_prefix: The URL prefix to mount the application under.
         """
         for methods, pattern, handler in subapp.url_map:
-            self.url_map.append(
-                (methods, URLPattern(url_prefix + pattern.url_pattern),
-                 handler))
+            self.add_route(methods,
+                           URLPattern(url_prefix + pattern.url_pattern),
+                           handler)
         for handler in subapp.before_request_handlers:
             self.before_request_handlers.append(handler)
         for handler in subapp.after_request_handlers:
@@ -1142,6 +2550,8 @@ class Microdot:
             self.after_error_request_handlers.append(handler)
         for status_code, handler in subapp.error_handlers.items():
             self.error_handlers[status_code] = handler
+        self.handler_modes.update(subapp.handler_modes)
+        self.wrapped_handlers.update(subapp.wrapped_handlers)
 
     @staticmethod
     def abort(status_code, reason=None):
@@ -1220,13 +2630,55 @@ class Microdot:
                 from types import MethodType
                 writer.awrite = MethodType(awrite, writer)
                 writer.aclose = MethodType(aclose, writer)
-
-            await self.handle_request(reader, writer)
+                # responses are written from a reused buffer, so drain()
+                # must not return while the transport still holds a view
+                writer.transport.set_write_buffer_limits(0)
+
+            stats = self.stats
+            if self.max_connections is not None and \
+                    stats['connections'] >= self.max_connections:
+                stats['rejected'] += 1
+                try:
+                    await writer.awrite(overloaded)
+                    # consume the request head, closing a socket with
+                    # unread data resets the connection before the client
+                    # sees the response
+                    await asyncio.wait_for(
+                        reader.read(Request.max_readline), 0.2)
+                except (OSError, asyncio.TimeoutError):  # pragma: no cover
+                    pass
+                try:
+                    await writer.aclose()
+                except OSError:  # pragma: no cover
+                    pass
+                return
+            stats['accepted'] += 1
+            stats['connections'] += 1
+            if stats['connections'] > stats['peak_connections']:
+                stats['peak_connections'] = stats['connections']
+            try:
+                await self.handle_request(reader, writer)
+            finally:
+                stats['connections'] -= 1
+
+        # pre-serialized so that rejecting a connection costs no parsing
+        overloaded = ('HTTP/1.1 503 Service Unavailable\r\n'
+                      'Retry-After: {}\r\n'
+                      'Content-Type: text/plain; charset=UTF-8\r\n'
+                      'Content-Length: 11\r\n'
+                      'Connection: close\r\n\r\n'
+                      'Server busy').format(self.retry_after).encode()
 
         if self.debug:  # pragma: no cover
             print('Starting async server on {host}:{port}...'.format(
                 host=host, port=port))
 
+        workers = self.handler_threads or self.max_connections
+        if ThreadPoolExecutor is not None and workers and \
+                self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='microdot')
+
         try:
             self.server = await asyncio.start_server(serve, host, port,
                                                      ssl=ssl)
@@ -1246,6 +2698,9 @@ class Microdot:
                 # the task hasn't been initialized in the server object yet
                 # wait a bit and try again
                 await asyncio.sleep(0.1)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
 
     def run(self, host='0.0.0.0', port=5000, debug=False, ssl=None):
         """Start the web server. This function does not normally return, as
@@ -1296,6 +2751,95 @@ class Microdot:
         """
         self.server.close()
 
+    async def invoke_route(self, f, req):
+        """Invoke a route handler and record its timing.
+
+        :param f: The route handler.
+        :param req: The request.
+
+        Sync handlers run in :attr:`executor` on CPython and in the event
+        loop on MicroPython, unless the route was registered with
+        ``inline`` or ``thread``. The time spent in the call itself, before
+        any coroutine it returns is awaited, is the time the handler blocked
+        the event loop. The wrapper of a :meth:`cached` route is not timed
+        itself: it invokes the handler it wraps through this method on a
+        cache miss, so the timing and mode are those of that handler.
+        """
+        if f in self.wrapped_handlers:
+            return await f(req, **req.url_args)
+        mode = self.handler_modes.get(f)
+        start = ticks_us()
+        blocked = 0
+        if mode == 'thread' or (mode is None and iscoroutinefunction and
+                                not iscoroutinefunction(f)):
+            ret = await self.run_in_thread(f, req, **req.url_args)
+        else:
+            ret = f(req, **req.url_args)
+            blocked = ticks_diff(ticks_us(), start)
+            if iscoroutine(ret):
+                ret = await ret
+        elapsed = ticks_diff(ticks_us(), start)
+        timing = self.handler_timing.get(f)
+        if timing is None:
+            timing = self.handler_timing[f] = [0, 0, 0, 0]
+        timing[0] += 1
+        timing[1] += elapsed
+        if elapsed > timing[2]:
+            timing[2] = elapsed
+        if self.slow_handler_ms is not None and \
+                blocked > self.slow_handler_ms * 1000:
+            self.stats['slow_handlers'] += 1
+            if timing[3] <= self.slow_handler_ms * 1000:
+                # first offence of this handler
+                print('Handler {} blocked the event loop for {} ms'.format(
+                    getattr(f, '__name__', f), blocked // 1000))
+        if blocked > timing[3]:
+            timing[3] = blocked
+        return ret
+
+    async def run_in_thread(self, func, *args, **kwargs):
+        """Run a blocking function outside the event loop and return its
+        result.
+
+        :param func: The function to run.
+
+        On CPython the function runs in :attr:`executor`. On MicroPython it
+        runs in a new thread, which on the Pico is the second core; calls
+        are serialized, as only one extra thread can run at a time, and the
+        waiting task is woken by a ``ThreadSafeFlag`` when the thread
+        finishes.
+
+        Example::
+
+            @app.route('/reading')
+            async def reading(request):
+                await app.run_in_thread(sensor.measure)
+                return {'t': sensor.temperature()}
+        """
+        if ThreadPoolExecutor is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, partial(func, *args, **kwargs))
+        result = []
+        done = asyncio.ThreadSafeFlag()
+
+        def worker():
+            # store every outcome, SystemExit and KeyboardInterrupt
+            # included, so that the waiting task never finds it missing
+            try:
+                result.append((True, func(*args, **kwargs)))
+            except BaseException as exc:
+                result.append((False, exc))
+            finally:
+                done.set()
+
+        async with self.thread_lock:
+            _thread.start_new_thread(worker, ())
+            await done.wait()
+        ok, value = result[0]
+        if not ok:
+            raise value
+        return value
+
     def find_route(self, req):
         method = req.method.upper()
         if method == 'OPTIONS' and self.options_handler:
@@ -1303,37 +2847,136 @@ class Microdot:
         if method == 'HEAD':
             method = 'GET'
         f = 404
-        for route_methods, route_pattern, route_handler in self.url_map:
-            req.url_args = route_pattern.match(req.path)
-            if req.url_args is not None:
-                if method in route_methods:
-                    f = route_handler
-                    break
-                else:
-                    f = 405
+        req.url_args = None
+        for route_methods, route_handler, url_args in \
+                self.route_index.match(req.path):
+            if method in route_methods:
+                req.url_args = url_args
+                req.route = route_handler
+                f = route_handler
+                break
+            else:
+                f = 405
         return f
 
     def default_options_handler(self, req):
         allow = []
-        for route_methods, route_pattern, route_handler in self.url_map:
-            if route_pattern.match(req.path) is not None:
-                allow.extend(route_methods)
+        for route_methods, route_handler, url_args in \
+                self.route_index.match(req.path):
+            allow.extend(route_methods)
         if 'GET' in allow:
             allow.append('HEAD')
         allow.append('OPTIONS')
         return {'Allow': ', '.join(allow)}
 
+    def can_keep_alive(self, req, res):
+        """Return ``True`` if the connection used by ``req`` can be reused
+        for another request after ``res`` is sent.
+
+        The client must have asked for a persistent connection (the default
+        in HTTP/1.1), the response body must have a known length or be sent
+        chunked, and the request body must have been consumed entirely.
+        Requests with a ``Transfer-Encoding`` header always close the
+        connection, as their body is not parsed and would otherwise be read
+        as the next request.
+        """
+        if not self.keep_alive_timeout or req is None:
+            return False
+        if res.headers.get('Connection', '').lower() == 'close':
+            return False
+        connection = req.headers.get('Connection', '').lower()
+        if req.http_version == '1.1':
+            if 'close' in connection:
+                return False
+        elif 'keep-alive' not in connection:
+            return False
+        if 'Transfer-Encoding' in req.headers:
+            return False
+        if req.content_length > req.max_body_length:
+            # the body was left in the stream, so the next request line
+            # cannot be located reliably
+            return False
+        return 'Content-Length' in res.headers or res.chunked or \
+            res.is_head or res.raw_head is not None or \
+            res.status_code in (204, 304)
+
+    async def acquire_file_stream(self):
+        """Wait until a file stream slot is available and take it.
+
+        This method is a coroutine.
+        """
+        stats = self.stats
+        if stats['file_streams'] >= self.max_file_streams:
+            stats['file_stream_waits'] += 1
+            stats['file_streams_queued'] += 1
+            start = ticks_ms()
+            while stats['file_streams'] >= self.max_file_streams:
+                await self.file_stream_released.wait()
+            stats['file_streams_queued'] -= 1
+            stats['file_stream_wait_ms'] += ticks_diff(ticks_ms(), start)
+        stats['file_streams'] += 1
+
+    def release_file_stream(self):
+        """Release a file stream slot and wake up queued responses."""
+        self.stats['file_streams'] -= 1
+        self.file_stream_released.set()
+        self.file_stream_released.clear()
+
     async def handle_request(self, reader, writer):
-        req = None
-        try:
-            req = await Request.create(self, reader, writer,
-                                       writer.get_extra_info('peername'))
-        except Exception as exc:  # pragma: no cover
-            print_exception(exc)
-
-        res = await self.dispatch_request(req)
-        if res != Response.already_handled:  # pragma: no branch
-            await res.write(writer)
+        requests = 0
+        keep_alive = True
+        buffer = bytearray(Response.send_file_buffer_size)
+        while keep_alive:
+            req = None
+            try:
+                # pipelined requests are already buffered in the reader, the
+                # idle timeout only applies to quiet persistent connections
+                req = await Request.create(
+                    self, reader, writer, writer.get_extra_info('peername'),
+                    idle_timeout=self.keep_alive_timeout if requests else None)
+                if req is None and requests:
+                    break
+            except RequestTimeout as exc:
+                self.stats['timeouts_' + exc.phase] += 1
+                break
+            except OSError:  # pragma: no cover
+                break
+            except Exception as exc:  # pragma: no cover
+                print_exception(exc)
+            requests += 1
+
+            metrics = self.metrics
+            if metrics is not None:
+                start = ticks_us()
+            res = await self.dispatch_request(req)
+            if res != Response.already_handled:  # pragma: no branch
+                res.complete(chunked=req is not None and
+                             req.http_version == '1.1')
+                keep_alive = requests < self.max_keep_alive_requests and \
+                    self.can_keep_alive(req, res)
+                if keep_alive:
+                    if req.http_version != '1.1':
+                        res.headers['Connection'] = 'keep-alive'
+                else:
+                    res.headers['Connection'] = 'close'
+                if self.max_file_streams is not None and not res.is_head \
+                        and hasattr(res.body, 'read'):
+                    await self.acquire_file_stream()
+                    try:
+                        sent = await res.write(writer, buffer)
+                    finally:
+                        self.release_file_stream()
+                else:
+                    sent = await res.write(writer, buffer)
+                if metrics is not None:
+                    metrics.observe(req, res, ticks_diff(ticks_us(), start),
+                                    sent)
+            else:
+                keep_alive = False
+            if self.debug and req:  # pragma: no cover
+                print('{method} {path} {status_code}'.format(
+                    method=req.method, path=req.path,
+                    status_code=res.status_code))
         try:
             await writer.aclose()
         except OSError as exc:  # pragma: no cover
@@ -1341,10 +2984,6 @@ class Microdot:
                 pass
             else:
                 raise
-        if self.debug and req:  # pragma: no cover
-            print('{method} {path} {status_code}'.format(
-                method=req.method, path=req.path,
-                status_code=res.status_code))
 
     async def dispatch_request(self, req):
         after_request_handled = False
@@ -1364,19 +3003,8 @@ class Microdot:
                             if res:
                                 break
                         if res is None:
-                            res = await invoke_handler(
-                                f, req, **req.url_args)
-                        if isinstance(res, tuple):
-                            body = res[0]
-                            if isinstance(res[1], int):
-                                status_code = res[1]
-                                headers = res[2] if len(res) > 2 else {}
-                            else:
-                                status_code = 200
-                                headers = res[1]
-                            res = Response(body, status_code, headers)
-                        elif not isinstance(res, Response):
-                            res = Response(res)
+                            res = await self.invoke_route(f, req)
+                        res = Response.from_result(res)
                         for handler in self.after_request_handlers:
                             res = await invoke_handler(
                                 handler, req, res) or res
@@ -1392,7 +3020,8 @@ class Microdot:
                         res = 'Not found', f
                 except HTTPException as exc:
                     if exc.status_code in self.error_handlers:
-                        res = self.error_handlers[exc.status_code](req)
+                        res = await invoke_handler(
+                            self.error_handlers[exc.status_code], req)
                     else:
                         res = exc.reason, exc.status_code
                 except Exception as exc:
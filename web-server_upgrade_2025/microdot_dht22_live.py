@@ -0,0 +1,139 @@
+# Pico W Microdot server with live DHT22 readings over Server-Sent Events
+# - One background task samples the sensor and updates the LCD; every open
+#   page gets the shared reading pushed to it, no sensor access per request
+# - The sensor is read with dht_pio.AsyncDHT: a PIO state machine times the
+#   frame and every wait is awaited, so requests keep being served while
+#   the sensor answers
+# - Upload next to this file: microdot.py, microdot_sse.py, do_connect.py,
+#   secrets.py, lcd_out_methods.py (+ lcd_api.py, pico_i2c_lcd.py), picozero,
+#   dht_pio.py (+ dht_decode.py)
+
+import asyncio
+import time
+
+from machine import Pin
+from picozero import pico_led
+
+from microdot import Microdot
+from microdot_sse import EventStream
+from dht_pio import DHT22, AsyncDHT
+from do_connect import do_connect
+from lcd_out_methods import print_two_rows
+
+# ------------- Config -------------
+HTTP_PORT   = 80
+DHT_PIN     = 27
+SAMPLE_MS   = 2000                 # DHT22 needs >= 2 s between reads
+
+sensor = AsyncDHT(Pin(DHT_PIN), DHT22)
+readings = EventStream(retry_ms=2000)
+latest = {'t': None, 'h': None, 'led': 'OFF', 'ts': 0}
+
+PAGE = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <style>
+      .block {
+        display: block;
+        width: 100%;
+        border: none;
+        background-color: #04aa6d;
+        padding: 14px 28px;
+        font-size: 32px;
+        cursor: pointer;
+        text-align: center;
+      }
+      .off {
+        background-color: #d8d8d8;
+      }
+      h1 {
+        text-align: center;
+      }
+    </style>
+  </head>
+  <body>
+    <form action="./lighton">
+      <input type="submit" value="Light on" class="block" />
+    </form>
+    <form action="./lightoff">
+      <input type="submit" value="Light off" class="block off" />
+    </form>
+    <h1>LED is <span id="led">-</span></h1>
+    <h1>Temperature is <span id="t">-</span></h1>
+    <h1>Humidity is <span id="h">-</span></h1>
+    <script>
+      new EventSource('/events').addEventListener('reading', function (e) {
+        var r = JSON.parse(e.data);
+        document.getElementById('t').textContent = r.t;
+        document.getElementById('h').textContent = r.h;
+        document.getElementById('led').textContent = r.led;
+      });
+    </script>
+  </body>
+</html>
+"""
+
+app = Microdot()
+
+
+def publish():
+    readings.publish(latest, event='reading')
+    app.response_cache.invalidate(reading)
+
+
+async def sample_sensor():
+    while True:
+        try:
+            await sensor.measure()
+            latest['t'] = sensor.temperature
+            latest['h'] = sensor.humidity
+            latest['ts'] = time.time()
+            print_two_rows(latest['t'], latest['h'])
+            publish()
+        except Exception as e:
+            print("DHT22 read failed:", e)
+        await asyncio.sleep_ms(SAMPLE_MS)
+
+
+@app.route('/')
+def index(_req):
+    return PAGE, 200, {'Content-Type': 'text/html; charset=utf-8'}
+
+
+@app.route('/lighton')
+def light_on(_req):
+    pico_led.on()
+    latest['led'] = 'ON'
+    publish()
+    return PAGE, 200, {'Content-Type': 'text/html; charset=utf-8'}
+
+
+@app.route('/lightoff')
+def light_off(_req):
+    pico_led.off()
+    latest['led'] = 'OFF'
+    publish()
+    return PAGE, 200, {'Content-Type': 'text/html; charset=utf-8'}
+
+
+@app.route('/events')
+def events(_req):
+    return readings.response()
+
+
+@app.route('/reading')
+@app.cached(ttl_ms=SAMPLE_MS)
+def reading(_req):
+    return latest
+
+
+async def main():
+    asyncio.create_task(sample_sensor())
+    await app.start_server(host='0.0.0.0', port=HTTP_PORT)
+
+
+pico_led.off()
+ip = do_connect()
+print("Open: http://{}/".format(ip))
+asyncio.run(main())
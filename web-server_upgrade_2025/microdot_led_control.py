@@ -0,0 +1,158 @@
+# Pico W LED control over a WebSocket
+# - The page opens one persistent socket to /ws; each button press is a small
+#   JSON message and the new state comes back on the same socket, no new TCP
+#   connection or page reload per toggle
+# - Every connected page is told about changes made from the others
+# - Upload next to this file: microdot.py, microdot_websocket.py, ws2812.py,
+#   do_connect.py, secrets.py, picozero
+#
+# Messages from the page (any subset of keys):
+#   {"pico": true}  {"gpio": false}  {"strip": [255, 0, 0]}
+# Reply and broadcast:
+#   {"pico": true, "gpio": false, "strip": [255, 0, 0]}
+
+import asyncio
+import json
+
+from machine import Pin
+from picozero import pico_led
+
+from microdot import Microdot
+from microdot_websocket import with_websocket
+from do_connect import do_connect
+from ws2812 import WS2812
+
+# ------------- Config -------------
+HTTP_PORT   = 80
+GPIO_LED    = 15
+STRIP_PIN   = 0
+STRIP_LEDS  = 8
+
+gpio_led = Pin(GPIO_LED, Pin.OUT, value=0)
+strip = WS2812(Pin(STRIP_PIN), STRIP_LEDS)
+state = {'pico': False, 'gpio': False, 'strip': [0, 0, 0]}
+clients = []
+
+PAGE = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <style>
+      button, input {
+        display: block;
+        width: 100%;
+        border: none;
+        background-color: #d8d8d8;
+        padding: 14px 28px;
+        margin-bottom: 8px;
+        font-size: 32px;
+        cursor: pointer;
+      }
+      .on {
+        background-color: #04aa6d;
+      }
+      h1 {
+        text-align: center;
+      }
+    </style>
+  </head>
+  <body>
+    <h1 id="status">Connecting...</h1>
+    <button id="pico">Pico LED</button>
+    <button id="gpio">GPIO LED</button>
+    <input id="strip" type="color" value="#000000" />
+    <script>
+      var state = {}, ws;
+      function show(s) {
+        state = s;
+        ['pico', 'gpio'].forEach(function (k) {
+          document.getElementById(k).className = s[k] ? 'on' : '';
+        });
+        document.getElementById('strip').value = '#' + s.strip.map(
+          function (c) { return (256 | c).toString(16).slice(1); }).join('');
+      }
+      function connect() {
+        ws = new WebSocket('ws://' + location.host + '/ws');
+        ws.onopen = function () {
+          document.getElementById('status').textContent = 'Connected';
+        };
+        ws.onmessage = function (e) { show(JSON.parse(e.data)); };
+        ws.onclose = function () {
+          document.getElementById('status').textContent = 'Reconnecting...';
+          setTimeout(connect, 1000);
+        };
+      }
+      ['pico', 'gpio'].forEach(function (k) {
+        document.getElementById(k).onclick = function () {
+          var m = {};
+          m[k] = !state[k];
+          ws.send(JSON.stringify(m));
+        };
+      });
+      document.getElementById('strip').oninput = function (e) {
+        var v = parseInt(e.target.value.slice(1), 16);
+        ws.send(JSON.stringify({strip: [v >> 16, (v >> 8) & 255, v & 255]}));
+      };
+      connect();
+    </script>
+  </body>
+</html>
+"""
+
+app = Microdot()
+
+
+def apply(changes):
+    # check the whole message before changing anything, so that a bad one
+    # leaves the LEDs and every page as they were
+    if 'strip' in changes:
+        rgb = [int(c) & 0xFF for c in changes['strip'][:3]]
+        if len(rgb) != 3:
+            raise ValueError('strip needs 3 colour values')
+    if 'pico' in changes:
+        state['pico'] = bool(changes['pico'])
+        pico_led.value = 1 if state['pico'] else 0
+    if 'gpio' in changes:
+        state['gpio'] = bool(changes['gpio'])
+        gpio_led.value(1 if state['gpio'] else 0)
+    if 'strip' in changes:
+        state['strip'] = rgb
+        strip.write_all(state['strip'])
+
+
+@app.route('/')
+def index(_req):
+    return PAGE, 200, {'Content-Type': 'text/html; charset=utf-8'}
+
+
+@app.route('/ws')
+@with_websocket
+async def control(_req, ws):
+    clients.append(ws)
+    try:
+        await ws.send(json.dumps(state))
+        while True:
+            try:
+                apply(json.loads(await ws.receive()))
+            except (ValueError, TypeError, KeyError) as e:
+                print("Bad control message:", e)
+                continue
+            message = json.dumps(state)
+            # pages connect and disconnect while we wait on a send, so go
+            # through a copy and forget the ones that are gone
+            for client in list(clients):
+                try:
+                    await client.send(message)
+                except OSError:
+                    if client in clients:
+                        clients.remove(client)
+    finally:
+        if ws in clients:
+            clients.remove(ws)
+
+
+pico_led.off()
+strip.write_all(state['strip'])
+ip = do_connect()
+print("Open: http://{}/".format(ip))
+asyncio.run(app.start_server(host='0.0.0.0', port=HTTP_PORT))
@@ -0,0 +1,173 @@
+"""
+microdot_metrics
+----------------
+
+The ``microdot_metrics`` module records per-route request counts, status
+codes and latency histograms for a Microdot application and exposes them,
+together with the server counters and heap statistics, in the Prometheus text
+format. Applications that do not create a :class:`Metrics` object only pay
+for a ``None`` check per request.
+"""
+import gc
+from array import array
+
+from microdot import URLPattern
+
+try:
+    mem_free = gc.mem_free
+except AttributeError:  # pragma: no cover
+    mem_free = None
+
+TIMEOUT_PHASES = ('idle', 'request_line', 'headers', 'body')
+
+
+class Metrics:
+    """Request instrumentation for an application.
+
+    :param app: The Microdot application to instrument.
+    :param path: The URL at which the metrics are served, or ``None`` to not
+                 register a route.
+
+    Example::
+
+        app = Microdot()
+        Metrics(app)  # GET /metrics now returns the collected metrics
+    """
+    #: The upper bounds of the latency histogram buckets, in microseconds.
+    #: Each route keeps one integer counter per bucket. Changes must be made
+    #: before the first request is observed.
+    #:
+    #: Example::
+    #:
+    #:    Metrics.buckets_us = (5000, 50000, 500000)
+    buckets_us = (1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000,
+                  500000, 1000000, 2500000)
+
+    def __init__(self, app, path='/metrics'):
+        self.app = app
+        #: Per-route counters, keyed by the route handler (``None`` for
+        #: requests that did not match a route). Each entry is a list with
+        #: the bucket counts, the total time in microseconds and a
+        #: dictionary of response counts by status code.
+        self.routes = {}
+        self.bytes_sent = 0
+        self.mem_free_low = None
+        self.mem_free_high = None
+        self.last_mem_free = None
+        #: Heap collections seen between requests, estimated from increases
+        #: of the free memory, as MicroPython does not count collections.
+        self.gc_collections = 0
+        app.metrics = self
+        if path:
+            app.add_route(['GET'], URLPattern(path), self.handler)
+
+    def observe(self, req, res, elapsed_us, sent):
+        """Record a request. This is called by the server after each
+        response is written.
+
+        :param req: The request, or ``None`` if it could not be parsed.
+        :param res: The response.
+        :param elapsed_us: The time taken to handle the request and write
+                           the response, in microseconds.
+        :param sent: The number of bytes written.
+        """
+        route = req.route if req is not None else None
+        entry = self.routes.get(route)
+        if entry is None:
+            entry = self.routes[route] = [
+                array('I', [0] * (len(self.buckets_us) + 1)), 0, {}]
+        counts = entry[0]
+        i = 0
+        for bound in self.buckets_us:
+            if elapsed_us <= bound:
+                break
+            i += 1
+        counts[i] += 1
+        entry[1] += elapsed_us
+        statuses = entry[2]
+        statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+        self.bytes_sent += sent
+        if mem_free is not None:
+            free = mem_free()
+            if self.last_mem_free is not None and free > self.last_mem_free:
+                self.gc_collections += 1
+            self.last_mem_free = free
+            if self.mem_free_low is None or free < self.mem_free_low:
+                self.mem_free_low = free
+            if self.mem_free_high is None or free > self.mem_free_high:
+                self.mem_free_high = free
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        patterns = {}
+        for _methods, pattern, handler in self.app.url_map:
+            patterns.setdefault(handler, pattern.url_pattern)
+        bounds = ['{:g}'.format(b / 1000000) for b in self.buckets_us]
+        bounds.append('+Inf')
+
+        out = [
+            '# HELP microdot_requests_total Requests handled, by route and '
+            'status code.\n',
+            '# TYPE microdot_requests_total counter\n']
+        labels = {}
+        for route, (counts, total_us, statuses) in self.routes.items():
+            label = patterns.get(route, '') if route is not None else ''
+            labels[route] = label = 'route="{}"'.format(
+                label.replace('\\', '\\\\').replace('"', '\\"'))
+            for status, count in statuses.items():
+                out.append('microdot_requests_total{{{},status="{}"}} {}\n'
+                           .format(label, status, count))
+
+        out.append('# HELP microdot_request_duration_seconds Time to handle '
+                   'a request and write the response.\n'
+                   '# TYPE microdot_request_duration_seconds histogram\n')
+        for route, (counts, total_us, statuses) in self.routes.items():
+            label = labels[route]
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                out.append('microdot_request_duration_seconds_bucket'
+                           '{{{},le="{}"}} {}\n'.format(label, bound,
+                                                        cumulative))
+            out.append('microdot_request_duration_seconds_sum{{{}}} {:g}\n'
+                       .format(label, total_us / 1000000))
+            out.append('microdot_request_duration_seconds_count{{{}}} {}\n'
+                       .format(label, cumulative))
+
+        stats = self.app.stats
+        out.append(
+            '# TYPE microdot_response_bytes_total counter\n'
+            'microdot_response_bytes_total {}\n'
+            '# TYPE microdot_connections gauge\n'
+            'microdot_connections {}\n'
+            '# TYPE microdot_connections_peak gauge\n'
+            'microdot_connections_peak {}\n'
+            '# TYPE microdot_connections_accepted_total counter\n'
+            'microdot_connections_accepted_total {}\n'
+            '# TYPE microdot_connections_rejected_total counter\n'
+            'microdot_connections_rejected_total {}\n'
+            '# TYPE microdot_timeouts_total counter\n'.format(
+                self.bytes_sent, stats['connections'],
+                stats['peak_connections'], stats['accepted'],
+                stats['rejected']))
+        for phase in TIMEOUT_PHASES:
+            out.append('microdot_timeouts_total{{phase="{}"}} {}\n'.format(
+                phase, stats['timeouts_' + phase]))
+
+        if mem_free is not None:
+            out.append(
+                '# TYPE microdot_mem_free_bytes gauge\n'
+                'microdot_mem_free_bytes {}\n'
+                '# TYPE microdot_mem_free_low_bytes gauge\n'
+                'microdot_mem_free_low_bytes {}\n'
+                '# TYPE microdot_mem_free_high_bytes gauge\n'
+                'microdot_mem_free_high_bytes {}\n'
+                '# TYPE microdot_gc_collections_total counter\n'
+                'microdot_gc_collections_total {}\n'.format(
+                    mem_free(), self.mem_free_low or 0,
+                    self.mem_free_high or 0, self.gc_collections))
+        return ''.join(out)
+
+    def handler(self, request):
+        return self.render(), 200, {
+            'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -0,0 +1,119 @@
+"""
+microdot_sse
+------------
+
+The ``microdot_sse`` module adds Server-Sent Events support to Microdot. An
+:class:`EventStream` encodes each published event once and fans it out to
+every connected client, so a single sensor sample serves any number of
+browsers.
+"""
+import asyncio
+import json
+
+from microdot import Response
+
+
+class EventStream:
+    """A broadcaster of server-sent events.
+
+    :param retry_ms: If given, clients are told to wait this many
+                     milliseconds before reconnecting after the stream is
+                     interrupted.
+
+    Events are delivered with "latest value" semantics: a client that is
+    slower than the publisher skips straight to the most recent event
+    instead of queueing the ones in between, so memory use does not grow
+    with the number or speed of clients.
+
+    Example::
+
+        readings = EventStream()
+
+        @app.route('/events')
+        async def events(request):
+            return readings.response()
+
+        # elsewhere, in a background task
+        readings.publish({'t': 21.5, 'h': 40.1}, event='reading')
+    """
+    def __init__(self, retry_ms=None):
+        self.retry = None if retry_ms is None else \
+            'retry: {}\n\n'.format(retry_ms).encode()
+        self.changed = asyncio.Event()
+        self.seq = 0
+        self.last = None
+        self.subscribers = 0
+        self.closed = False
+
+    def publish(self, data, event=None, event_id=None):
+        """Send an event to all the connected clients.
+
+        :param data: The event data. Dictionaries and lists are sent as
+                     JSON, strings are sent as given.
+        :param event: An optional event name.
+        :param event_id: An optional event id.
+        """
+        if isinstance(data, (dict, list)):
+            data = json.dumps(data)
+        out = ''
+        if event_id is not None:
+            out += 'id: {}\n'.format(event_id)
+        if event is not None:
+            out += 'event: {}\n'.format(event)
+        out += 'data: ' + str(data).replace('\n', '\ndata: ') + '\n\n'
+        self.last = out.encode()
+        self.seq += 1
+        self.changed.set()
+        self.changed.clear()
+
+    def close(self):
+        """End the stream for all the connected clients."""
+        self.closed = True
+        self.changed.set()
+        self.changed.clear()
+
+    def response(self, send_last=True):
+        """Return a streaming response that subscribes the client to this
+        event stream.
+
+        :param send_last: If ``True``, the most recently published event is
+                          sent as soon as the client connects.
+        """
+        return Response(body=Subscriber(self, send_last), headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+        })
+
+
+class Subscriber:
+    """An async iterator over the events of an :class:`EventStream`, used
+    as the body of a streaming response. MicroPython does not implement
+    async generators, so the iterator protocol is written out."""
+    def __init__(self, stream, send_last=True):
+        self.stream = stream
+        self.seq = stream.seq - 1 if send_last and stream.last else \
+            stream.seq
+        self.pending = stream.retry
+        stream.subscribers += 1
+        self.subscribed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.pending is not None:
+            pending, self.pending = self.pending, None
+            return pending
+        stream = self.stream
+        while self.seq == stream.seq and not stream.closed:
+            await stream.changed.wait()
+        if stream.closed:
+            await self.aclose()
+            raise StopAsyncIteration
+        self.seq = stream.seq
+        return stream.last
+
+    async def aclose(self):
+        if self.subscribed:
+            self.subscribed = False
+            self.stream.subscribers -= 1
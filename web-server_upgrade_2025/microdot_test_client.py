@@ -0,0 +1,223 @@
+"""
+microdot_test_client
+--------------------
+
+The ``microdot_test_client`` module runs requests through a Microdot
+application in-process. Requests are serialized to raw bytes and go through
+the same :meth:`Request.create <microdot.Request.create>`,
+:meth:`Microdot.dispatch_request <microdot.Microdot.dispatch_request>` and
+:meth:`Response.write <microdot.Response.write>` code as requests received
+from the network, so routes, hooks and error handlers can be exercised and
+profiled without a socket.
+"""
+import json
+
+from microdot import AsyncBytesIO, NoCaseDict, Request, Response
+
+
+class CaptureWriter:
+    """An output stream that keeps everything written to it."""
+    def __init__(self):
+        self.chunks = []
+
+    async def awrite(self, data):
+        self.chunks.append(bytes(data))
+
+    async def aclose(self):
+        pass
+
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 1234)
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+class TestResponse:
+    """A response returned by :class:`TestClient`, parsed from the bytes
+    that the application wrote.
+
+    :param raw: The complete response, as written to the stream.
+    """
+    def __init__(self, raw):
+        #: The response as written by the application, head included.
+        self.raw = raw
+        head, _, body = raw.partition(b'\r\n\r\n')
+        lines = head.decode().split('\r\n')
+        status = lines[0].split(' ', 2)
+        #: The numeric status code of the response.
+        self.status_code = int(status[1])
+        #: The reason phrase of the response.
+        self.reason = status[2] if len(status) > 2 else ''
+        #: The response headers. ``Set-Cookie`` is a list of values.
+        self.headers = NoCaseDict()
+        for line in lines[1:]:
+            name, value = line.split(':', 1)
+            value = value.strip()
+            if name.lower() == 'set-cookie':
+                if 'Set-Cookie' not in self.headers:
+                    self.headers['Set-Cookie'] = []
+                self.headers['Set-Cookie'].append(value)
+            else:
+                self.headers[name] = value
+        if body and self.headers.get('Transfer-Encoding') == 'chunked':
+            body = self._dechunk(body)
+        #: The response body, as bytes, with any chunked framing removed.
+        self.body = body
+        self._json = None
+
+    @staticmethod
+    def _dechunk(data):
+        chunks = []
+        pos = 0
+        while True:
+            end = data.find(b'\r\n', pos)
+            size = int(data[pos:end].split(b';')[0], 16)
+            if not size:
+                return b''.join(chunks)
+            chunks.append(data[end + 2:end + 2 + size])
+            pos = end + 4 + size
+
+    @property
+    def text(self):
+        """The response body, decoded from UTF-8."""
+        return self.body.decode()
+
+    @property
+    def json(self):
+        """The parsed JSON body, or ``None`` if the response is not JSON."""
+        if self._json is None:
+            content_type = self.headers.get('Content-Type', '')
+            if content_type.split(';')[0] != 'application/json':
+                return None
+            self._json = json.loads(self.body.decode())
+        return self._json
+
+
+class TestClient:
+    """A client that sends requests to an application without a network.
+
+    :param app: The Microdot application to test.
+    :param cookies: A dictionary of cookies to send with every request.
+                    Cookies set by responses are added to it.
+    :param headers: A dictionary of headers to send with every request.
+
+    The request methods are coroutines and return a :class:`TestResponse`,
+    or ``None`` if the route handled the connection itself, as WebSocket
+    routes do.
+
+    Example::
+
+        client = TestClient(app)
+
+        async def test_health():
+            res = await client.get('/health')
+            assert res.status_code == 200
+            assert res.json['ok']
+
+        asyncio.run(test_health())
+    """
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, app, cookies=None, headers=None):
+        self.app = app
+        self.cookies = cookies or {}
+        self.headers = headers or {}
+
+    def encode(self, method, path, headers=None, body=None):
+        """Return the raw bytes of a request.
+
+        :param method: The HTTP method.
+        :param path: The URL path, with an optional query string.
+        :param headers: A dictionary of headers, added to the client's.
+        :param body: The body, as bytes, a string, or a dictionary or list
+                     that is sent as JSON.
+        """
+        all_headers = NoCaseDict(self.headers)
+        all_headers.update(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            if 'Content-Type' not in all_headers:
+                all_headers['Content-Type'] = 'application/json'
+        elif isinstance(body, str):
+            body = body.encode()
+        elif body is None:
+            body = b''
+        if body or method in ('POST', 'PUT', 'PATCH'):
+            all_headers['Content-Length'] = str(len(body))
+        if self.cookies and 'Cookie' not in all_headers:
+            all_headers['Cookie'] = '; '.join(
+                ['{}={}'.format(name, value)
+                 for name, value in self.cookies.items()])
+        head = ['{} {} HTTP/1.1\r\n'.format(method, path)]
+        for name, value in all_headers.items():
+            head.append('{}: {}\r\n'.format(name, value))
+        head.append('\r\n')
+        return ''.join(head).encode() + body
+
+    async def send(self, raw):
+        """Run a raw request through the application and return its
+        response.
+
+        :param raw: The request, as bytes.
+
+        This method is a coroutine. A request that cannot be parsed is
+        answered with a 400 response, or the application's 400 error
+        handler, as the server does.
+        """
+        writer = CaptureWriter()
+        try:
+            req = await Request.create(self.app, AsyncBytesIO(raw), writer,
+                                       writer.get_extra_info('peername'))
+        except Exception:
+            req = None
+        res = await self.app.dispatch_request(req)
+        if res == Response.already_handled:
+            return None
+        res.complete(chunked=True)
+        await res.write(writer)
+        res = TestResponse(writer.getvalue())
+        for cookie in res.headers.get('Set-Cookie', []):
+            name, value = cookie.split(';')[0].split('=', 1)
+            if 'Expires=Thu, 01 Jan 1970' in cookie:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = value
+        return res
+
+    async def request(self, method, path, headers=None, body=None):
+        """Send a request to the application.
+
+        :param method: The HTTP method.
+        :param path: The URL path, with an optional query string.
+        :param headers: A dictionary of headers, added to the client's.
+        :param body: The body, as bytes, a string, or a dictionary or list
+                     that is sent as JSON.
+
+        This method is a coroutine.
+        """
+        return await self.send(self.encode(method, path, headers, body))
+
+    async def get(self, path, headers=None):
+        """Send a GET request. This method is a coroutine."""
+        return await self.request('GET', path, headers)
+
+    async def head(self, path, headers=None):
+        """Send a HEAD request. This method is a coroutine."""
+        return await self.request('HEAD', path, headers)
+
+    async def post(self, path, headers=None, body=None):
+        """Send a POST request. This method is a coroutine."""
+        return await self.request('POST', path, headers, body)
+
+    async def put(self, path, headers=None, body=None):
+        """Send a PUT request. This method is a coroutine."""
+        return await self.request('PUT', path, headers, body)
+
+    async def patch(self, path, headers=None, body=None):
+        """Send a PATCH request. This method is a coroutine."""
+        return await self.request('PATCH', path, headers, body)
+
+    async def delete(self, path, headers=None):
+        """Send a DELETE request. This method is a coroutine."""
+        return await self.request('DELETE', path, headers)
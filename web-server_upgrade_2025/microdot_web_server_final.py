@@ -1,7 +1,7 @@
 # Pico W Microdot server (AP-only, local assets, better range, onboard LED)
 # - Set your country code below (VERY IMPORTANT for TX power/channels)
 
-from microdot import Microdot, send_file
+from microdot import Microdot, FileCache, Response, StaticManifest, send_file
 import rp2, network, time, gc
 from machine import Pin, Timer
 
@@ -14,7 +14,17 @@ AP_PASSWORD = 'tinyserver1234'     # >= 8 chars
 DEFAULT_CH  = 1                    # fallback if scan fails
 HTTP_PORT   = 80
 STATIC_ROOT = '/static'
+STATIC_MANIFEST = '/static_manifest.json'  # from build_pico_assets.py
 LED_IDLE_MS = 15000                # LED off after inactivity
+KEEP_ALIVE_S = 5                   # idle keep-alive sockets closed after this
+MAX_KEEP_ALIVE_REQS = 50           # requests per connection before closing
+MAX_CONNECTIONS = 8                # browsers open ~6; extra get a fast 503
+MAX_FILE_STREAMS = 2               # concurrent file downloads, others queue
+CACHE_BYTES = 40 * 1024            # RAM budget for cached static files
+CACHE_MAX_FILE = 24 * 1024         # bigger files (styles.css...) are streamed
+CACHE_MIN_FREE = 32 * 1024         # evict cached files below this free heap
+METRICS = True                     # serve Prometheus metrics at /metrics
+HEALTH_CACHE_MS = 1000             # /health JSON is rebuilt at most this often
 
 # ------------- Onboard LED -------------
 try:
@@ -102,51 +112,47 @@ ap, ip, cur_ssid = start_ap(AP_SSID, AP_PASSWORD, None)
 # ------------- Microdot app -------------
 app = Microdot()
 app.debug = False  # reduce noisy traces
-
-try:
-    import uos as os
-except ImportError:
-    import os
-
-def safe_path(relpath):
-    if not relpath:
-        return None
-    if relpath.startswith('/'):
-        relpath = relpath[1:]
-    if '..' in relpath or relpath.startswith('.'):
-        return None
-    while '//' in relpath:
-        relpath = relpath.replace('//', '/')
-    return STATIC_ROOT + '/' + relpath
-
-@app.route('/static/<path:path>')
+app.keep_alive_timeout = KEEP_ALIVE_S
+app.max_keep_alive_requests = MAX_KEEP_ALIVE_REQS
+app.max_connections = MAX_CONNECTIONS
+app.max_file_streams = MAX_FILE_STREAMS
+if METRICS:
+    from microdot_metrics import Metrics
+    Metrics(app)
+
+# small hot files (scripts.js, favicon.ico, index.html) are served from RAM
+file_cache = FileCache(max_bytes=CACHE_BYTES, max_file_size=CACHE_MAX_FILE,
+                       min_free=CACHE_MIN_FREE)
+Response.send_file_cache = file_cache
+
+# every static file is indexed once at boot: requests are a dict lookup with
+# pre-built headers, unknown paths never reach the filesystem
+static = StaticManifest(STATIC_ROOT, '/static/',
+                        cache_control='public, max-age=86400',
+                        manifest=STATIC_MANIFEST)
+gc.collect()
+
+@app.route('/static/<path:path>', inline=True)  # no thread hop on CPython
 def static_any(_req, path):
     led.value(1); _schedule_led_off()
-    gc.collect()  # free RAM before streaming
-    full = safe_path(path)
-    if not full:
-        return 'Not allowed', 403, {'Content-Type':'text/plain; charset=utf-8','Connection':'close'}
-    try:
-        os.stat(full)
-    except Exception:
-        return 'Not Found', 404, {'Content-Type':'text/plain; charset=utf-8','Connection':'close'}
-    resp = send_file(full)
-    resp.headers['Cache-Control'] = 'public, max-age=86400'
-    resp.headers['Connection'] = 'close'  # avoid long-lived keep-alives
+    resp = static.send(_req)  # .gz sibling if accepted
+    if resp is None:
+        return 'Not Found', 404, {'Content-Type':'text/plain; charset=utf-8'}
     return resp
 
-@app.route('/')
+@app.route('/', inline=True)
 def index(_req):
     led.value(1); _schedule_led_off()
-    resp = send_file('/static/index.html')
-    resp.headers['Content-Type'] = 'text/html; charset=utf-8'
-    resp.headers['Connection'] = 'close'
+    resp = static.send(_req, '/static/index.html')
+    if resp is None:
+        return 'Not Found', 404, {'Content-Type':'text/plain; charset=utf-8'}
     return resp
 
 @app.route('/health')
+@app.cached(ttl_ms=HEALTH_CACHE_MS)
 def health(_req):
     led.value(1); _schedule_led_off()
-    return {'ok': True, 'ip': ip, 'ssid': cur_ssid}, 200, {'Content-Type':'application/json; charset=utf-8','Connection':'close'}
+    return {'ok': True, 'ip': ip, 'ssid': cur_ssid, 'stats': app.stats}, 200, {'Content-Type':'application/json; charset=utf-8'}
 
 print("Open: http://{}/  (SSID: {})".format(ip, cur_ssid))
 app.run(host='0.0.0.0', port=HTTP_PORT, debug=False)
@@ -65,7 +65,8 @@ ap, ip, cur_ssid = start_ap(AP_SSID, AP_PASSWORD, AP_CHANNEL)
 
 app = Microdot()
 
-HTML_TEMPLATE = """<!DOCTYPE html>
+# the page has no per-request parts: encoded once, sent with a Content-Length
+PAGE = b"""<!DOCTYPE html>
 <html lang="en">
 
 <head>
@@ -203,9 +204,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 
 @app.route('/')
 def index(_req):
-    # ip and ssid should be variables you computed earlier when starting AP
-    page = HTML_TEMPLATE.replace("%%IP%%", ip).replace("%%SSID%%", cur_ssid)
-    return page, 200, {'Content-Type': 'text/html; charset=utf-8'}
+    return PAGE, 200, {'Content-Type': 'text/html; charset=utf-8'}
 
 @app.route('/health')
 def health(_req):
@@ -0,0 +1,255 @@
+"""
+microdot_websocket
+------------------
+
+The ``microdot_websocket`` module adds WebSocket support to Microdot. A route
+decorated with :func:`with_websocket` upgrades the connection and keeps it
+open, so a client can exchange many small messages with the server without
+paying for a new TCP connection and HTTP request each time.
+"""
+import binascii
+import hashlib
+
+from microdot import MUTED_SOCKET_ERRORS, Request, Response, print_exception
+
+try:
+    import micropython
+except ImportError:  # pragma: no cover
+    micropython = None
+
+GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+if micropython is not None:  # pragma: no cover
+    @micropython.native
+    def unmask(payload, mask):
+        """Unmask a frame payload, a ``bytearray``, in place."""
+        m0 = mask[0]
+        m1 = mask[1]
+        m2 = mask[2]
+        m3 = mask[3]
+        n = len(payload)
+        i = 0
+        while i + 4 <= n:
+            payload[i] ^= m0
+            payload[i + 1] ^= m1
+            payload[i + 2] ^= m2
+            payload[i + 3] ^= m3
+            i += 4
+        while i < n:
+            payload[i] ^= mask[i & 3]
+            i += 1
+        return payload
+else:
+    def unmask(payload, mask):
+        """Unmask a frame payload, a ``bytearray``, XORing all of it with
+        the repeated mask at once."""
+        n = len(payload)
+        key = (mask * (n // 4 + 1))[:n]
+        payload[:] = (int.from_bytes(payload, 'little') ^
+                      int.from_bytes(key, 'little')).to_bytes(n, 'little')
+        return payload
+
+
+class WebSocketError(Exception):
+    """Exception raised when a WebSocket connection is closed or receives an
+    invalid frame."""
+    pass
+
+
+class WebSocket:
+    """A server-side WebSocket connection.
+
+    :param request: The request that is upgraded to a WebSocket connection.
+    """
+    CONT = 0
+    TEXT = 1
+    BINARY = 2
+    CLOSE = 8
+    PING = 9
+    PONG = 10
+
+    #: Specify the maximum size of a message that can be received, after
+    #: joining its fragments. Larger messages close the connection with
+    #: status code 1009. Set to
+    #: ``None`` to use the value of ``Request.max_body_length``.
+    #:
+    #: Example::
+    #:
+    #:    WebSocket.max_message_length = 512
+    max_message_length = None
+
+    def __init__(self, request):
+        self.request = request
+        self.reader = request.sock[0]
+        self.writer = request.sock[1]
+        self.closed = False
+
+    async def handshake(self):
+        """Send the response that switches the connection to the WebSocket
+        protocol. Requests that are not valid WebSocket upgrades are aborted
+        with a 400 error."""
+        headers = self.request.headers
+        key = headers.get('Sec-WebSocket-Key')
+        if 'upgrade' not in headers.get('Connection', '').lower() or \
+                headers.get('Upgrade', '').lower() != 'websocket' or \
+                not key:
+            self.request.app.abort(400)
+        accept = binascii.b2a_base64(
+            hashlib.sha1(key.encode() + GUID).digest())[:-1]
+        await self.writer.awrite(
+            b'HTTP/1.1 101 Switching Protocols\r\n'
+            b'Upgrade: websocket\r\n'
+            b'Connection: Upgrade\r\n'
+            b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+    async def receive(self):
+        """Return the next message from the client, as a string for text
+        messages or as bytes for binary messages.
+
+        Pings are answered and pongs are discarded while waiting. If the
+        client closes the connection, the close is acknowledged and
+        :class:`WebSocketError` is raised.
+        """
+        message = None
+        message_opcode = None
+        max_length = self.max_message_length
+        if max_length is None:
+            max_length = Request.max_body_length
+        while True:
+            fin, opcode, payload = await self._read_frame(max_length)
+            if opcode == self.PING:
+                await self.send(payload, self.PONG)
+                continue
+            elif opcode == self.PONG:
+                continue
+            elif opcode == self.CLOSE:
+                if not self.closed:
+                    self.closed = True
+                    await self.send(payload[:2], self.CLOSE)
+                raise WebSocketError('WebSocket connection closed')
+            elif opcode == self.CONT:
+                if message is None:
+                    raise WebSocketError('Unexpected continuation frame')
+                if len(message) + len(payload) > max_length:
+                    await self.close(1009)
+                    raise WebSocketError('Message too large')
+                message += payload
+            elif message is not None:
+                raise WebSocketError('Expected a continuation frame')
+            elif opcode in (self.TEXT, self.BINARY):
+                message = payload
+                message_opcode = opcode
+            else:
+                raise WebSocketError('Unsupported opcode')
+            if fin:
+                if message_opcode == self.TEXT:
+                    return bytes(message).decode()
+                return bytes(message)
+
+    async def send(self, data, opcode=None):
+        """Send a message to the client.
+
+        :param data: The message, a string to send a text message or bytes
+                     to send a binary message.
+        :param opcode: Override the frame type, for example to send a
+                       ``PING``.
+        """
+        if opcode is None:
+            opcode = self.TEXT if isinstance(data, str) else self.BINARY
+        if isinstance(data, str):
+            data = data.encode()
+        n = len(data)
+        if n < 126:
+            head = bytes((0x80 | opcode, n))
+        elif n < 65536:
+            head = bytes((0x80 | opcode, 126)) + n.to_bytes(2, 'big')
+        else:
+            head = bytes((0x80 | opcode, 127)) + n.to_bytes(8, 'big')
+        # header and payload go out in one write, so a small message is a
+        # single TCP segment
+        await self.writer.awrite(head + data)
+
+    async def ping(self, data=b''):
+        """Send a ping to the client. Its pong is discarded by
+        :meth:`receive`."""
+        await self.send(data, self.PING)
+
+    async def close(self, code=1000):
+        """Close the connection.
+
+        :param code: The status code sent to the client.
+        """
+        if not self.closed:
+            self.closed = True
+            await self.send(code.to_bytes(2, 'big'), self.CLOSE)
+
+    async def _read_frame(self, max_length):
+        reader = self.reader
+        header = await reader.readexactly(2)
+        fin = header[0] & 0x80
+        opcode = header[0] & 0x0f
+        length = header[1] & 0x7f
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), 'big')
+        if not header[1] & 0x80:
+            # clients must mask every frame (RFC 6455, section 5.1)
+            await self.close(1002)
+            raise WebSocketError('Unmasked frame')
+        if length > max_length:
+            await self.close(1009)
+            raise WebSocketError('Message too large')
+        mask = await reader.readexactly(4)
+        if not length:
+            return fin, opcode, bytearray()
+        return fin, opcode, unmask(
+            bytearray(await reader.readexactly(length)), mask)
+
+
+async def websocket_upgrade(request):
+    """Upgrade a request to a WebSocket connection and return the
+    :class:`WebSocket` object.
+
+    This is used by :func:`with_websocket`, applications can also call it
+    directly from a route handler, which then must return
+    ``Response.already_handled``.
+    """
+    ws = WebSocket(request)
+    await ws.handshake()
+    return ws
+
+
+def with_websocket(f):
+    """Decorator to make a route a WebSocket endpoint.
+
+    The decorated function receives the request and a :class:`WebSocket`
+    object. The connection is closed when the function returns.
+
+    Example::
+
+        @app.route('/echo')
+        @with_websocket
+        async def echo(request, ws):
+            while True:
+                message = await ws.receive()
+                await ws.send(message)
+    """
+    async def wrapper(request, *args, **kwargs):
+        ws = await websocket_upgrade(request)
+        try:
+            await f(request, ws, *args, **kwargs)
+        except OSError as exc:
+            if exc.errno not in MUTED_SOCKET_ERRORS:  # pragma: no cover
+                raise
+        except (WebSocketError, EOFError):
+            pass
+        except Exception as exc:
+            print_exception(exc)
+        finally:
+            try:
+                await ws.close()
+            except Exception:
+                pass
+        return Response.already_handled
+    return wrapper
@@ -5,11 +5,17 @@ from picozero import pico_temp_sensor, pico_led
 import machine
 
 from secrets import *
-from dht_read import *
+from dht_pio import DHT, DHT22
+from template import Template
+from sampler import Sampler
 
 ssid = secrets['ssid']
 password = secrets['password']
 
+sampler = Sampler()
+sampler.add_dht22('dht', DHT(machine.Pin(2), DHT22))
+NO_READING = ('--', '--')
+
 
 def connect():
     #Connect to WLAN
@@ -33,14 +39,12 @@ def open_socket(ip):
     return connection   
 
 
-def webpage(temperature, humidity, state):
-    #Template HTML
-    html = f"""
+PAGE = Template("""
             <!DOCTYPE html>
             <html>
               <head>
                 <style>
-                  .block {{
+                  .block {
                     display: block;
                     width: 100%;
                     border: none;
@@ -49,13 +53,13 @@ def webpage(temperature, humidity, state):
                     font-size: 32px;
                     cursor: pointer;
                     text-align: center;
-                  }}
-                  .off {{
+                  }
+                  .off {
                     background-color: #d8d8d8;
-                  }}
-                  h1 {{
+                  }
+                  h1 {
                     text-align: center;
-                  }}
+                  }
                 </style>
               </head>
               <body>
@@ -65,14 +69,13 @@ def webpage(temperature, humidity, state):
                 <form action="./lightoff">
                   <input type="submit" value="Light off" class="block off" />
                 </form>
-                <h1>LED is {state}</h1>
-                <h1>Temperature is {temperature}</h1>
-                <h1>Humidity is {humidity}</h1>
+                <h1>LED is {{state}}</h1>
+                <h1>Temperature is {{temperature}}</h1>
+                <h1>Humidity is {{humidity}}</h1>
               </body>
             </html>
 
-            """
-    return str(html)
+            """)
     
     
 def serve(connection):
@@ -96,16 +99,16 @@ def serve(connection):
             pico_led.off()
             state = 'OFF'
         #temperature = pico_temp_sensor.temp        
-        temperature, humidity = DHTread()
-        html = webpage(temperature, humidity, state)
+        temperature, humidity = sampler.get('dht', NO_READING)
         client.send('HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n')
-        client.send(html)
+        PAGE.send(client, temperature=temperature, humidity=humidity, state=state)
         client.close()
     
     
 try:
     ip = connect()
     connection = open_socket(ip)
+    sampler.start()
     serve(connection)
 except KeyboardInterrupt:
     machine.reset()